@@ -2,36 +2,94 @@ from abc import ABC, abstractmethod
 from fastembed import SparseEmbedding
 from numpy import ndarray
 from qdrant_client import QdrantClient
-from qdrant_client.models import Fusion
+from qdrant_client.models import (
+    Fusion, 
+    QueryRequest, 
+    PointStruct, 
+    PointIdsList,
+    OptimizersConfigDiff,
+    CollectionStatus,
+    SearchParams
+)
 from qdrant_client.http.models import ScoredPoint
-from rag.models import Metadata
+from rag.models import Metadata, UploadConfig, CollectionParams, SyncSummary
+from rag.profiling import span
+from rag.stores import TextStore
+from hashlib import sha1
+from time import sleep
+from typing import Any, Callable, Iterable
+from uuid import NAMESPACE_URL, uuid5
 
 class BaseRepository(ABC):
     qdrant_client: QdrantClient
+    upload_config: UploadConfig
+    collection_params: CollectionParams
+    text_store: TextStore | None
     
     @abstractmethod
-    def create_collection(self, collection_name: str) -> bool: 
+    def get_collection_config(self) -> dict[str, Any]:
         pass
     
     @abstractmethod
-    def delete_collection(self, collection_name: str) -> bool:
+    def get_points(
+        self, 
+        metadatas: list[Metadata],
+        dense_embeddings: list[ndarray] = None,
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None
+    ) -> Iterable[PointStruct]:
         pass
     
+    @abstractmethod
+    def get_query_request(
+        self,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embedding: ndarray = None, 
+        sparse_embedding: SparseEmbedding = None,
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> QueryRequest:
+        pass
+    
+    def create_collection(self, collection_name: str) -> bool: 
+        return self.qdrant_client.create_collection(
+            collection_name=collection_name,
+            **self.get_collection_config(),
+            **self.collection_params.get_collection_config()
+        )
+    
+    def delete_collection(self, collection_name: str) -> bool:
+        return self.qdrant_client.delete_collection(collection_name)
+    
     def collection_exists(self, collection_name: str) -> bool: 
         return self.qdrant_client.collection_exists(collection_name=collection_name)
     
-    @abstractmethod
     def upload_points(
         self, 
-        collection_name: str,
+        collection_name: str, 
         metadatas: list[Metadata],
         dense_embeddings: list[ndarray] = None,
         sparse_embeddings: list[SparseEmbedding] = None,
         reranking_embeddings: list[ndarray] = None
     ):
-        pass
+        with span('repository.upload_points', len(metadatas)):
+            if self.text_store is not None:
+                self.text_store.add(metadatas)
+            
+            self._upload_points(
+                collection_name,
+                self.get_points(metadatas, dense_embeddings, sparse_embeddings, reranking_embeddings)
+            )
+    
+    def delete_points(self, collection_name: str, point_ids: list[str]):
+        self.qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=point_ids),
+            wait=self.upload_config.wait
+        )
     
-    @abstractmethod
     def search(
         self, 
         collection_name: str,
@@ -40,7 +98,217 @@ class BaseRepository(ABC):
         fusion_algorithm: Fusion = None,
         dense_embedding: ndarray = None, 
         sparse_embedding: SparseEmbedding = None,
-        reranking_embedding: ndarray = None
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
     ) -> list[ScoredPoint]:
-        pass
-    
\ No newline at end of file
+        request = self.get_query_request(
+            limit, 
+            prefetch_limit, 
+            fusion_algorithm, 
+            dense_embedding, 
+            sparse_embedding, 
+            reranking_embedding,
+            search_params
+        )
+        
+        return self._query_batch_points(collection_name, [request], 1)[0]
+    
+    def search_batch(
+        self, 
+        collection_name: str,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embeddings: list[ndarray] = None, 
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None,
+        batch_size: int = 64,
+        search_params: SearchParams = None
+    ) -> list[list[ScoredPoint]]:
+        items = self.zip_embeddings(dense_embeddings, sparse_embeddings, reranking_embeddings)
+        
+        requests = [
+            self.get_query_request(
+                limit, 
+                prefetch_limit, 
+                fusion_algorithm, 
+                dense_embedding, 
+                sparse_embedding, 
+                reranking_embedding,
+                search_params
+            )
+            for dense_embedding, sparse_embedding, reranking_embedding in items
+        ]
+        
+        return self._query_batch_points(collection_name, requests, batch_size)
+    
+    def _query_batch_points(
+        self,
+        collection_name: str,
+        requests: list[QueryRequest],
+        batch_size: int
+    ) -> list[list[ScoredPoint]]:
+        scored_points_list = []
+        
+        for i in range(0, len(requests), batch_size):
+            # one round trip, including server-side search
+            with span('repository.query_batch_points', len(requests[i:i + batch_size])):
+                responses = self.qdrant_client.query_batch_points(
+                    collection_name=collection_name,
+                    requests=requests[i:i + batch_size]
+                )
+            
+            scored_points_list.extend(response.points for response in responses)
+            
+        return scored_points_list
+    
+    def build_index(self, collection_name: str):
+        if not self.upload_config.disable_indexing:
+            return
+        
+        with span('repository.build_index'):
+            self.qdrant_client.update_collection(
+                collection_name=collection_name,
+                optimizers_config=OptimizersConfigDiff(
+                    indexing_threshold=self.upload_config.indexing_threshold
+                )
+            )
+            
+            if self.upload_config.wait:
+                self.wait_for_optimizers(collection_name)
+    
+    def wait_for_updates(self, collection_name: str):
+        # updates are applied in order, so a waited no-op completes after all pending ones
+        self.qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=[]),
+            wait=True
+        )
+    
+    def wait_for_optimizers(self, collection_name: str, poll_interval: float = 0.5):
+        while self.qdrant_client.get_collection(collection_name).status == CollectionStatus.YELLOW:
+            sleep(poll_interval)
+    
+    def sync_points(
+        self,
+        collection_name: str,
+        metadatas: list[Metadata],
+        embed: Callable[[list[str]], tuple[list[ndarray] | None, list[SparseEmbedding] | None, list[ndarray] | None]]
+    ) -> SyncSummary:
+        created = not self.collection_exists(collection_name)
+        
+        if created:
+            self.create_collection(collection_name)
+        
+        stored = self._get_stored_hashes(collection_name)
+        
+        changed_metadatas = [
+            metadata 
+            for metadata in metadatas 
+            if stored.get(self.get_point_id(metadata), (None, None))[1] != self.get_content_hash(metadata)
+        ]
+        removed_point_ids = stored.keys() - {self.get_point_id(metadata) for metadata in metadatas}
+        
+        # upsert
+        if changed_metadatas:
+            self.upload_points(
+                collection_name, 
+                changed_metadatas, 
+                *embed([metadata.text for metadata in changed_metadatas])
+            )
+        
+        # delete
+        if removed_point_ids:
+            self.delete_points(collection_name, list(removed_point_ids))
+        
+        if created:
+            self.build_index(collection_name)
+        
+        return SyncSummary(
+            added=[metadata.id for metadata in changed_metadatas if self.get_point_id(metadata) not in stored],
+            updated=[metadata.id for metadata in changed_metadatas if self.get_point_id(metadata) in stored],
+            deleted=[stored[point_id][0] for point_id in removed_point_ids],
+            unchanged=len(metadatas) - len(changed_metadatas)
+        )
+    
+    @staticmethod
+    def zip_embeddings(
+        dense_embeddings: list[ndarray] | None, 
+        sparse_embeddings: list[SparseEmbedding] | None, 
+        reranking_embeddings: list[ndarray] | None
+    ) -> Iterable[tuple[ndarray | None, SparseEmbedding | None, ndarray | None]]:
+        embeddings_lists = (dense_embeddings, sparse_embeddings, reranking_embeddings)
+        count = next(len(embeddings) for embeddings in embeddings_lists if embeddings is not None)
+        
+        return zip(*(
+            embeddings if embeddings is not None else [None] * count
+            for embeddings in embeddings_lists
+        ))
+    
+    @staticmethod
+    def get_point_id(metadata: Metadata) -> str:
+        return str(uuid5(NAMESPACE_URL, str(metadata.id)))
+    
+    @staticmethod
+    def get_content_hash(metadata: Metadata) -> str:
+        return sha1(metadata.text.encode('utf-8')).hexdigest()
+    
+    def get_payload(self, metadata: Metadata) -> dict[str, Any]:
+        # with a text store the payload only keeps what search and sync read
+        if self.text_store is not None:
+            return {
+                'id': metadata.id,
+                'hash': self.get_content_hash(metadata)
+            }
+        
+        return {
+            'id': metadata.id,
+            'text': metadata.text,
+            'hash': self.get_content_hash(metadata)
+        }
+    
+    def get_payload_selector(self) -> bool | list[str]:
+        return ['id'] if self.text_store is not None else True
+    
+    def get_texts(self, scored_points: list[ScoredPoint]) -> list[str | None]:
+        if self.text_store is None:
+            return [scored_point.payload.get('text') for scored_point in scored_points]
+        
+        return self.text_store.get([scored_point.payload['id'] for scored_point in scored_points])
+    
+    def _get_stored_hashes(self, collection_name: str) -> dict[str, tuple[Any, str | None]]:
+        stored = {}
+        offset = None
+        
+        while True:
+            records, offset = self.qdrant_client.scroll(
+                collection_name=collection_name,
+                limit=1_000,
+                offset=offset,
+                with_payload=['id', 'hash'],
+                with_vectors=False
+            )
+            
+            for record in records:
+                stored[str(record.id)] = (record.payload.get('id'), record.payload.get('hash'))
+            
+            if offset is None:
+                return stored
+    
+    def _get_optimizers_config(self) -> OptimizersConfigDiff | None:
+        if not self.upload_config.disable_indexing:
+            return None
+        
+        return OptimizersConfigDiff(indexing_threshold=0)
+    
+    def _upload_points(self, collection_name: str, points: Iterable[PointStruct]):
+        self.qdrant_client.upload_points(
+            collection_name=collection_name,
+            points=points,
+            batch_size=self.upload_config.batch_size,
+            parallel=self.upload_config.parallel,
+            wait=self.upload_config.wait
+        )
+        
+        if not self.upload_config.wait:
+            self.wait_for_updates(collection_name)
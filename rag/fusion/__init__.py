@@ -0,0 +1,22 @@
+from .fusion import (
+    Candidates,
+    FusionFunction,
+    from_scored_points,
+    to_scored_points,
+    rrf,
+    dbsf,
+    linear,
+    convex
+)
+
+
+__all__ = [
+    'Candidates',
+    'FusionFunction',
+    'from_scored_points',
+    'to_scored_points',
+    'rrf',
+    'dbsf',
+    'linear',
+    'convex'
+]
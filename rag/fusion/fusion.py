@@ -0,0 +1,145 @@
+from numpy import ndarray
+from qdrant_client.http.models import ScoredPoint
+from typing import Callable, NamedTuple
+from uuid import NAMESPACE_URL, uuid5
+
+import numpy as np
+
+
+class Candidates(NamedTuple):
+    """
+    Ranked candidates of one retriever for a batch of queries, `ids` holds the payload ids
+    padded with '' and `scores` the matching scores padded with NaN, both (queries, depth).
+    """
+    ids: ndarray
+    scores: ndarray
+
+
+# every fusion takes the candidates of all retrievers and the number of results to keep,
+# further parameters are bound with `functools.partial`
+FusionFunction = Callable[[list[Candidates], int], Candidates]
+
+
+def from_scored_points(scored_points_list: list[list[ScoredPoint]], depth: int) -> Candidates:
+    ids = np.full((len(scored_points_list), depth), '', dtype=object)
+    scores = np.full((len(scored_points_list), depth), np.nan)
+
+    for i, scored_points in enumerate(scored_points_list):
+        scored_points = scored_points[:depth]
+        ids[i, :len(scored_points)] = [str(scored_point.payload['id']) for scored_point in scored_points]
+        scores[i, :len(scored_points)] = [scored_point.score for scored_point in scored_points]
+
+    return Candidates(ids.astype(str), scores)
+
+
+def to_scored_points(candidates: Candidates) -> list[list[ScoredPoint]]:
+    return [
+        [
+            ScoredPoint(
+                id=str(uuid5(NAMESPACE_URL, doc_id)),
+                version=0,
+                score=score,
+                payload={'id': doc_id}
+            )
+            for doc_id, score in zip(ids.tolist(), scores.tolist())
+            if doc_id
+        ]
+        for ids, scores in zip(candidates.ids, candidates.scores)
+    ]
+
+
+def _truncate(candidates_list: list[Candidates], depth: int | None) -> list[Candidates]:
+    return [Candidates(candidates.ids[:, :depth], candidates.scores[:, :depth]) for candidates in candidates_list]
+
+
+def _min_max(scores: ndarray) -> ndarray:
+    low = np.nanmin(scores, axis=1, keepdims=True)
+    high = np.nanmax(scores, axis=1, keepdims=True)
+    spread = np.where(high > low, high - low, 1.0)
+
+    return (scores - low) / spread
+
+
+def _fuse(candidates_list: list[Candidates], contributions: list[ndarray], limit: int) -> Candidates:
+    ids = np.concatenate([candidates.ids for candidates in candidates_list], axis=1)
+    values = np.nan_to_num(np.concatenate(contributions, axis=1))
+    query_count = ids.shape[0]
+
+    fused_ids = np.full((query_count, limit), '', dtype=ids.dtype)
+    fused_scores = np.full((query_count, limit), np.nan)
+
+    # flatten to one (query, doc) key per candidate and sum the contributions of duplicates
+    valid = ids != ''
+
+    if not valid.any():
+        return Candidates(fused_ids, fused_scores)
+
+    rows = np.broadcast_to(np.arange(query_count)[:, None], ids.shape)[valid]
+    doc_ids, doc_codes = np.unique(ids[valid], return_inverse=True)
+    keys, inverse = np.unique(rows * len(doc_ids) + doc_codes, return_inverse=True)
+    fused = np.bincount(inverse, weights=values[valid])
+
+    key_rows, key_codes = keys // len(doc_ids), keys % len(doc_ids)
+
+    # rank within each query by descending fused score
+    order = np.lexsort((-fused, key_rows))
+    key_rows, key_codes, fused = key_rows[order], key_codes[order], fused[order]
+    ranks = np.arange(len(key_rows)) - np.searchsorted(key_rows, np.arange(query_count))[key_rows]
+    keep = ranks < limit
+
+    fused_ids[key_rows[keep], ranks[keep]] = doc_ids[key_codes[keep]]
+    fused_scores[key_rows[keep], ranks[keep]] = fused[keep]
+
+    return Candidates(fused_ids, fused_scores)
+
+
+def rrf(candidates_list: list[Candidates], limit: int, depth: int | None = None, k: int = 60) -> Candidates:
+    # Qdrant's server-side RRF scores 1 / (2 + position), which is k=1 with 1-based ranks
+    candidates_list = _truncate(candidates_list, depth)
+    contributions = [
+        np.where(candidates.ids != '', 1.0 / (k + np.arange(1, candidates.ids.shape[1] + 1)), 0.0)
+        for candidates in candidates_list
+    ]
+
+    return _fuse(candidates_list, contributions, limit)
+
+
+def dbsf(candidates_list: list[Candidates], limit: int, depth: int | None = None) -> Candidates:
+    candidates_list = _truncate(candidates_list, depth)
+    contributions = []
+
+    for candidates in candidates_list:
+        # normalise with mean +- 3 standard deviations as limits, like Qdrant's DBSF
+        mean = np.nanmean(candidates.scores, axis=1, keepdims=True)
+        std = np.nanstd(candidates.scores, axis=1, ddof=1, keepdims=True)
+        low, high = mean - 3 * std, mean + 3 * std
+        spread = np.where(high > low, high - low, np.inf)
+        contributions.append((candidates.scores - low) / spread)
+
+    return _fuse(candidates_list, contributions, limit)
+
+
+def linear(
+    candidates_list: list[Candidates],
+    limit: int,
+    depth: int | None = None,
+    weights: list[float] | None = None
+) -> Candidates:
+    candidates_list = _truncate(candidates_list, depth)
+    weights = weights or [1.0] * len(candidates_list)
+    contributions = [weight * candidates.scores for weight, candidates in zip(weights, candidates_list)]
+
+    return _fuse(candidates_list, contributions, limit)
+
+
+def convex(
+    candidates_list: list[Candidates],
+    limit: int,
+    depth: int | None = None,
+    alpha: float = 0.5
+) -> Candidates:
+    candidates_list = _truncate(candidates_list, depth)
+    weights = [alpha, 1.0 - alpha]
+    contributions = [weight * _min_max(candidates.scores) for weight, candidates in zip(weights, candidates_list)]
+
+    return _fuse(candidates_list, contributions, limit)
@@ -1,14 +1,28 @@
 from .config import (
     DenseModelConfig,
     SparseModelConfig,
-    RerankingModelConfig
+    RerankingModelConfig,
+    QuantizationParams,
+    SparsePruningParams,
+    CascadeShape,
+    CollectionParams,
+    EmbeddingParams,
+    UploadConfig
 )
 from .metadata import Metadata
+from .sync import SyncSummary
 
 
 __all__ = [
     'DenseModelConfig', 
     'SparseModelConfig', 
     'RerankingModelConfig',
-    'Metadata'
+    'QuantizationParams',
+    'SparsePruningParams',
+    'CascadeShape',
+    'CollectionParams',
+    'EmbeddingParams',
+    'UploadConfig',
+    'Metadata',
+    'SyncSummary'
 ]
\ No newline at end of file
@@ -1,17 +1,215 @@
+from fastembed import SparseEmbedding
 from pydantic import BaseModel
-from qdrant_client.models import VectorParams, SparseVectorParams
+from qdrant_client.models import (
+    VectorParams, 
+    SparseVectorParams,
+    SparseIndexParams,
+    Modifier,
+    HnswConfigDiff,
+    SearchParams,
+    QuantizationConfig,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    ProductQuantization,
+    ProductQuantizationConfig,
+    CompressionRatio
+)
+from typing import Any, Literal
 
+import numpy as np
 
-class DenseModelConfig(BaseModel):
+
+class QuantizationParams(BaseModel):
+    """
+    Index-time quantization of a vector, `on_disk` keeps the full precision originals on disk 
+    and `always_ram` the quantized vectors in RAM. `rescore` and `oversampling` are the query-time 
+    defaults, rescoring re-ranks `oversampling * limit` quantized results with the originals.
+    """
+    method: Literal['scalar', 'binary', 'product'] = 'scalar'
+    always_ram: bool = True
+    on_disk: bool = False
+    quantile: float | None = None
+    compression: CompressionRatio = CompressionRatio.X16
+    rescore: bool | None = None
+    oversampling: float | None = None
+    
+    def get_quantization_config(self) -> QuantizationConfig:
+        if self.method == 'scalar':
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(
+                    type=ScalarType.INT8, 
+                    quantile=self.quantile, 
+                    always_ram=self.always_ram
+                )
+            )
+        
+        if self.method == 'binary':
+            return BinaryQuantization(
+                binary=BinaryQuantizationConfig(always_ram=self.always_ram)
+            )
+        
+        return ProductQuantization(
+            product=ProductQuantizationConfig(compression=self.compression, always_ram=self.always_ram)
+        )
+    
+    def get_search_params(self) -> QuantizationSearchParams:
+        return QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+
+
+class _VectorModelConfig(BaseModel):
     name: str
     vector_params: VectorParams
+    quantization: QuantizationParams | None = None
+    on_disk: bool | None = None
+    hnsw_ef: int | None = 128
+    exact: bool = False
+    
+    def get_vector_params(self) -> VectorParams:
+        update = {}
+        
+        if self.quantization is not None:
+            update['quantization_config'] = self.quantization.get_quantization_config()
+            update['on_disk'] = self.quantization.on_disk
+        
+        # an explicit setting takes precedence over the quantization's
+        if self.on_disk is not None:
+            update['on_disk'] = self.on_disk
+        
+        return self.vector_params.model_copy(update=update) if update else self.vector_params
+    
+    def get_search_params(self, search_params: SearchParams | None = None) -> SearchParams:
+        # per-call parameters override the configured ones field by field
+        params = SearchParams(
+            hnsw_ef=self.hnsw_ef,
+            exact=self.exact,
+            quantization=self.quantization.get_search_params() if self.quantization else None
+        )
+        
+        if search_params is None:
+            return params
+        
+        return SearchParams(**{
+            **params.model_dump(exclude_none=True), 
+            **search_params.model_dump(exclude_unset=True, exclude_none=True)
+        })
+
+
+class DenseModelConfig(_VectorModelConfig):
+    pass
+
+
+class SparsePruningParams(BaseModel):
+    """
+    Keeps the `top_n` heaviest terms of a sparse vector and the fewest heaviest terms holding 
+    `mass` of its total absolute weight, whichever is fewer if both are set.
+    """
+    top_n: int | None = None
+    mass: float | None = None
+    
+    def prune(self, sparse_embedding: SparseEmbedding) -> SparseEmbedding:
+        values = np.asarray(sparse_embedding.values)
+        weights = np.abs(values)
+        order = np.argsort(-weights, kind='stable')
+        keep = len(order)
+        
+        if self.top_n is not None:
+            keep = min(keep, self.top_n)
+        
+        if self.mass is not None and len(order):
+            cumulative_weights = np.cumsum(weights[order])
+            keep = min(keep, int(np.searchsorted(cumulative_weights, self.mass * cumulative_weights[-1])) + 1)
+        
+        # postings are looked up by term, so the kept terms stay in index order
+        kept = np.sort(order[:keep])
+        
+        return SparseEmbedding(indices=np.asarray(sparse_embedding.indices)[kept], values=values[kept])
 
 
 class SparseModelConfig(BaseModel):
+    """
+    `on_disk`, `full_scan_threshold` and `modifier` override the index options of `sparse_vector_params`, 
+    documents and queries are pruned separately on upload and on search.
+    """
     name: str
     sparse_vector_params: SparseVectorParams
+    on_disk: bool | None = None
+    full_scan_threshold: int | None = None
+    modifier: Modifier | None = None
+    document_pruning: SparsePruningParams | None = None
+    query_pruning: SparsePruningParams | None = None
+    
+    def get_sparse_vector_params(self) -> SparseVectorParams:
+        index_update = {
+            name: value 
+            for name, value in (('on_disk', self.on_disk), ('full_scan_threshold', self.full_scan_threshold)) 
+            if value is not None
+        }
+        update = {}
+        
+        if index_update:
+            update['index'] = (self.sparse_vector_params.index or SparseIndexParams()).model_copy(update=index_update)
+        
+        if self.modifier is not None:
+            update['modifier'] = self.modifier
+        
+        return self.sparse_vector_params.model_copy(update=update)
+    
+    def prune_document(self, sparse_embedding: SparseEmbedding) -> SparseEmbedding:
+        return self.document_pruning.prune(sparse_embedding) if self.document_pruning else sparse_embedding
+    
+    def prune_query(self, sparse_embedding: SparseEmbedding) -> SparseEmbedding:
+        return self.query_pruning.prune(sparse_embedding) if self.query_pruning else sparse_embedding
 
 
-class RerankingModelConfig(BaseModel):
-    name: str
-    vector_params: VectorParams
+class RerankingModelConfig(_VectorModelConfig):
+    pass
+
+
+class CascadeShape(BaseModel):
+    """
+    Candidate width of each stage of a cascade, a stage with a width of None is skipped.
+    The cheap first pass narrows the full precision dense search, which is fused with the sparse
+    search before the late interaction rerank.
+    """
+    first_pass_limit: int | None = 1_000
+    dense_limit: int | None = 100
+    sparse_limit: int | None = 100
+    rerank: bool = True
+
+
+class CollectionParams(BaseModel):
+    """
+    Distribution and storage options of a collection, None keeps the server default.
+    Shards are spread over the nodes of a cluster and a single node serves all of them,
+    so `shard_number` also parallelises ingest and search locally.
+    """
+    shard_number: int | None = None
+    replication_factor: int | None = None
+    write_consistency_factor: int | None = None
+    on_disk_payload: bool | None = None
+    hnsw_on_disk: bool | None = None
+    
+    def get_collection_config(self) -> dict[str, Any]:
+        collection_config = self.model_dump(exclude={'hnsw_on_disk'}, exclude_none=True)
+        
+        if self.hnsw_on_disk is not None:
+            collection_config['hnsw_config'] = HnswConfigDiff(on_disk=self.hnsw_on_disk)
+        
+        return collection_config
+
+
+class EmbeddingParams(BaseModel):
+    batch_size: int = 256
+    parallel: int | None = None
+
+
+class UploadConfig(BaseModel):
+    batch_size: int = 64
+    parallel: int = 1
+    wait: bool = True
+    disable_indexing: bool = False
+    indexing_threshold: int = 20_000
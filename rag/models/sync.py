@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+from uuid import UUID
+
+
+class SyncSummary(BaseModel):
+    added: list[int | UUID] = []
+    updated: list[int | UUID] = []
+    deleted: list[int | UUID] = []
+    unchanged: int = 0
@@ -0,0 +1,10 @@
+from .profiler import Profiler, PeakRSS, span, get_peak_rss_mb, get_rss_mb
+
+
+__all__ = [
+    'Profiler',
+    'PeakRSS',
+    'span',
+    'get_peak_rss_mb',
+    'get_rss_mb'
+]
@@ -0,0 +1,248 @@
+from contextlib import contextmanager
+from cProfile import Profile
+from io import StringIO
+from pathlib import Path
+from pstats import Stats
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Any, Iterator, Literal
+
+import json
+import numpy as np
+import resource
+import sys
+
+
+# profiler -> number of open activations, so one profiler can be entered from several threads
+_active_profilers: dict['Profiler', int] = {}
+_active_lock = Lock()
+
+# Python 3.12+ allows one cProfile per process, so at most one stage is hooked at a time
+_hook_active = False
+
+
+def get_peak_rss_mb() -> float:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # bytes on macOS, kilobytes on Linux
+    return peak_rss / 2 ** 20 if sys.platform == 'darwin' else peak_rss / 2 ** 10
+
+
+def get_rss_mb() -> float:
+    # the current resident set is only exposed by procfs, elsewhere fall back to the peak
+    try:
+        resident_pages = int(Path('/proc/self/statm').read_text().split()[1])
+    except OSError:
+        return get_peak_rss_mb()
+
+    return resident_pages * resource.getpagesize() / 2 ** 20
+
+
+class PeakRSS:
+    """
+    Samples the resident set in a background thread while active, so `peak_mb` is the peak
+    within the block rather than over the process lifetime like `get_peak_rss_mb`.
+    Allocations shorter than `interval` seconds can be missed.
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak_mb = 0.0
+
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+    def __enter__(self) -> 'PeakRSS':
+        self.peak_mb = get_rss_mb()
+        self._stop.clear()
+        self._thread = Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.peak_mb = max(self.peak_mb, get_rss_mb())
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, get_rss_mb())
+
+
+@contextmanager
+def span(name: str, items: int = 1) -> Iterator[None]:
+    """
+    Times a stage for every active `Profiler`, `items` counts the documents or queries
+    processed for throughput. Without an active profiler this is a no-op.
+    """
+    profilers = list(_active_profilers)
+
+    if not profilers:
+        yield
+        return
+
+    hooks = [hook for profiler in profilers if (hook := profiler._start_hook(name)) is not None]
+    start = perf_counter()
+
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+
+        for profiler, hook in hooks:
+            profiler._stop_hook(name, hook)
+
+        for profiler in profilers:
+            profiler.record(name, elapsed, items)
+
+
+class Profiler:
+    """
+    Collects per-stage latencies from `span` while active, use it as a context manager.
+    Profilers are process-wide, so spans from worker threads are recorded too.
+
+    `hook` additionally runs cProfile or pyinstrument around the stages in `hook_stages`
+    (all stages if None). Only one stage in the process is hooked at a time and only its thread
+    is seen, a stage nested in it or running concurrently in another thread is timed but not
+    hooked, so pick the outermost single-threaded stages of interest.
+    """
+    def __init__(
+        self,
+        hook: Literal['cprofile', 'pyinstrument'] | None = None,
+        hook_stages: set[str] | None = None
+    ):
+        self.hook = hook
+        self.hook_stages = hook_stages
+
+        self._lock = Lock()
+        self._latencies: dict[str, list[float]] = {}
+        self._items: dict[str, int] = {}
+        self._profiles: dict[str, Any] = {}
+        self._peak_rss: PeakRSS | None = None
+        self._peak_rss_mb = 0.0
+
+    def __enter__(self) -> 'Profiler':
+        with _active_lock:
+            _active_profilers[self] = _active_profilers.get(self, 0) + 1
+
+            # the resident set is sampled from the first activation to the last exit
+            if self._peak_rss is None:
+                self._peak_rss = PeakRSS().__enter__()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        with _active_lock:
+            _active_profilers[self] -= 1
+
+            if not _active_profilers[self]:
+                del _active_profilers[self]
+
+                self._peak_rss.__exit__(*exc_info)
+                self._peak_rss_mb = max(self._peak_rss_mb, self._peak_rss.peak_mb)
+                self._peak_rss = None
+
+    def record(self, name: str, seconds: float, items: int = 1):
+        with self._lock:
+            self._latencies.setdefault(name, []).append(seconds)
+            self._items[name] = self._items.get(name, 0) + items
+
+    def report(self) -> dict[str, Any]:
+        with self._lock:
+            stages = {}
+
+            for name, latencies in self._latencies.items():
+                latencies_ms = np.array(latencies) * 1_000
+                total_sec = float(latencies_ms.sum()) / 1_000
+
+                stages[name] = {
+                    'count': len(latencies),
+                    'items': self._items[name],
+                    'total_sec': total_sec,
+                    'mean_ms': float(latencies_ms.mean()),
+                    'p50_ms': float(np.percentile(latencies_ms, 50)),
+                    'p95_ms': float(np.percentile(latencies_ms, 95)),
+                    'p99_ms': float(np.percentile(latencies_ms, 99)),
+                    'items_per_sec': self._items[name] / total_sec if total_sec else 0.0
+                }
+
+        peak_rss = self._peak_rss
+
+        return {
+            'stages': stages,
+            'peak_rss_mb': max(self._peak_rss_mb, peak_rss.peak_mb if peak_rss is not None else 0.0)
+        }
+
+    def to_json(self, path: str | Path | None = None) -> str:
+        report = json.dumps(self.report(), indent=2)
+
+        if path is not None:
+            Path(path).write_text(report)
+
+        return report
+
+    def get_profile(self, name: str) -> str:
+        """
+        Returns the accumulated cProfile statistics or pyinstrument output of one stage.
+        """
+        profile = self._profiles[name]
+
+        if self.hook == 'pyinstrument':
+            return profile.output_text()
+
+        stream = StringIO()
+        Stats(profile, stream=stream).sort_stats('cumulative').print_stats(30)
+
+        return stream.getvalue()
+
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+            self._items.clear()
+            self._profiles.clear()
+            self._peak_rss_mb = 0.0
+
+    def _start_hook(self, name: str) -> tuple['Profiler', Any] | None:
+        global _hook_active
+
+        if self.hook is None or (self.hook_stages is not None and name not in self.hook_stages):
+            return None
+
+        with _active_lock:
+            if _hook_active:
+                return None
+
+            _hook_active = True
+
+        try:
+            if self.hook == 'pyinstrument':
+                from pyinstrument import Profiler as InstrumentProfiler
+
+                profile = InstrumentProfiler()
+                profile.start()
+            else:
+                profile = self._profiles.get(name) or Profile()
+                profile.enable()
+        except BaseException:
+            with _active_lock:
+                _hook_active = False
+
+            raise
+
+        return self, profile
+
+    def _stop_hook(self, name: str, profile: Any):
+        global _hook_active
+
+        try:
+            if self.hook == 'pyinstrument':
+                # pyinstrument sessions cannot be resumed, the last one per stage is kept
+                profile.stop()
+            else:
+                profile.disable()
+        finally:
+            with _active_lock:
+                _hook_active = False
+
+        self._profiles[name] = profile
@@ -4,11 +4,19 @@ from .repository import (
     HybridFusionSearchRepository,
     HybridRerankingSearchRepository
 )
+from .async_repository import AsyncSearchRepository
+from .cached_repository import CachedSearchRepository
+from .cascade_repository import CascadeSearchRepository
+from .exact_repository import ExactSearchRepository
 
 
 __all__ = [
     'DenseSearchRepository',
     'SparseSearchRepository',
     'HybridFusionSearchRepository',
-    'HybridRerankingSearchRepository'
+    'HybridRerankingSearchRepository',
+    'AsyncSearchRepository',
+    'CachedSearchRepository',
+    'CascadeSearchRepository',
+    'ExactSearchRepository'
 ]
\ No newline at end of file
@@ -0,0 +1,281 @@
+from asyncio import Semaphore, create_task, gather, sleep, to_thread
+from fastembed.sparse import SparseEmbedding
+from itertools import islice
+from numpy import ndarray
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    CollectionStatus,
+    OptimizersConfigDiff,
+    PointStruct,
+    PointIdsList,
+    ScoredPoint,
+    Fusion,
+    QueryRequest,
+    SearchParams
+)
+from pydantic import BaseModel
+from typing import Iterable, Iterator
+
+from rag.models import Metadata
+from rag.base import BaseRepository
+from rag.fusion import to_scored_points
+from rag.profiling import span
+
+from .repository import _get_candidate_requests, _to_candidates
+
+
+def _batched(items: Iterable, batch_size: int) -> Iterator[list]:
+    iterator = iter(items)
+    
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+class AsyncSearchRepository(BaseModel):
+    """
+    Runs any `BaseRepository` on top of `AsyncQdrantClient`, the wrapped repository only 
+    builds the collection config, points and query requests. Share one instance (and client)
+    between requests to reuse its connection pool.
+
+    Repositories with a `reranker` or `client_fusion` fetch their candidates asynchronously
+    and score them in a worker thread, like their synchronous search.
+
+    With `upload_config.disable_indexing` the collection is created without an HNSW index,
+    call `build_index` once the upload is done, like with the wrapped repository.
+    """
+    repository: BaseRepository
+    async_qdrant_client: AsyncQdrantClient
+    max_concurrency: int = 8
+    
+    model_config = {'arbitrary_types_allowed': True}
+    
+    async def create_collection(self, collection_name: str) -> bool:
+        return await self.async_qdrant_client.create_collection(
+            collection_name=collection_name,
+            **self.repository.get_collection_config(),
+            **self.repository.collection_params.get_collection_config()
+        )
+    
+    async def delete_collection(self, collection_name: str) -> bool:
+        return await self.async_qdrant_client.delete_collection(collection_name)
+    
+    async def collection_exists(self, collection_name: str) -> bool: 
+        return await self.async_qdrant_client.collection_exists(collection_name=collection_name)
+    
+    async def upload_points(
+        self, 
+        collection_name: str,
+        metadatas: list[Metadata],
+        dense_embeddings: list[ndarray] = None,
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None
+    ):
+        upload_config = self.repository.upload_config
+        
+        if self.repository.text_store is not None:
+            self.repository.text_store.add(metadatas)
+        
+        points = self.repository.get_points(metadatas, dense_embeddings, sparse_embeddings, reranking_embeddings)
+        
+        # acquire before creating each task so at most max_concurrency batches are materialised
+        semaphore = Semaphore(self.max_concurrency)
+        tasks = set()
+        
+        for batch in _batched(points, upload_config.batch_size):
+            await semaphore.acquire()
+            
+            task = create_task(self._upsert(collection_name, batch, upload_config.wait))
+            task.add_done_callback(lambda _: semaphore.release())
+            tasks.add(task)
+        
+        await gather(*tasks)
+        
+        if not upload_config.wait:
+            await self.wait_for_updates(collection_name)
+    
+    async def build_index(self, collection_name: str):
+        upload_config = self.repository.upload_config
+        
+        if not upload_config.disable_indexing:
+            return
+        
+        with span('async_repository.build_index'):
+            await self.async_qdrant_client.update_collection(
+                collection_name=collection_name,
+                optimizers_config=OptimizersConfigDiff(
+                    indexing_threshold=upload_config.indexing_threshold
+                )
+            )
+            
+            if upload_config.wait:
+                await self.wait_for_optimizers(collection_name)
+    
+    async def wait_for_updates(self, collection_name: str):
+        # updates are applied in order, so a waited no-op completes after all pending ones
+        await self.async_qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=[]),
+            wait=True
+        )
+    
+    async def wait_for_optimizers(self, collection_name: str, poll_interval: float = 0.5):
+        while (await self.async_qdrant_client.get_collection(collection_name)).status == CollectionStatus.YELLOW:
+            await sleep(poll_interval)
+    
+    async def search(
+        self, 
+        collection_name: str,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embedding: ndarray = None, 
+        sparse_embedding: SparseEmbedding = None,
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> list[ScoredPoint]:
+        if self._is_client_side():
+            scored_points_list = await self.search_batch(
+                collection_name,
+                limit,
+                prefetch_limit,
+                fusion_algorithm,
+                [dense_embedding],
+                [sparse_embedding],
+                [reranking_embedding],
+                batch_size=1,
+                search_params=search_params
+            )
+            
+            return scored_points_list[0]
+        
+        request = self.repository.get_query_request(
+            limit, 
+            prefetch_limit, 
+            fusion_algorithm, 
+            dense_embedding, 
+            sparse_embedding, 
+            reranking_embedding,
+            search_params
+        )
+        with span('async_repository.query_batch_points'):
+            responses = await self.async_qdrant_client.query_batch_points(
+                collection_name=collection_name,
+                requests=[request]
+            )
+        
+        return responses[0].points
+    
+    async def search_batch(
+        self, 
+        collection_name: str,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embeddings: list[ndarray] = None, 
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None,
+        batch_size: int = 64,
+        search_params: SearchParams = None
+    ) -> list[list[ScoredPoint]]:
+        if self._is_client_side():
+            return await self._search_client_side(
+                collection_name,
+                limit,
+                prefetch_limit,
+                dense_embeddings,
+                sparse_embeddings,
+                reranking_embeddings,
+                batch_size,
+                search_params
+            )
+        
+        items = self.repository.zip_embeddings(dense_embeddings, sparse_embeddings, reranking_embeddings)
+        
+        requests = [
+            self.repository.get_query_request(
+                limit, 
+                prefetch_limit, 
+                fusion_algorithm, 
+                dense_embedding, 
+                sparse_embedding, 
+                reranking_embedding,
+                search_params
+            )
+            for dense_embedding, sparse_embedding, reranking_embedding in items
+        ]
+        
+        return await self._query_all(collection_name, requests, batch_size)
+    
+    def _is_client_side(self) -> bool:
+        return (
+            getattr(self.repository, 'reranker', None) is not None or 
+            getattr(self.repository, 'client_fusion', None) is not None
+        )
+    
+    async def _search_client_side(
+        self,
+        collection_name: str,
+        limit: int,
+        prefetch_limit: int,
+        dense_embeddings: list[ndarray],
+        sparse_embeddings: list[SparseEmbedding],
+        reranking_embeddings: list[ndarray],
+        batch_size: int,
+        search_params: SearchParams
+    ) -> list[list[ScoredPoint]]:
+        depth = prefetch_limit or limit
+        requests = _get_candidate_requests(self.repository, depth, dense_embeddings, sparse_embeddings, search_params)
+        candidates_list = _to_candidates(await self._query_all(collection_name, requests, 2 * batch_size), depth)
+        
+        # scoring is CPU-bound, a worker thread keeps the event loop responsive
+        reranker = getattr(self.repository, 'reranker', None)
+        
+        if reranker is not None:
+            with span('async_repository.rerank', len(reranking_embeddings)):
+                candidates = await to_thread(reranker.rerank, reranking_embeddings, candidates_list, limit)
+        else:
+            with span('async_repository.client_fusion', len(dense_embeddings)):
+                candidates = await to_thread(self.repository.client_fusion, candidates_list, limit)
+        
+        return to_scored_points(candidates)
+    
+    async def _query_all(
+        self,
+        collection_name: str,
+        requests: list[QueryRequest],
+        batch_size: int
+    ) -> list[list[ScoredPoint]]:
+        semaphore = Semaphore(self.max_concurrency)
+        
+        scored_points_lists = await gather(*(
+            self._query_batch_points(collection_name, batch, semaphore)
+            for batch in _batched(requests, batch_size)
+        ))
+        
+        return [
+            scored_points
+            for scored_points_list in scored_points_lists 
+            for scored_points in scored_points_list
+        ]
+    
+    async def _upsert(self, collection_name: str, points: list[PointStruct], wait: bool):
+        await self.async_qdrant_client.upsert(
+            collection_name=collection_name,
+            points=points,
+            wait=wait
+        )
+    
+    async def _query_batch_points(
+        self, 
+        collection_name: str, 
+        requests: list[QueryRequest], 
+        semaphore: Semaphore
+    ) -> list[list[ScoredPoint]]:
+        async with semaphore:
+            with span('async_repository.query_batch_points', len(requests)):
+                responses = await self.async_qdrant_client.query_batch_points(
+                    collection_name=collection_name,
+                    requests=requests
+                )
+            
+        return [response.points for response in responses]
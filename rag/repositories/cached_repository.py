@@ -0,0 +1,302 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from fastembed.sparse import SparseEmbedding
+from hashlib import sha1
+from numpy import ascontiguousarray, ndarray
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    PointStruct,
+    ScoredPoint,
+    Fusion,
+    QueryRequest,
+    SearchParams
+)
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Iterable, Iterator
+
+from rag.models import Metadata, UploadConfig, CollectionParams, SyncSummary
+from rag.base import BaseRepository
+from rag.stores import TextStore
+
+
+class CachedSearchRepository(BaseRepository):
+    """
+    LRU/TTL cache of search results in front of any `BaseRepository`. Entries are keyed by 
+    collection name, query embeddings, `limit`, `prefetch_limit`, `fusion_algorithm` and 
+    `search_params`, and dropped for a collection whenever points are written to it or it is deleted.
+
+    Every write bumps the generation of its collection before and after it runs, results of a search
+    that overlapped a write are returned but not cached, since they may predate it.
+    """
+    def __init__(
+        self, 
+        repository: BaseRepository, 
+        max_size: int = 10_000, 
+        ttl: float | None = None
+    ):
+        self.repository = repository
+        self.max_size = max_size
+        self.ttl = ttl
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        
+        self._lock = Lock()
+        self._entries: OrderedDict[tuple[str, str], tuple[float, list[ScoredPoint]]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+    
+    @property
+    def qdrant_client(self) -> QdrantClient:
+        return self.repository.qdrant_client
+    
+    @property
+    def upload_config(self) -> UploadConfig:
+        return self.repository.upload_config
+    
+    @property
+    def collection_params(self) -> CollectionParams:
+        return self.repository.collection_params
+    
+    @property
+    def text_store(self) -> TextStore | None:
+        return self.repository.text_store
+    
+    def get_collection_config(self) -> dict[str, Any]:
+        return self.repository.get_collection_config()
+    
+    def get_points(
+        self, 
+        metadatas: list[Metadata],
+        dense_embeddings: list[ndarray] = None,
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None
+    ) -> Iterable[PointStruct]:
+        return self.repository.get_points(metadatas, dense_embeddings, sparse_embeddings, reranking_embeddings)
+    
+    def get_query_request(
+        self,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embedding: ndarray = None, 
+        sparse_embedding: SparseEmbedding = None,
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> QueryRequest:
+        return self.repository.get_query_request(
+            limit, 
+            prefetch_limit, 
+            fusion_algorithm, 
+            dense_embedding, 
+            sparse_embedding, 
+            reranking_embedding,
+            search_params
+        )
+    
+    def create_collection(self, collection_name: str) -> bool:
+        return self.repository.create_collection(collection_name)
+    
+    def collection_exists(self, collection_name: str) -> bool:
+        return self.repository.collection_exists(collection_name)
+    
+    def build_index(self, collection_name: str):
+        self.repository.build_index(collection_name)
+    
+    def delete_collection(self, collection_name: str) -> bool:
+        with self._writing(collection_name):
+            return self.repository.delete_collection(collection_name)
+    
+    def upload_points(
+        self, 
+        collection_name: str, 
+        metadatas: list[Metadata],
+        dense_embeddings: list[ndarray] = None,
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None
+    ):
+        with self._writing(collection_name):
+            self.repository.upload_points(
+                collection_name, 
+                metadatas, 
+                dense_embeddings, 
+                sparse_embeddings, 
+                reranking_embeddings
+            )
+    
+    def delete_points(self, collection_name: str, point_ids: list[str]):
+        with self._writing(collection_name):
+            self.repository.delete_points(collection_name, point_ids)
+    
+    def sync_points(
+        self,
+        collection_name: str,
+        metadatas: list[Metadata],
+        embed: Callable[[list[str]], tuple[list[ndarray] | None, list[SparseEmbedding] | None, list[ndarray] | None]]
+    ) -> SyncSummary:
+        with self._writing(collection_name):
+            return self.repository.sync_points(collection_name, metadatas, embed)
+    
+    def search(
+        self, 
+        collection_name: str,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embedding: ndarray = None, 
+        sparse_embedding: SparseEmbedding = None,
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> list[ScoredPoint]:
+        return self.search_batch(
+            collection_name,
+            limit,
+            prefetch_limit,
+            fusion_algorithm,
+            [dense_embedding] if dense_embedding is not None else None,
+            [sparse_embedding] if sparse_embedding is not None else None,
+            [reranking_embedding] if reranking_embedding is not None else None,
+            1,
+            search_params
+        )[0]
+    
+    def search_batch(
+        self, 
+        collection_name: str,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embeddings: list[ndarray] = None, 
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None,
+        batch_size: int = 64,
+        search_params: SearchParams = None
+    ) -> list[list[ScoredPoint]]:
+        items = list(self.zip_embeddings(dense_embeddings, sparse_embeddings, reranking_embeddings))
+        keys = [
+            (collection_name, self._get_key(limit, prefetch_limit, fusion_algorithm, *item, search_params))
+            for item in items
+        ]
+        scored_points_list = [self._get(key) for key in keys]
+        missing = [i for i, scored_points in enumerate(scored_points_list) if scored_points is None]
+        
+        if missing:
+            with self._lock:
+                generation = self._generations.get(collection_name, 0)
+            
+            missing_dense_embeddings, missing_sparse_embeddings, missing_reranking_embeddings = (
+                [items[i][j] for i in missing] if embeddings is not None else None
+                for j, embeddings in enumerate((dense_embeddings, sparse_embeddings, reranking_embeddings))
+            )
+            missing_scored_points_list = self.repository.search_batch(
+                collection_name,
+                limit,
+                prefetch_limit,
+                fusion_algorithm,
+                missing_dense_embeddings,
+                missing_sparse_embeddings,
+                missing_reranking_embeddings,
+                batch_size,
+                search_params
+            )
+            
+            for i, scored_points in zip(missing, missing_scored_points_list):
+                scored_points_list[i] = scored_points
+                self._put(keys[i], scored_points, generation)
+        
+        return scored_points_list
+    
+    def invalidate(self, collection_name: str):
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            keys = [key for key in self._entries if key[0] == collection_name]
+            
+            for key in keys:
+                del self._entries[key]
+            
+            self.invalidations += len(keys)
+    
+    def clear_cache(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> dict[str, float]:
+        total = self.hits + self.misses
+        
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'size': len(self._entries)
+        }
+    
+    def _get(self, key: tuple[str, str]) -> list[ScoredPoint] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            
+            if entry is not None and self.ttl is not None and monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            
+            return entry[1]
+    
+    def _put(self, key: tuple[str, str], scored_points: list[ScoredPoint], generation: int):
+        with self._lock:
+            if self._generations.get(key[0], 0) != generation:
+                return
+            
+            self._entries[key] = (monotonic(), scored_points)
+            self._entries.move_to_end(key)
+            
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    @contextmanager
+    def _writing(self, collection_name: str) -> Iterator[None]:
+        self.invalidate(collection_name)
+        
+        try:
+            yield
+        finally:
+            self.invalidate(collection_name)
+    
+    @staticmethod
+    def _get_key(
+        limit: int,
+        prefetch_limit: int | None,
+        fusion_algorithm: Fusion | None,
+        dense_embedding: ndarray | None,
+        sparse_embedding: SparseEmbedding | None,
+        reranking_embedding: ndarray | None,
+        search_params: SearchParams | None = None
+    ) -> str:
+        key = sha1(repr((limit, prefetch_limit, fusion_algorithm)).encode('utf-8'))
+        key.update(search_params.model_dump_json().encode('utf-8') if search_params is not None else b'\0')
+        
+        for array in (
+            dense_embedding,
+            sparse_embedding.indices if sparse_embedding is not None else None,
+            sparse_embedding.values if sparse_embedding is not None else None,
+            reranking_embedding
+        ):
+            if array is None:
+                key.update(b'\0')
+                continue
+            
+            array = ascontiguousarray(array)
+            key.update(repr((array.dtype.str, array.shape)).encode('utf-8'))
+            key.update(array.tobytes())
+        
+        return key.hexdigest()
@@ -0,0 +1,187 @@
+from fastembed.sparse import SparseEmbedding
+from numpy import ndarray
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    PointStruct,
+    Prefetch,
+    Fusion,
+    FusionQuery,
+    QueryRequest,
+    SearchParams,
+    VectorParams,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    QuantizationSearchParams
+)
+from qdrant_client.http.models import SparseVector
+from pydantic import BaseModel, model_validator
+from typing import Any, Iterable, Literal, Self
+
+from rag.models import (
+    DenseModelConfig,
+    SparseModelConfig,
+    RerankingModelConfig,
+    CascadeShape,
+    UploadConfig,
+    CollectionParams,
+    Metadata
+)
+from rag.base import BaseRepository
+from rag.stores import TextStore
+
+
+class CascadeSearchRepository(BaseModel, BaseRepository):
+    """
+    Multi-stage retrieval in one nested query: a wide search over a cheap copy of the dense vector,
+    full precision dense search over its candidates fused with sparse search, then a late interaction
+    rerank. The sparse and rerank stages are optional, the widths come from `shape` and a
+    `prefetch_limit` passed on search overrides the width of the fused stage.
+
+    `first_pass` stores the dense vector binary quantized, with the originals on disk and no rescoring,
+    or truncated to `truncate_dim` dimensions, which only keeps its quality for Matryoshka models.
+    """
+    qdrant_client: QdrantClient
+    dense_model_config: DenseModelConfig
+    sparse_model_config: SparseModelConfig | None = None
+    reranking_model_config: RerankingModelConfig | None = None
+    upload_config: UploadConfig = UploadConfig()
+    collection_params: CollectionParams = CollectionParams()
+    text_store: TextStore | None = None
+    first_pass: Literal['binary', 'matryoshka'] = 'binary'
+    truncate_dim: int | None = None
+    shape: CascadeShape = CascadeShape()
+    
+    model_config = {'arbitrary_types_allowed': True}
+    
+    @model_validator(mode='after')
+    def check_truncate_dim(self) -> Self:
+        size = self.dense_model_config.vector_params.size
+        
+        if self.first_pass == 'matryoshka' and not (self.truncate_dim is not None and 0 < self.truncate_dim < size):
+            raise ValueError(f'Matryoshka first pass requires 0 < truncate_dim < {size}, got {self.truncate_dim}')
+        
+        return self
+    
+    @property
+    def first_pass_name(self) -> str:
+        return f'{self.dense_model_config.name}_{self.first_pass}'
+    
+    def get_first_pass_params(self) -> VectorParams:
+        vector_params = self.dense_model_config.vector_params
+        
+        if self.first_pass == 'matryoshka':
+            return vector_params.model_copy(update={'size': self.truncate_dim})
+        
+        return vector_params.model_copy(
+            update={
+                'on_disk': True,
+                'quantization_config': BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+            }
+        )
+    
+    def get_first_pass_embedding(self, dense_embedding: ndarray) -> ndarray:
+        return dense_embedding[:self.truncate_dim] if self.first_pass == 'matryoshka' else dense_embedding
+    
+    def get_collection_config(self) -> dict[str, Any]:
+        vectors_config = {
+            self.dense_model_config.name: self.dense_model_config.get_vector_params(),
+            self.first_pass_name: self.get_first_pass_params()
+        }
+        
+        if self.reranking_model_config is not None:
+            vectors_config[self.reranking_model_config.name] = self.reranking_model_config.get_vector_params()
+        
+        return {
+            'vectors_config': vectors_config,
+            'sparse_vectors_config': {
+                self.sparse_model_config.name: self.sparse_model_config.get_sparse_vector_params()
+            } if self.sparse_model_config is not None else None,
+            'optimizers_config': self._get_optimizers_config()
+        }
+    
+    def get_points(
+        self, 
+        metadatas: list[Metadata],
+        dense_embeddings: list[ndarray] = None,
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None
+    ) -> Iterable[PointStruct]:
+        items = zip(self.zip_embeddings(dense_embeddings, sparse_embeddings, reranking_embeddings), metadatas)
+        
+        return (
+            PointStruct(
+                id=self.get_point_id(metadata), 
+                vector={
+                    self.dense_model_config.name: dense_embedding,
+                    self.first_pass_name: self.get_first_pass_embedding(dense_embedding),
+                    **({
+                        self.sparse_model_config.name: self.sparse_model_config.prune_document(sparse_embedding).as_object()
+                    } if self.sparse_model_config is not None else {}),
+                    **({
+                        self.reranking_model_config.name: reranking_embedding
+                    } if self.reranking_model_config is not None else {})
+                },
+                payload=self.get_payload(metadata)
+            )
+            for (dense_embedding, sparse_embedding, reranking_embedding), metadata in items
+        )
+    
+    def get_query_request(
+        self,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embedding: ndarray = None, 
+        sparse_embedding: SparseEmbedding = None,
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> QueryRequest:
+        shape = self.shape
+        stage = Prefetch(
+            prefetch=Prefetch(
+                query=self.get_first_pass_embedding(dense_embedding),
+                using=self.first_pass_name,
+                # binary scores only need to rank candidates for the full precision stage
+                params=SearchParams(quantization=QuantizationSearchParams(rescore=False)),
+                limit=shape.first_pass_limit
+            ) if shape.first_pass_limit else None,
+            query=dense_embedding,
+            using=self.dense_model_config.name,
+            params=self.dense_model_config.get_search_params(search_params),
+            limit=shape.dense_limit or limit
+        )
+        
+        if self.sparse_model_config is not None and shape.sparse_limit:
+            sparse_embedding = self.sparse_model_config.prune_query(sparse_embedding)
+            stage = Prefetch(
+                prefetch=[
+                    stage,
+                    Prefetch(
+                        query=SparseVector(
+                            indices=sparse_embedding.indices, 
+                            values=sparse_embedding.values
+                        ),
+                        using=self.sparse_model_config.name,
+                        limit=shape.sparse_limit
+                    )
+                ],
+                query=FusionQuery(fusion=fusion_algorithm or Fusion.RRF),
+                limit=prefetch_limit or max(shape.dense_limit or limit, shape.sparse_limit)
+            )
+        
+        if self.reranking_model_config is not None and shape.rerank:
+            stage = Prefetch(
+                prefetch=stage,
+                query=reranking_embedding,
+                using=self.reranking_model_config.name,
+                params=self.reranking_model_config.get_search_params(search_params)
+            )
+        
+        return QueryRequest(
+            prefetch=stage.prefetch,
+            query=stage.query,
+            using=stage.using,
+            params=stage.params,
+            with_payload=self.get_payload_selector(),
+            limit=limit
+        )
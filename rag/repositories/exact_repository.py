@@ -0,0 +1,470 @@
+from fastembed.sparse import SparseEmbedding
+from numpy import ndarray
+from pathlib import Path
+from pydantic import BaseModel, PrivateAttr
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Distance,
+    Fusion,
+    FusionQuery,
+    Modifier,
+    PointStruct,
+    Prefetch,
+    QueryRequest,
+    ScoredPoint,
+    SearchParams
+)
+from qdrant_client.http.models import SparseVector
+from threading import Lock
+from typing import Any, Iterable
+
+import numpy as np
+
+from rag.base import BaseRepository
+from rag.fusion import Candidates, rrf, dbsf
+from rag.models import DenseModelConfig, SparseModelConfig, UploadConfig, CollectionParams, Metadata
+from rag.profiling import span
+from rag.stores import TextStore
+
+
+class _Collection:
+    """
+    Append-only rows, an upsert or delete marks the previous row of a point as dead.
+    Pending rows are merged into the dense matrix and the sparse postings on `consolidate`.
+    """
+    def __init__(self, dense_path: Path | None):
+        self.dense_path = dense_path
+        self.point_ids: list[str] = []
+        self.payloads: list[dict[str, Any]] = []
+        self.rows: dict[str, int] = {}
+        self.alive = np.zeros(0, dtype=bool)
+
+        self.dense: ndarray | None = None
+        self.pending_dense: list[ndarray] = []
+        self.sparse: list[SparseEmbedding] = []
+
+        # term-major CSR of the sparse vectors
+        self.terms = np.zeros(0, dtype=np.int64)
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.posting_rows = np.zeros(0, dtype=np.int64)
+        self.posting_values = np.zeros(0, dtype=np.float32)
+        self.document_frequencies = np.zeros(0, dtype=np.int64)
+
+        self.dirty = False
+        self.lock = Lock()
+
+    def add(
+        self,
+        point_ids: list[str],
+        payloads: list[dict[str, Any]],
+        dense_embeddings: list[ndarray] | None,
+        sparse_embeddings: list[SparseEmbedding] | None
+    ):
+        with self.lock:
+            self.delete(point_ids)
+
+            first_row = len(self.point_ids)
+            self.point_ids.extend(point_ids)
+            self.payloads.extend(payloads)
+            self.rows.update((point_id, first_row + i) for i, point_id in enumerate(point_ids))
+            self.alive = np.concatenate([self.alive, np.ones(len(point_ids), dtype=bool)])
+
+            if dense_embeddings is not None:
+                self.pending_dense.extend(dense_embeddings)
+
+            if sparse_embeddings is not None:
+                self.sparse.extend(sparse_embeddings)
+
+            self.dirty = True
+
+    def delete(self, point_ids: list[str]):
+        rows = [self.rows.pop(point_id) for point_id in point_ids if point_id in self.rows]
+        self.alive[rows] = False
+        self.dirty = self.dirty or bool(rows)
+
+    def consolidate(self, normalize: bool):
+        with self.lock:
+            if not self.dirty:
+                return
+
+            if self.pending_dense:
+                pending = np.stack(self.pending_dense).astype(np.float32)
+
+                if normalize:
+                    pending /= np.maximum(np.linalg.norm(pending, axis=1, keepdims=True), 1e-12)
+
+                self.pending_dense = []
+
+                if self.dense_path is not None:
+                    # appended in place, searches still mapping the earlier rows keep reading them safely
+                    with open(self.dense_path, 'ab') as file:
+                        file.write(pending.tobytes())
+
+                    row_count = len(pending) + (len(self.dense) if self.dense is not None else 0)
+                    self.dense = np.memmap(self.dense_path, dtype=np.float32, mode='r', shape=(row_count, pending.shape[1]))
+                else:
+                    self.dense = pending if self.dense is None else np.concatenate([self.dense, pending])
+
+            if self.sparse:
+                lengths = [len(embedding.indices) for embedding in self.sparse]
+                indices = np.concatenate([embedding.indices for embedding in self.sparse]).astype(np.int64)
+                values = np.concatenate([embedding.values for embedding in self.sparse]).astype(np.float32)
+                rows = np.repeat(np.arange(len(self.sparse)), lengths)
+
+                order = np.argsort(indices, kind='stable')
+                self.terms, counts = np.unique(indices[order], return_counts=True)
+                self.term_offsets = np.concatenate([[0], np.cumsum(counts)])
+                self.posting_rows = rows[order]
+                self.posting_values = values[order]
+                self.document_frequencies = np.add.reduceat(
+                    self.alive[self.posting_rows].astype(np.int64),
+                    self.term_offsets[:-1]
+                ) if len(self.terms) else np.zeros(0, dtype=np.int64)
+
+            self.dirty = False
+
+
+def _top_k(scores: ndarray, rows: ndarray, limit: int) -> tuple[ndarray, ndarray]:
+    if scores.shape[1] > limit:
+        top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        scores = np.take_along_axis(scores, top, axis=1)
+        rows = np.take_along_axis(rows, top, axis=1)
+
+    return scores, rows
+
+
+class ExactSearchRepository(BaseModel, BaseRepository):
+    """
+    In-process brute-force backend with exact results, for tests, small corpora and as ground truth
+    for HNSW recall. Dense vectors live in one float32 matrix, appended to a memory-mapped file
+    under `storage_dir` if set, and are scored with blocked matrix multiplies. Sparse vectors live in an inverted index.
+    With both models configured queries fuse the dense and sparse results like Qdrant's RRF and DBSF.
+    Every search is exact, so per-call `search_params` are accepted and ignored.
+    """
+    dense_model_config: DenseModelConfig | None = None
+    sparse_model_config: SparseModelConfig | None = None
+    qdrant_client: QdrantClient | None = None
+    upload_config: UploadConfig = UploadConfig()
+    collection_params: CollectionParams = CollectionParams()
+    text_store: TextStore | None = None
+    storage_dir: Path | None = None
+    block_size: int = 65_536
+
+    model_config = {'arbitrary_types_allowed': True}
+
+    _collections: dict[str, _Collection] = PrivateAttr(default_factory=dict)
+
+    def get_collection_config(self) -> dict[str, Any]:
+        return {
+            'vectors_config': {
+                self.dense_model_config.name: self.dense_model_config.get_vector_params()
+            } if self.dense_model_config else {},
+            'sparse_vectors_config': {
+                self.sparse_model_config.name: self.sparse_model_config.get_sparse_vector_params()
+            } if self.sparse_model_config else {}
+        }
+
+    def get_points(
+        self,
+        metadatas: list[Metadata],
+        dense_embeddings: list[ndarray] = None,
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None
+    ) -> Iterable[PointStruct]:
+        items = self.zip_embeddings(dense_embeddings, sparse_embeddings, [None] * len(metadatas))
+
+        return (
+            PointStruct(
+                id=self.get_point_id(metadata),
+                vector={
+                    **({self.dense_model_config.name: dense_embedding} if self.dense_model_config else {}),
+                    **({
+                        self.sparse_model_config.name: self.sparse_model_config.prune_document(sparse_embedding).as_object()
+                    } if self.sparse_model_config else {})
+                },
+                payload=self.get_payload(metadata)
+            )
+            for (dense_embedding, sparse_embedding, _), metadata in zip(items, metadatas)
+        )
+
+    def get_query_request(
+        self,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embedding: ndarray = None,
+        sparse_embedding: SparseEmbedding = None,
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> QueryRequest:
+        queries = []
+
+        if self.dense_model_config is not None:
+            queries.append((dense_embedding, self.dense_model_config.name))
+
+        if self.sparse_model_config is not None:
+            sparse_embedding = self.sparse_model_config.prune_query(sparse_embedding)
+            queries.append((
+                SparseVector(indices=sparse_embedding.indices, values=sparse_embedding.values),
+                self.sparse_model_config.name
+            ))
+
+        if len(queries) == 1:
+            query, using = queries[0]
+
+            return QueryRequest(query=query, using=using, limit=limit, with_payload=self.get_payload_selector())
+
+        return QueryRequest(
+            prefetch=[Prefetch(query=query, using=using, limit=prefetch_limit or limit) for query, using in queries],
+            query=FusionQuery(fusion=fusion_algorithm or Fusion.RRF),
+            limit=limit,
+            with_payload=self.get_payload_selector()
+        )
+
+    def create_collection(self, collection_name: str) -> bool:
+        distance = self.dense_model_config.vector_params.distance if self.dense_model_config else None
+
+        if distance not in (None, Distance.COSINE, Distance.DOT, Distance.EUCLID):
+            raise ValueError(f'Unsupported distance {distance}')
+
+        dense_path = None
+
+        if self.storage_dir is not None:
+            Path(self.storage_dir).mkdir(parents=True, exist_ok=True)
+            dense_path = Path(self.storage_dir) / f'{collection_name}.dense.f32'
+            dense_path.unlink(missing_ok=True)
+
+        self._collections[collection_name] = _Collection(dense_path)
+
+        return True
+
+    def delete_collection(self, collection_name: str) -> bool:
+        collection = self._collections.pop(collection_name, None)
+
+        if collection is not None and collection.dense_path is not None:
+            collection.dense = None
+            collection.dense_path.unlink(missing_ok=True)
+
+        return collection is not None
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return collection_name in self._collections
+
+    def upload_points(
+        self,
+        collection_name: str,
+        metadatas: list[Metadata],
+        dense_embeddings: list[ndarray] = None,
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None
+    ):
+        with span('repository.upload_points', len(metadatas)):
+            if self.text_store is not None:
+                self.text_store.add(metadatas)
+
+            self._collections[collection_name].add(
+                [self.get_point_id(metadata) for metadata in metadatas],
+                [self.get_payload(metadata) for metadata in metadatas],
+                dense_embeddings if self.dense_model_config else None,
+                [
+                    self.sparse_model_config.prune_document(sparse_embedding)
+                    for sparse_embedding in sparse_embeddings
+                ] if self.sparse_model_config else None
+            )
+
+    def delete_points(self, collection_name: str, point_ids: list[str]):
+        collection = self._collections[collection_name]
+
+        with collection.lock:
+            collection.delete(point_ids)
+
+    def build_index(self, collection_name: str):
+        with span('repository.build_index'):
+            self._get_collection(collection_name)
+
+    def wait_for_updates(self, collection_name: str):
+        pass
+
+    def wait_for_optimizers(self, collection_name: str, poll_interval: float = 0.5):
+        pass
+
+    def _get_stored_hashes(self, collection_name: str) -> dict[str, tuple[Any, str | None]]:
+        collection = self._collections[collection_name]
+
+        return {
+            point_id: (collection.payloads[row].get('id'), collection.payloads[row].get('hash'))
+            for point_id, row in collection.rows.items()
+        }
+
+    def _get_collection(self, collection_name: str) -> _Collection:
+        collection = self._collections[collection_name]
+        collection.consolidate(self._get_distance() == Distance.COSINE)
+
+        return collection
+
+    def _get_distance(self) -> Distance | None:
+        return self.dense_model_config.vector_params.distance if self.dense_model_config else None
+
+    def _query_batch_points(
+        self,
+        collection_name: str,
+        requests: list[QueryRequest],
+        batch_size: int
+    ) -> list[list[ScoredPoint]]:
+        collection = self._get_collection(collection_name)
+        scored_points_list = []
+
+        for i in range(0, len(requests), batch_size):
+            with span('repository.query_batch_points', len(requests[i:i + batch_size])):
+                scored_points_list.extend(self._query(collection, requests[i:i + batch_size]))
+
+        return scored_points_list
+
+    def _query(self, collection: _Collection, requests: list[QueryRequest]) -> list[list[ScoredPoint]]:
+        # every plain query and prefetch is a leaf, dense leaves share one blocked matrix multiply
+        leaves = [
+            (i, query)
+            for i, request in enumerate(requests)
+            for query in (request.prefetch or [request])
+        ]
+        dense_leaves = [j for j, (_, query) in enumerate(leaves) if not isinstance(query.query, SparseVector)]
+        results: list[tuple[ndarray, ndarray]] = [None] * len(leaves)
+
+        if dense_leaves:
+            limit = max(leaves[j][1].limit for j in dense_leaves)
+            scores, rows = self._search_dense(collection, [leaves[j][1].query for j in dense_leaves], limit)
+
+            for k, j in enumerate(dense_leaves):
+                results[j] = (scores[k, :leaves[j][1].limit], rows[k, :leaves[j][1].limit])
+
+        for j, (_, query) in enumerate(leaves):
+            if results[j] is None:
+                results[j] = self._search_sparse(collection, query.query, query.limit)
+
+        scored_points_list = []
+
+        for i, request in enumerate(requests):
+            request_results = [result for (k, _), result in zip(leaves, results) if k == i]
+
+            if isinstance(request.query, FusionQuery):
+                scores, rows = self._fuse(request_results, request.query.fusion, request.limit)
+            else:
+                scores, rows = request_results[0]
+
+            scored_points_list.append(self._to_scored_points(collection, scores, rows, request.with_payload))
+
+        return scored_points_list
+
+    def _search_dense(self, collection: _Collection, queries: list[Any], limit: int) -> tuple[ndarray, ndarray]:
+        distance = self._get_distance()
+        queries = np.asarray(queries, dtype=np.float32)
+
+        if distance == Distance.COSINE:
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.full((len(queries), 0), -1, dtype=np.int64)
+        matrix = collection.dense if collection.dense is not None else np.zeros((0, queries.shape[1]), np.float32)
+
+        for start in range(0, len(matrix), self.block_size):
+            block = np.asarray(matrix[start:start + self.block_size])
+            scores = queries @ block.T
+
+            if distance == Distance.EUCLID:
+                # negative squared distance ranks like the distance, |q|^2 is constant per query
+                scores = 2 * scores - (block ** 2).sum(axis=1)
+
+            scores[:, ~collection.alive[start:start + len(block)]] = -np.inf
+            rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+
+            best_scores, best_rows = _top_k(
+                np.concatenate([best_scores, scores], axis=1),
+                np.concatenate([best_rows, rows], axis=1),
+                limit
+            )
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+        if distance == Distance.EUCLID:
+            best_scores = np.sqrt(np.maximum((queries ** 2).sum(axis=1, keepdims=True) - best_scores, 0))
+            best_scores[best_rows < 0] = -np.inf
+
+        return best_scores, best_rows
+
+    def _search_sparse(self, collection: _Collection, query: SparseVector, limit: int) -> tuple[ndarray, ndarray]:
+        query_indices = np.asarray(query.indices, dtype=np.int64)
+        query_values = np.asarray(query.values, dtype=np.float32)
+
+        positions = np.searchsorted(collection.terms, query_indices)
+        found = positions < len(collection.terms)
+        found[found] = collection.terms[positions[found]] == query_indices[found]
+        positions, query_values = positions[found], query_values[found]
+
+        if self.sparse_model_config.get_sparse_vector_params().modifier == Modifier.IDF:
+            # same IDF as Qdrant, computed over the live documents
+            document_count = int(collection.alive.sum())
+            document_frequencies = collection.document_frequencies[positions]
+            query_values = query_values * np.log(
+                (document_count - document_frequencies + 0.5) / (document_frequencies + 0.5) + 1
+            )
+
+        starts, ends = collection.term_offsets[positions], collection.term_offsets[positions + 1]
+        lengths = ends - starts
+        slices = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths) + np.arange(lengths.sum())
+
+        rows = collection.posting_rows[slices]
+        document_count = len(collection.alive)
+        scores = np.bincount(rows, weights=collection.posting_values[slices] * np.repeat(query_values, lengths), minlength=document_count)
+        matched = (np.bincount(rows, minlength=document_count) > 0) & collection.alive
+
+        candidate_rows = np.flatnonzero(matched)
+        candidate_scores, candidate_rows = _top_k(scores[candidate_rows][None], candidate_rows[None], limit)
+        order = np.argsort(-candidate_scores[0], kind='stable')
+
+        return candidate_scores[0][order], candidate_rows[0][order]
+
+    def _fuse(self, results: list[tuple[ndarray, ndarray]], fusion: Fusion, limit: int) -> tuple[ndarray, ndarray]:
+        depth = max(len(rows) for _, rows in results)
+        candidates_list = []
+
+        for scores, rows in results:
+            valid = np.isfinite(scores)
+            ids = np.full((1, depth), '', dtype=object)
+            padded_scores = np.full((1, depth), np.nan)
+            ids[0, :valid.sum()] = rows[valid].astype(str)
+            padded_scores[0, :valid.sum()] = scores[valid]
+            candidates_list.append(Candidates(ids.astype(str), padded_scores))
+
+        # Qdrant's RRF is k=1 with 1-based ranks
+        fused = rrf(candidates_list, limit, k=1) if fusion == Fusion.RRF else dbsf(candidates_list, limit)
+        valid = fused.ids[0] != ''
+
+        return fused.scores[0][valid], fused.ids[0][valid].astype(np.int64)
+
+    def _to_scored_points(
+        self,
+        collection: _Collection,
+        scores: ndarray,
+        rows: ndarray,
+        with_payload: Any
+    ) -> list[ScoredPoint]:
+        scored_points = []
+
+        for score, row in zip(scores.tolist(), rows.tolist()):
+            if row < 0 or not np.isfinite(score):
+                continue
+
+            payload = collection.payloads[row]
+
+            if isinstance(with_payload, list):
+                payload = {key: payload[key] for key in with_payload if key in payload}
+            elif not with_payload:
+                payload = None
+
+            scored_points.append(
+                ScoredPoint(id=collection.point_ids[row], version=0, score=score, payload=payload)
+            )
+
+        return scored_points
@@ -3,161 +3,204 @@ from numpy import ndarray
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
     PointStruct, 
-    ScoredPoint, 
+    ScoredPoint,
     Prefetch,
-    SearchParams,
     Fusion,
-    FusionQuery
+    FusionQuery,
+    QueryRequest,
+    SearchParams
 )
-from qdrant_client.http.models import SparseVector, NamedVector, NamedSparseVector
+from qdrant_client.http.models import SparseVector
 from pydantic import BaseModel
-from uuid import uuid4
+from typing import Any, Iterable
 
 from rag.models import (
     DenseModelConfig,
     SparseModelConfig,
     RerankingModelConfig,
+    UploadConfig,
+    CollectionParams,
     Metadata
 )
 from rag.base import BaseRepository
+from rag.fusion import Candidates, FusionFunction, from_scored_points, to_scored_points
+from rag.profiling import span
+from rag.reranking import BaseReranker
+from rag.stores import TextStore
+
+
+def _get_candidate_requests(
+    repository: 'HybridFusionSearchRepository | HybridRerankingSearchRepository',
+    depth: int,
+    dense_embeddings: list[ndarray],
+    sparse_embeddings: list[SparseEmbedding],
+    search_params: SearchParams = None
+) -> list[QueryRequest]:
+    """
+    One dense and one sparse request per query, interleaved, for client-side fusion or reranking.
+    """
+    items = zip(dense_embeddings, map(repository.sparse_model_config.prune_query, sparse_embeddings))
+    
+    return [
+        request
+        for dense_embedding, sparse_embedding in items
+        for request in (
+            QueryRequest(
+                query=dense_embedding,
+                using=repository.dense_model_config.name,
+                params=repository.dense_model_config.get_search_params(search_params),
+                limit=depth,
+                with_payload=['id']
+            ),
+            QueryRequest(
+                query=SparseVector(
+                    indices=sparse_embedding.indices, 
+                    values=sparse_embedding.values
+                ),
+                using=repository.sparse_model_config.name,
+                limit=depth,
+                with_payload=['id']
+            )
+        )
+    ]
+
+
+def _to_candidates(scored_points_list: list[list[ScoredPoint]], depth: int) -> list[Candidates]:
+    return [
+        from_scored_points(scored_points_list[0::2], depth),
+        from_scored_points(scored_points_list[1::2], depth)
+    ]
+
+
+def _fetch_candidates(
+    repository: 'HybridFusionSearchRepository | HybridRerankingSearchRepository',
+    collection_name: str,
+    depth: int,
+    dense_embeddings: list[ndarray],
+    sparse_embeddings: list[SparseEmbedding],
+    batch_size: int,
+    search_params: SearchParams = None
+) -> list[Candidates]:
+    requests = _get_candidate_requests(repository, depth, dense_embeddings, sparse_embeddings, search_params)
+    scored_points_list = repository._query_batch_points(collection_name, requests, 2 * batch_size)
+    
+    return _to_candidates(scored_points_list, depth)
 
 
 class DenseSearchRepository(BaseModel, BaseRepository):
     qdrant_client: QdrantClient
     dense_model_config: DenseModelConfig
+    upload_config: UploadConfig = UploadConfig()
+    collection_params: CollectionParams = CollectionParams()
+    text_store: TextStore | None = None
     
     model_config = {'arbitrary_types_allowed': True}
     
-    def create_collection(self, collection_name: str) -> bool: 
-        return self.qdrant_client.create_collection(
-            collection_name=collection_name,
-            vectors_config={
-                self.dense_model_config.name: self.dense_model_config.vector_params
-            }
-        )
+    def get_collection_config(self) -> dict[str, Any]:
+        return {
+            'vectors_config': {
+                self.dense_model_config.name: self.dense_model_config.get_vector_params()
+            },
+            'optimizers_config': self._get_optimizers_config()
+        }
     
-    def delete_collection(self, collection_name: str) -> bool:
-        return self.qdrant_client.delete_collection(collection_name)
-        
-    def upload_points(
+    def get_points(
         self, 
-        collection_name: str, 
         metadatas: list[Metadata],
         dense_embeddings: list[ndarray] = None,
         sparse_embeddings: list[SparseEmbedding] = None,
         reranking_embeddings: list[ndarray] = None
-    ):
+    ) -> Iterable[PointStruct]:
         items = zip(dense_embeddings, metadatas)
         
-        self.qdrant_client.upload_points(
-            collection_name=collection_name,
-            wait=True,
-            points=[
-                PointStruct(
-                    id=str(uuid4()), 
-                    vector={
-                        self.dense_model_config.name: dense_embedding,
-                    },
-                    payload={
-                        'id': metadata.id,
-                        'text': metadata.text
-                    }
-                )
-                for dense_embedding, metadata in items
-            ]
+        return (
+            PointStruct(
+                id=self.get_point_id(metadata), 
+                vector={
+                    self.dense_model_config.name: dense_embedding,
+                },
+                payload=self.get_payload(metadata)
+            )
+            for dense_embedding, metadata in items
         )
     
-    def search(
-        self, 
-        collection_name: str,
+    def get_query_request(
+        self,
         limit: int,
         prefetch_limit: int = None,
         fusion_algorithm: Fusion = None,
         dense_embedding: ndarray = None, 
         sparse_embedding: SparseEmbedding = None,
-        reranking_embedding: ndarray = None
-    ) -> list[ScoredPoint]:
-        return self.qdrant_client.search(
-            collection_name=collection_name,
-            query_vector=NamedVector(
-                name=self.dense_model_config.name,
-                vector=dense_embedding
-            ),
-            search_params=SearchParams(
-                hnsw_ef=128
-            ),
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> QueryRequest:
+        return QueryRequest(
+            query=dense_embedding,
+            using=self.dense_model_config.name,
+            params=self.dense_model_config.get_search_params(search_params),
             limit=limit,
-            with_payload=True
+            with_payload=self.get_payload_selector()
         )
 
 
 class SparseSearchRepository(BaseModel, BaseRepository):
     qdrant_client: QdrantClient
     sparse_model_config: SparseModelConfig
+    upload_config: UploadConfig = UploadConfig()
+    collection_params: CollectionParams = CollectionParams()
+    text_store: TextStore | None = None
     
     model_config = {'arbitrary_types_allowed': True}
     
-    def create_collection(self, collection_name: str) -> bool:
-        return self.qdrant_client.create_collection(
-            collection_name=collection_name,
-            vectors_config={},
-            sparse_vectors_config={
-                self.sparse_model_config.name: self.sparse_model_config.sparse_vector_params
-            }
-        )
+    def get_collection_config(self) -> dict[str, Any]:
+        return {
+            'vectors_config': {},
+            'sparse_vectors_config': {
+                self.sparse_model_config.name: self.sparse_model_config.get_sparse_vector_params()
+            },
+            'optimizers_config': self._get_optimizers_config()
+        }
     
-    def delete_collection(self, collection_name: str) -> bool:
-        return self.qdrant_client.delete_collection(collection_name)
-        
-    def upload_points(
+    def get_points(
         self, 
-        collection_name: str, 
         metadatas: list[Metadata],
         dense_embeddings: list[ndarray] = None,
         sparse_embeddings: list[SparseEmbedding] = None,
         reranking_embeddings: list[ndarray] = None
-    ):
+    ) -> Iterable[PointStruct]:
         items = zip(sparse_embeddings, metadatas)
         
-        self.qdrant_client.upload_points(
-            collection_name=collection_name,
-            wait=True,
-            points=[
-                PointStruct(
-                    id=str(uuid4()), 
-                    vector={
-                        self.sparse_model_config.name: sparse_embedding.as_object()
-                    },
-                    payload={
-                        'id': metadata.id,
-                        'text': metadata.text
-                    }
-                )
-                for sparse_embedding, metadata in items
-            ]
+        return (
+            PointStruct(
+                id=self.get_point_id(metadata), 
+                vector={
+                    self.sparse_model_config.name: self.sparse_model_config.prune_document(sparse_embedding).as_object()
+                },
+                payload=self.get_payload(metadata)
+            )
+            for sparse_embedding, metadata in items
         )
     
-    def search(
-        self, 
-        collection_name: str,
+    def get_query_request(
+        self,
         limit: int,
         prefetch_limit: int = None,
         fusion_algorithm: Fusion = None,
         dense_embedding: ndarray = None, 
         sparse_embedding: SparseEmbedding = None,
-        reranking_embedding: ndarray = None
-    ) -> list[ScoredPoint]:
-        return self.qdrant_client.search(
-            collection_name=collection_name,
-            query_vector=NamedSparseVector(
-                name=self.sparse_model_config.name,
-                vector=SparseVector(
-                    indices=sparse_embedding.indices,
-                    values=sparse_embedding.values
-                )
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> QueryRequest:
+        sparse_embedding = self.sparse_model_config.prune_query(sparse_embedding)
+        
+        return QueryRequest(
+            query=SparseVector(
+                indices=sparse_embedding.indices,
+                values=sparse_embedding.values
             ),
+            using=self.sparse_model_config.name,
             limit=limit,
-            with_payload=True
+            with_payload=self.get_payload_selector()
         )
 
 
@@ -165,72 +208,156 @@ class HybridFusionSearchRepository(BaseModel, BaseRepository):
     qdrant_client: QdrantClient
     dense_model_config: DenseModelConfig
     sparse_model_config: SparseModelConfig
+    upload_config: UploadConfig = UploadConfig()
+    collection_params: CollectionParams = CollectionParams()
+    text_store: TextStore | None = None
+    client_fusion: FusionFunction | None = None
     
     model_config = {'arbitrary_types_allowed': True}
     
-    def create_collection(self, collection_name: str) -> bool:
-        return self.qdrant_client.create_collection(
-            collection_name=collection_name,
-            vectors_config={
-                self.dense_model_config.name: self.dense_model_config.vector_params
-            },
-            sparse_vectors_config={
-                self.sparse_model_config.name: self.sparse_model_config.sparse_vector_params
-            }
-        )
+    def search(
+        self, 
+        collection_name: str,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embedding: ndarray = None, 
+        sparse_embedding: SparseEmbedding = None,
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> list[ScoredPoint]:
+        if self.client_fusion is None:
+            return super().search(
+                collection_name,
+                limit,
+                prefetch_limit,
+                fusion_algorithm,
+                dense_embedding,
+                sparse_embedding,
+                reranking_embedding,
+                search_params
+            )
+        
+        return self.search_batch(
+            collection_name,
+            limit,
+            prefetch_limit,
+            fusion_algorithm,
+            [dense_embedding],
+            [sparse_embedding],
+            batch_size=1,
+            search_params=search_params
+        )[0]
     
-    def delete_collection(self, collection_name: str) -> bool:
-        return self.qdrant_client.delete_collection(collection_name)
+    def search_batch(
+        self, 
+        collection_name: str,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embeddings: list[ndarray] = None, 
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None,
+        batch_size: int = 64,
+        search_params: SearchParams = None
+    ) -> list[list[ScoredPoint]]:
+        if self.client_fusion is None:
+            return super().search_batch(
+                collection_name,
+                limit,
+                prefetch_limit,
+                fusion_algorithm,
+                dense_embeddings,
+                sparse_embeddings,
+                reranking_embeddings,
+                batch_size,
+                search_params
+            )
+        
+        candidates_list = self.fetch_candidates(
+            collection_name,
+            prefetch_limit or limit,
+            dense_embeddings,
+            sparse_embeddings,
+            batch_size,
+            search_params
+        )
         
-    def upload_points(
+        with span('repository.client_fusion', len(dense_embeddings)):
+            candidates = self.client_fusion(candidates_list, limit)
+        
+        return to_scored_points(candidates)
+    
+    def fetch_candidates(
+        self,
+        collection_name: str,
+        depth: int,
+        dense_embeddings: list[ndarray],
+        sparse_embeddings: list[SparseEmbedding],
+        batch_size: int = 64,
+        search_params: SearchParams = None
+    ) -> list[Candidates]:
+        return _fetch_candidates(
+            self,
+            collection_name,
+            depth,
+            dense_embeddings,
+            sparse_embeddings,
+            batch_size,
+            search_params
+        )
+    
+    def get_collection_config(self) -> dict[str, Any]:
+        return {
+            'vectors_config': {
+                self.dense_model_config.name: self.dense_model_config.get_vector_params()
+            },
+            'sparse_vectors_config': {
+                self.sparse_model_config.name: self.sparse_model_config.get_sparse_vector_params()
+            },
+            'optimizers_config': self._get_optimizers_config()
+        }
+    
+    def get_points(
         self, 
-        collection_name: str, 
         metadatas: list[Metadata],
         dense_embeddings: list[ndarray] = None,
         sparse_embeddings: list[SparseEmbedding] = None,
         reranking_embeddings: list[ndarray] = None
-    ):
+    ) -> Iterable[PointStruct]:
         items = zip(dense_embeddings, sparse_embeddings, metadatas)
         
-        self.qdrant_client.upload_points(
-            collection_name=collection_name,
-            wait=True,
-            points=[
-                PointStruct(
-                    id=str(uuid4()), 
-                    vector={
-                        self.dense_model_config.name: dense_embedding,
-                        self.sparse_model_config.name: sparse_embedding.as_object()
-                    },
-                    payload={
-                        'id': metadata.id,
-                        'text': metadata.text
-                    }
-                )
-                for dense_embedding, sparse_embedding, metadata in items
-            ]
+        return (
+            PointStruct(
+                id=self.get_point_id(metadata), 
+                vector={
+                    self.dense_model_config.name: dense_embedding,
+                    self.sparse_model_config.name: self.sparse_model_config.prune_document(sparse_embedding).as_object()
+                },
+                payload=self.get_payload(metadata)
+            )
+            for dense_embedding, sparse_embedding, metadata in items
         )
     
-    def search(
-        self, 
-        collection_name: str,
+    def get_query_request(
+        self,
         limit: int,
         prefetch_limit: int = None,
         fusion_algorithm: Fusion = None,
         dense_embedding: ndarray = None, 
         sparse_embedding: SparseEmbedding = None,
-        reranking_embedding: ndarray = None
-    ) -> list[ScoredPoint]:
-        return self.qdrant_client.query_points(
-            collection_name=collection_name,
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> QueryRequest:
+        sparse_embedding = self.sparse_model_config.prune_query(sparse_embedding)
+        
+        return QueryRequest(
             prefetch=[
                 Prefetch(
                     query=dense_embedding,
                     using=self.dense_model_config.name,
-                    params=SearchParams(
-                        hnsw_ef=128
-                    ),
-                    limit=limit
+                    params=self.dense_model_config.get_search_params(search_params),
+                    limit=prefetch_limit or limit
                 ),
                 Prefetch(
                     query=SparseVector(
@@ -238,88 +365,164 @@ class HybridFusionSearchRepository(BaseModel, BaseRepository):
                         values=sparse_embedding.values
                     ),
                     using=self.sparse_model_config.name,
-                    limit=limit
+                    limit=prefetch_limit or limit
                 )
             ],
             query=FusionQuery(fusion=fusion_algorithm),
-            with_payload=True
-        ).points
-        
+            with_payload=self.get_payload_selector(),
+            limit=limit
+        )
+
 
 class HybridRerankingSearchRepository(BaseModel, BaseRepository):
     qdrant_client: QdrantClient
     dense_model_config: DenseModelConfig
     sparse_model_config: SparseModelConfig
     reranking_model_config: RerankingModelConfig
+    upload_config: UploadConfig = UploadConfig(batch_size=20, parallel=6)
+    collection_params: CollectionParams = CollectionParams()
+    text_store: TextStore | None = None
+    reranker: BaseReranker | None = None
     
     model_config = {'arbitrary_types_allowed': True}
     
-    def create_collection(self, collection_name: str) -> bool:
-        return self.qdrant_client.create_collection(
-            collection_name=collection_name,
-            vectors_config={
-                self.dense_model_config.name: self.dense_model_config.vector_params,
-                self.reranking_model_config.name: self.reranking_model_config.vector_params
-            },
-            sparse_vectors_config={
-                self.sparse_model_config.name: self.sparse_model_config.sparse_vector_params
-            }
+    def search(
+        self, 
+        collection_name: str,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embedding: ndarray = None, 
+        sparse_embedding: SparseEmbedding = None,
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> list[ScoredPoint]:
+        if self.reranker is None:
+            return super().search(
+                collection_name,
+                limit,
+                prefetch_limit,
+                fusion_algorithm,
+                dense_embedding,
+                sparse_embedding,
+                reranking_embedding,
+                search_params
+            )
+        
+        return self.search_batch(
+            collection_name,
+            limit,
+            prefetch_limit,
+            fusion_algorithm,
+            [dense_embedding],
+            [sparse_embedding],
+            [reranking_embedding],
+            batch_size=1,
+            search_params=search_params
+        )[0]
+    
+    def search_batch(
+        self, 
+        collection_name: str,
+        limit: int,
+        prefetch_limit: int = None,
+        fusion_algorithm: Fusion = None,
+        dense_embeddings: list[ndarray] = None, 
+        sparse_embeddings: list[SparseEmbedding] = None,
+        reranking_embeddings: list[ndarray] = None,
+        batch_size: int = 64,
+        search_params: SearchParams = None
+    ) -> list[list[ScoredPoint]]:
+        if self.reranker is None:
+            return super().search_batch(
+                collection_name,
+                limit,
+                prefetch_limit,
+                fusion_algorithm,
+                dense_embeddings,
+                sparse_embeddings,
+                reranking_embeddings,
+                batch_size,
+                search_params
+            )
+        
+        # the reranker scores the union of the dense and sparse prefetch results locally
+        candidates_list = _fetch_candidates(
+            self,
+            collection_name,
+            prefetch_limit or limit,
+            dense_embeddings,
+            sparse_embeddings,
+            batch_size,
+            search_params
         )
+        
+        with span('repository.rerank', len(reranking_embeddings)):
+            candidates = self.reranker.rerank(reranking_embeddings, candidates_list, limit)
+        
+        return to_scored_points(candidates)
     
-    def delete_collection(self, collection_name: str) -> bool:
-        return self.qdrant_client.delete_collection(collection_name)
+    def get_collection_config(self) -> dict[str, Any]:
+        vectors_config = {
+            self.dense_model_config.name: self.dense_model_config.get_vector_params()
+        }
         
-    def upload_points(
+        if self.reranker is None:
+            vectors_config[self.reranking_model_config.name] = self.reranking_model_config.get_vector_params()
+        
+        return {
+            'vectors_config': vectors_config,
+            'sparse_vectors_config': {
+                self.sparse_model_config.name: self.sparse_model_config.get_sparse_vector_params()
+            },
+            'optimizers_config': self._get_optimizers_config()
+        }
+    
+    def get_points(
         self, 
-        collection_name: str, 
         metadatas: list[Metadata],
         dense_embeddings: list[ndarray] = None,
         sparse_embeddings: list[SparseEmbedding] = None,
         reranking_embeddings: list[ndarray] = None
-    ):
-        items = zip(dense_embeddings, sparse_embeddings, reranking_embeddings, metadatas)
+    ) -> Iterable[PointStruct]:
+        if self.reranker is not None:
+            # reranking embeddings stay client-side and never reach the collection
+            self.reranker.index(metadatas, reranking_embeddings)
+            reranking_embeddings = None
         
-        self.qdrant_client.upload_points(
-            collection_name=collection_name,
-            wait=True,
-            points=[
-                PointStruct(
-                    id=str(uuid4()), 
-                    vector={
-                        self.dense_model_config.name: dense_embedding,
-                        self.sparse_model_config.name: sparse_embedding.as_object(),
-                        self.reranking_model_config.name: reranking_embedding
-                    },
-                    payload={
-                        'id': metadata.id,
-                        'text': metadata.text
-                    }
-                )
-                for dense_embedding, sparse_embedding, reranking_embedding, metadata in items
-            ],
-            batch_size=20,
-            parallel=6
+        items = zip(dense_embeddings, sparse_embeddings, reranking_embeddings or [None] * len(metadatas), metadatas)
+        
+        return (
+            PointStruct(
+                id=self.get_point_id(metadata), 
+                vector={
+                    self.dense_model_config.name: dense_embedding,
+                    self.sparse_model_config.name: self.sparse_model_config.prune_document(sparse_embedding).as_object(),
+                    **({self.reranking_model_config.name: reranking_embedding} if reranking_embedding is not None else {})
+                },
+                payload=self.get_payload(metadata)
+            )
+            for dense_embedding, sparse_embedding, reranking_embedding, metadata in items
         )
     
-    def search(
-        self, 
-        collection_name: str,
+    def get_query_request(
+        self,
         limit: int,
         prefetch_limit: int = None,
         fusion_algorithm: Fusion = None,
         dense_embedding: ndarray = None, 
         sparse_embedding: SparseEmbedding = None,
-        reranking_embedding: ndarray = None
-    ) -> list[ScoredPoint]:
-        return self.qdrant_client.query_points(
-            collection_name=collection_name,
+        reranking_embedding: ndarray = None,
+        search_params: SearchParams = None
+    ) -> QueryRequest:
+        sparse_embedding = self.sparse_model_config.prune_query(sparse_embedding)
+        
+        return QueryRequest(
             prefetch=[
                 Prefetch(
                     query=dense_embedding,
                     using=self.dense_model_config.name,
-                    params=SearchParams(
-                        hnsw_ef=128
-                    ),
+                    params=self.dense_model_config.get_search_params(search_params),
                     limit=prefetch_limit,
                 ),
                 Prefetch(
@@ -333,6 +536,7 @@ class HybridRerankingSearchRepository(BaseModel, BaseRepository):
             ],
             query=reranking_embedding,
             using=self.reranking_model_config.name,
-            with_payload=True,
+            params=self.reranking_model_config.get_search_params(search_params),
+            with_payload=self.get_payload_selector(),
             limit=limit,
-        ).points
+        )
@@ -0,0 +1,10 @@
+from .reranker import BaseReranker, MaxSimReranker, CrossEncoderReranker
+from .store import MultivectorStore
+
+
+__all__ = [
+    'BaseReranker',
+    'MaxSimReranker',
+    'CrossEncoderReranker',
+    'MultivectorStore'
+]
@@ -0,0 +1,109 @@
+from abc import ABC, abstractmethod
+from fastembed.rerank.cross_encoder import TextCrossEncoder
+from numpy import ndarray
+from typing import Any, Iterable
+
+import numpy as np
+
+from rag.fusion import Candidates
+from rag.models import Metadata
+
+from .store import MultivectorStore
+
+
+class BaseReranker(ABC):
+    """
+    Client-side reranking stage, scores the union of the prefetched candidates of each query.
+
+    `index` receives the documents with their reranking embeddings on upload
+    and `score` one query with the ids of its candidates.
+    """
+    @abstractmethod
+    def index(self, metadatas: list[Metadata], reranking_embeddings: list[Any] | None = None):
+        ...
+
+    @abstractmethod
+    def score(self, query: Any, doc_ids: list[str]) -> ndarray:
+        ...
+
+    def rerank(self, queries: list[Any], candidates_list: list[Candidates], limit: int) -> Candidates:
+        ids = np.full((len(queries), limit), '', dtype=object)
+        scores = np.full((len(queries), limit), np.nan)
+
+        for i, query in enumerate(queries):
+            doc_ids = list(dict.fromkeys(
+                doc_id
+                for candidates in candidates_list
+                for doc_id in candidates.ids[i].tolist()
+                if doc_id
+            ))
+
+            if not doc_ids:
+                continue
+
+            doc_scores = self.score(query, doc_ids)
+            order = np.argsort(-np.nan_to_num(doc_scores, nan=-np.inf), kind='stable')[:limit]
+            order = order[~np.isnan(doc_scores[order])]
+
+            ids[i, :len(order)] = [doc_ids[j] for j in order]
+            scores[i, :len(order)] = doc_scores[order]
+
+        return Candidates(ids.astype(str), scores)
+
+
+class MaxSimReranker(BaseReranker):
+    """
+    Late interaction (ColBERT) reranker over a local `MultivectorStore`, scores with cosine MaxSim
+    like Qdrant's `MultiVectorComparator.MAX_SIM`. Candidates missing from the store are dropped.
+    """
+    def __init__(self, store: MultivectorStore):
+        self.store = store
+
+    def index(self, metadatas: list[Metadata], reranking_embeddings: list[ndarray] | None = None):
+        self.store.add([str(metadata.id) for metadata in metadatas], reranking_embeddings)
+
+    def score(self, query: ndarray, doc_ids: list[str]) -> ndarray:
+        scores = np.full(len(doc_ids), np.nan)
+        tokens, positions, found = self.store.get(doc_ids)
+
+        if not found.any():
+            return scores
+
+        query = np.asarray(query, dtype=np.float32)
+        query = query / np.maximum(np.linalg.norm(query, axis=1, keepdims=True), 1e-12)
+
+        # (query tokens, candidate tokens) similarities, max per document, summed over query tokens
+        similarities = query @ tokens.T
+        scores[found] = np.maximum.reduceat(similarities, positions, axis=1).sum(axis=0)
+
+        return scores
+
+
+class CrossEncoderReranker(BaseReranker):
+    """
+    Reranker over a fastembed `TextCrossEncoder`, keeps the document texts in memory.
+
+    Cross-encoders score raw text, so `embed` returns the texts unchanged and the reranker
+    itself is passed as the reranking model for the queries to reach `score` as text.
+    """
+    def __init__(self, model: TextCrossEncoder, batch_size: int = 64):
+        self.model = model
+        self.model_name: str = model.model_name
+        self.batch_size = batch_size
+        self.texts: dict[str, str] = {}
+
+    def embed(self, documents: str | Iterable[str], **kwargs) -> Iterable[str]:
+        return iter([documents] if isinstance(documents, str) else list(documents))
+
+    def index(self, metadatas: list[Metadata], reranking_embeddings: list[Any] | None = None):
+        self.texts.update((str(metadata.id), metadata.text) for metadata in metadatas)
+
+    def score(self, query: str, doc_ids: list[str]) -> ndarray:
+        scores = np.full(len(doc_ids), np.nan)
+        found = [i for i, doc_id in enumerate(doc_ids) if doc_id in self.texts]
+
+        if found:
+            documents = [self.texts[doc_ids[i]] for i in found]
+            scores[found] = list(self.model.rerank(query, documents, batch_size=self.batch_size))
+
+        return scores
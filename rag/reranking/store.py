@@ -0,0 +1,281 @@
+from hashlib import blake2b
+from numpy import ndarray
+from pathlib import Path
+from threading import Lock
+
+import json
+import numpy as np
+import os
+
+from rag.stores.files import write_json
+
+
+DTYPES = {'float16': np.float16, 'int8': np.int8}
+FILE_NAMES = ('tokens', 'lengths', 'scales', 'hashes', 'ids')
+
+
+def _append(path: Path, data: bytes):
+    with open(path, 'ab') as file:
+        file.write(data)
+
+
+def _truncate(path: Path, size: int):
+    if path.stat().st_size != size:
+        os.truncate(path, size)
+
+
+class MultivectorStore:
+    """
+    Append-only, memory-mapped store of L2-normalised document token matrices.
+
+    - `tokens.{generation}.bin` holds the stacked token vectors as float16, or as int8 with one scale per document
+    - `lengths.{generation}.bin` holds the token count of every document, `scales.{generation}.bin` the int8 scales
+    - `hashes.{generation}.bin` holds a hash of every document's stored tokens
+    - `ids.{generation}.jsonl` maps row numbers to document ids, re-adding an id points it to the new row
+
+    Every `add` only appends to these files and skips documents stored with the same tokens.
+    A torn append is cut back to the last complete document on load. Once replaced documents
+    make up more than `compact_ratio` of the tokens, the live ones are rewritten to the next
+    generation of the files and `meta.json` switches to it atomically.
+    """
+    def __init__(self, store_dir: str | Path, dtype: str = 'float16', compact_ratio: float = 0.5):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.compact_ratio = compact_ratio
+
+        self._lock = Lock()
+        self._tokens: ndarray | None = None
+        self._offsets: ndarray | None = None
+
+        meta_path = self.store_dir / 'meta.json'
+
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            self.dtype = meta['dtype']
+            self.dim: int | None = meta['dim']
+            self._generation: int = meta['generation']
+            self._load()
+        else:
+            self.dtype = dtype
+            self.dim = None
+            self._generation = 0
+            self._ids: list[str] = []
+            self._lengths = [np.zeros(0, dtype=np.int64)]
+            self._scales = [np.zeros(0, dtype=np.float32)]
+            self._token_count = 0
+            self._rows: dict[str, tuple[int, int, int]] = {}
+            self._dead_token_count = 0
+
+        if self.dtype not in DTYPES:
+            raise ValueError(f'Unsupported dtype {self.dtype}, expected one of {list(DTYPES)}')
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def token_count(self) -> int:
+        return self._token_count
+
+    def add(self, ids: list[str], multivectors: list[ndarray]):
+        # the last multivector of an id wins, within a batch too
+        documents = {str(doc_id): multivector for doc_id, multivector in zip(ids, multivectors)}
+
+        if not documents:
+            return
+
+        lengths = np.array([len(multivector) for multivector in documents.values()], dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        tokens = np.concatenate(list(documents.values())).astype(np.float32)
+        tokens /= np.maximum(np.linalg.norm(tokens, axis=1, keepdims=True), 1e-12)
+
+        if self.dtype == 'int8':
+            scales = np.maximum.reduceat(np.abs(tokens).max(axis=1), starts) / 127
+            scales = np.maximum(scales, 1e-12).astype(np.float32)
+            tokens = np.round(tokens / np.repeat(scales, lengths)[:, None]).astype(np.int8)
+        else:
+            scales = np.ones(len(documents), dtype=np.float32)
+            tokens = tokens.astype(np.float16)
+
+        hashes = [
+            int.from_bytes(blake2b(tokens[start:start + length].tobytes() + scale.tobytes(), digest_size=8).digest(), 'little')
+            for start, length, scale in zip(starts.tolist(), lengths.tolist(), scales)
+        ]
+
+        with self._lock:
+            doc_ids = list(documents)
+            changed = np.array(
+                [self._rows.get(doc_id, (None, None))[1] != content_hash for doc_id, content_hash in zip(doc_ids, hashes)],
+                dtype=bool
+            )
+
+            if not changed.any():
+                return
+
+            if self.dim is None:
+                self.dim = tokens.shape[1]
+                write_json(self.store_dir / 'meta.json', {'dtype': self.dtype, 'dim': self.dim, 'generation': self._generation})
+
+            self._append(
+                [doc_id for doc_id, is_changed in zip(doc_ids, changed) if is_changed],
+                tokens[np.repeat(changed, lengths)],
+                lengths[changed],
+                scales[changed],
+                np.array(hashes, dtype=np.uint64)[changed]
+            )
+
+            if self._dead_token_count > self.compact_ratio * self._token_count:
+                self._compact()
+
+    def get(self, ids: list[str]) -> tuple[ndarray, ndarray, ndarray]:
+        """
+        Returns the dequantised float32 tokens of the stored `ids` stacked into one matrix,
+        the start of every document within it and a mask of which `ids` were found.
+        """
+        with self._lock:
+            found = np.array([doc_id in self._rows for doc_id in ids], dtype=bool)
+            rows = np.array([self._rows[doc_id][0] for doc_id in ids if doc_id in self._rows], dtype=np.int64)
+
+            if not len(rows):
+                return np.zeros((0, self.dim or 0), dtype=np.float32), np.zeros(0, dtype=np.int64), found
+
+            offsets, scales = self._get_offsets()
+            all_tokens = self._get_tokens()
+
+        starts, ends = offsets[rows], offsets[rows + 1]
+        lengths = ends - starts
+        positions = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+        # one gather over the memory map instead of a slice per document
+        token_rows = np.repeat(starts - positions, lengths) + np.arange(lengths.sum())
+        tokens = all_tokens[token_rows].astype(np.float32)
+
+        if self.dtype == 'int8':
+            tokens *= np.repeat(scales[rows], lengths)[:, None]
+
+        return tokens, positions, found
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def size_bytes(self) -> int:
+        return sum(path.stat().st_size for path in self.store_dir.iterdir() if path.is_file())
+
+    def _get_paths(self, generation: int) -> dict[str, Path]:
+        return {
+            name: self.store_dir / (f'{name}.{generation}.jsonl' if name == 'ids' else f'{name}.{generation}.bin')
+            for name in FILE_NAMES
+        }
+
+    def _append(self, doc_ids: list[str], tokens: ndarray, lengths: ndarray, scales: ndarray, hashes: ndarray):
+        paths = self._get_paths(self._generation)
+
+        # ids last, they decide how many documents are complete on load
+        _append(paths['tokens'], tokens.tobytes())
+        _append(paths['lengths'], lengths.tobytes())
+        _append(paths['scales'], scales.tobytes())
+        _append(paths['hashes'], hashes.tobytes())
+        _append(paths['ids'], ''.join(json.dumps(doc_id) + '\n' for doc_id in doc_ids).encode('utf-8'))
+
+        first_row = len(self._ids)
+
+        for i, (doc_id, length, content_hash) in enumerate(zip(doc_ids, lengths.tolist(), hashes.tolist())):
+            replaced = self._rows.get(doc_id)
+
+            if replaced is not None:
+                self._dead_token_count += replaced[2]
+
+            self._rows[doc_id] = (first_row + i, content_hash, length)
+
+        self._ids.extend(doc_ids)
+        self._lengths.append(lengths)
+        self._scales.append(scales)
+        self._token_count += int(lengths.sum())
+        self._tokens = None
+        self._offsets = None
+
+    def _compact(self):
+        if not self._dead_token_count:
+            return
+
+        rows = np.array(sorted(row for row, _, _ in self._rows.values()), dtype=np.int64)
+        offsets, scales = self._get_offsets()
+        tokens = self._get_tokens()
+        lengths = offsets[rows + 1] - offsets[rows]
+        hashes = np.array([content_hash for _, content_hash, _ in sorted(self._rows.values())], dtype=np.uint64)
+
+        generation = self._generation + 1
+        paths = self._get_paths(generation)
+
+        with open(paths['tokens'], 'wb') as file:
+            for start, end in zip(offsets[rows].tolist(), offsets[rows + 1].tolist()):
+                file.write(tokens[start:end].tobytes())
+
+        lengths.tofile(paths['lengths'])
+        scales[rows].tofile(paths['scales'])
+        hashes.tofile(paths['hashes'])
+        paths['ids'].write_bytes(''.join(json.dumps(self._ids[row]) + '\n' for row in rows.tolist()).encode('utf-8'))
+
+        # readers still mapping the previous generation keep it until they drop the map
+        write_json(self.store_dir / 'meta.json', {'dtype': self.dtype, 'dim': self.dim, 'generation': generation})
+
+        for path in self._get_paths(self._generation).values():
+            path.unlink()
+
+        self._generation = generation
+        self._tokens = None
+        self._offsets = None
+        self._load()
+
+    def _get_tokens(self) -> ndarray:
+        if self._tokens is None:
+            self._tokens = np.memmap(
+                self._get_paths(self._generation)['tokens'],
+                dtype=DTYPES[self.dtype],
+                mode='r',
+                shape=(self._token_count, self.dim)
+            )
+
+        return self._tokens
+
+    def _get_offsets(self) -> tuple[ndarray, ndarray]:
+        if self._offsets is None:
+            # the chunks appended since the last read are merged once
+            self._lengths = [np.concatenate(self._lengths)]
+            self._scales = [np.concatenate(self._scales)]
+            self._offsets = np.concatenate([[0], np.cumsum(self._lengths[0])])
+
+        return self._offsets, self._scales[0]
+
+    def _load(self):
+        paths = self._get_paths(self._generation)
+
+        for path in paths.values():
+            if not path.exists():
+                path.touch()
+
+        lines = paths['ids'].read_bytes().split(b'\n')[:-1]
+        lengths = np.fromfile(paths['lengths'], dtype=np.int64)
+        scales = np.fromfile(paths['scales'], dtype=np.float32)
+        hashes = np.fromfile(paths['hashes'], dtype=np.uint64)
+
+        count = min(len(lines), len(lengths), len(scales), len(hashes))
+        lengths, scales, hashes, lines = lengths[:count], scales[:count], hashes[:count], lines[:count]
+        token_count = int(lengths.sum())
+
+        # drop whatever an interrupted add left behind, so later appends line up again
+        _truncate(paths['tokens'], token_count * self.dim * np.dtype(DTYPES[self.dtype]).itemsize)
+        _truncate(paths['lengths'], lengths.nbytes)
+        _truncate(paths['scales'], scales.nbytes)
+        _truncate(paths['hashes'], hashes.nbytes)
+        _truncate(paths['ids'], sum(len(line) + 1 for line in lines))
+
+        self._ids = [json.loads(line) for line in lines]
+        self._lengths = [lengths]
+        self._scales = [scales]
+        self._token_count = token_count
+        self._rows = {
+            doc_id: (row, content_hash, length)
+            for row, (doc_id, content_hash, length) in enumerate(zip(self._ids, hashes.tolist(), lengths.tolist()))
+        }
+        self._dead_token_count = token_count - sum(length for _, _, length in self._rows.values())
@@ -0,0 +1,9 @@
+from .pipeline import RAGPipeline, GenerationStream
+from .stub import StubLLMServer
+
+
+__all__ = [
+    'RAGPipeline',
+    'GenerationStream',
+    'StubLLMServer'
+]
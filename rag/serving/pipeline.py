@@ -0,0 +1,271 @@
+from asyncio import Condition, Task, create_task, to_thread
+from collections import OrderedDict
+from fastembed import TextEmbedding, SparseTextEmbedding, LateInteractionTextEmbedding
+from openai import AsyncOpenAI
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Fusion, ScoredPoint
+from time import perf_counter
+from typing import Any, AsyncIterator
+
+from rag.base import BaseRepository
+from rag.models import EmbeddingParams
+from rag.profiling import span
+from rag.repositories import AsyncSearchRepository, CachedSearchRepository, ExactSearchRepository
+from rag.utils import EmbeddingExecutor
+
+
+PROMPT = (
+    'You are a helpful assistant that answers given question using ONLY PROVIDED CONTEXT.\n'
+    'You are not allowed to use any previous knowledge.\n'
+    'If you don\'t know the answer, say so.\n\n'
+    '<context_start>\n'
+    '{context}\n'
+    '<context_end>\n\n'
+    '<question_start>\n'
+    '{question}\n'
+    '<question_end>'
+)
+
+
+def _supports_async(repository: BaseRepository) -> bool:
+    # the async wrapper sends the repository's requests to the server, the cache and the exact backend search elsewhere
+    return not isinstance(repository, (CachedSearchRepository, ExactSearchRepository))
+
+
+class GenerationStream:
+    """
+    Tokens of one generation as they arrive. Coalesced requests share the stream and every
+    iteration replays it from the first token. `timings` holds the milliseconds from the arrival
+    of the first request to the end of each stage, `ttft_ms` to the first token.
+    """
+    def __init__(self):
+        self.tokens: list[str] = []
+        self.scored_points: list[ScoredPoint] = []
+        self.timings: dict[str, float] = {}
+        self.context_cache_hit = False
+        self.done = False
+        self.exception: BaseException | None = None
+
+        self._condition = Condition()
+        self._task: Task | None = None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        i = 0
+
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: i < len(self.tokens) or self.done)
+
+                if i == len(self.tokens) and self.done:
+                    if self.exception is not None:
+                        raise self.exception
+
+                    return
+
+                tokens = self.tokens[i:]
+
+            for token in tokens:
+                yield token
+
+            i += len(tokens)
+
+    async def text(self) -> str:
+        return ''.join([token async for token in self])
+
+    async def _put(self, token: str):
+        async with self._condition:
+            self.tokens.append(token)
+            self._condition.notify_all()
+
+    async def _close(self, exception: BaseException | None = None):
+        async with self._condition:
+            self.exception = exception
+            self.done = True
+            self._condition.notify_all()
+
+
+class RAGPipeline:
+    """
+    Retrieval augmented generation over any `BaseRepository` with an OpenAI-compatible chat API.
+
+    The query is embedded by all configured models at once, searched through `AsyncQdrantClient`
+    if `async_qdrant_client` is set (in a worker thread otherwise, and always for `CachedSearchRepository`
+    and `ExactSearchRepository`, which do not search the server directly) and generation is streamed.
+    Identical queries in flight share one `GenerationStream` and assembled contexts are cached
+    by the ranked ids of the retrieved passages, so repeated retrievals skip the text lookup.
+    """
+    def __init__(
+        self,
+        repository: BaseRepository,
+        collection_name: str,
+        llm_client: AsyncOpenAI,
+        llm_model: str,
+        dense_model: TextEmbedding | None = None,
+        sparse_model: SparseTextEmbedding | None = None,
+        reranking_model: LateInteractionTextEmbedding | None = None,
+        dense_params: EmbeddingParams | None = None,
+        sparse_params: EmbeddingParams | None = None,
+        reranking_params: EmbeddingParams | None = None,
+        async_qdrant_client: AsyncQdrantClient | None = None,
+        limit: int = 5,
+        prefetch_limit: int | None = None,
+        fusion_algorithm: Fusion | None = None,
+        prompt: str = PROMPT,
+        temperature: float = 0.2,
+        max_tokens: int = 1024,
+        context_cache_size: int = 1_024
+    ):
+        self.repository = repository
+        self.collection_name = collection_name
+        self.llm_client = llm_client
+        self.llm_model = llm_model
+        self.embedding_executor = EmbeddingExecutor(
+            dense_model,
+            sparse_model,
+            reranking_model,
+            dense_params,
+            sparse_params,
+            reranking_params
+        )
+        self.async_repository = AsyncSearchRepository(
+            repository=repository,
+            async_qdrant_client=async_qdrant_client
+        ) if async_qdrant_client is not None and _supports_async(repository) else None
+        self.limit = limit
+        self.prefetch_limit = prefetch_limit
+        self.fusion_algorithm = fusion_algorithm
+        self.prompt = prompt
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.context_cache_size = context_cache_size
+
+        self.context_cache_hits = 0
+        self.coalesced = 0
+
+        self._context_cache: OrderedDict[tuple[str, ...], str] = OrderedDict()
+        self._in_flight: dict[str, GenerationStream] = {}
+
+    def stream(self, query: str) -> GenerationStream:
+        # called from the event loop only, so checking and registering cannot interleave
+        stream = self._in_flight.get(query)
+
+        if stream is not None:
+            self.coalesced += 1
+
+            return stream
+
+        stream = GenerationStream()
+        self._in_flight[query] = stream
+        stream._task = create_task(self._run(query, stream))
+        stream._task.add_done_callback(lambda _: self._in_flight.pop(query, None))
+
+        return stream
+
+    async def answer(self, query: str) -> dict[str, Any]:
+        stream = self.stream(query)
+        answer = await stream.text()
+
+        return {
+            'answer': answer,
+            'ids': [scored_point.payload['id'] for scored_point in stream.scored_points],
+            'context_cache_hit': stream.context_cache_hit,
+            **stream.timings
+        }
+
+    async def _run(self, query: str, stream: GenerationStream):
+        start = perf_counter()
+
+        def elapsed_ms() -> float:
+            return (perf_counter() - start) * 1_000
+
+        try:
+            with span('serve.embed'):
+                dense_embeddings, sparse_embeddings, reranking_embeddings = await to_thread(
+                    self.embedding_executor.embed,
+                    [query]
+                )
+
+            stream.timings['embed_ms'] = elapsed_ms()
+
+            with span('serve.search'):
+                stream.scored_points = await self._search(
+                    dense_embeddings[0] if dense_embeddings else None,
+                    sparse_embeddings[0] if sparse_embeddings else None,
+                    reranking_embeddings[0] if reranking_embeddings else None
+                )
+
+            stream.timings['search_ms'] = elapsed_ms()
+
+            with span('serve.context'):
+                context = await self._get_context(stream)
+
+            stream.timings['context_ms'] = elapsed_ms()
+
+            with span('serve.generate'):
+                response = await self.llm_client.chat.completions.create(
+                    model=self.llm_model,
+                    messages=[{
+                        'role': 'user',
+                        'content': self.prompt.format(context=context, question=query)
+                    }],
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    stream=True
+                )
+
+                async for chunk in response:
+                    token = chunk.choices[0].delta.content if chunk.choices else None
+
+                    if not token:
+                        continue
+
+                    if 'ttft_ms' not in stream.timings:
+                        stream.timings['ttft_ms'] = elapsed_ms()
+
+                    await stream._put(token)
+
+            stream.timings['total_ms'] = elapsed_ms()
+            await stream._close()
+        except BaseException as exception:
+            # consumers re-raise it, only cancellation propagates out of the task
+            await stream._close(exception)
+
+            if not isinstance(exception, Exception):
+                raise
+
+    async def _search(self, dense_embedding: Any, sparse_embedding: Any, reranking_embedding: Any) -> list[ScoredPoint]:
+        args = (
+            self.collection_name,
+            self.limit,
+            self.prefetch_limit,
+            self.fusion_algorithm,
+            dense_embedding,
+            sparse_embedding,
+            reranking_embedding
+        )
+
+        if self.async_repository is not None:
+            return await self.async_repository.search(*args)
+
+        return await to_thread(self.repository.search, *args)
+
+    async def _get_context(self, stream: GenerationStream) -> str:
+        key = tuple(str(scored_point.payload['id']) for scored_point in stream.scored_points)
+        context = self._context_cache.get(key)
+
+        if context is not None:
+            self._context_cache.move_to_end(key)
+            self.context_cache_hits += 1
+            stream.context_cache_hit = True
+
+            return context
+
+        texts = await to_thread(self.repository.get_texts, stream.scored_points)
+        context = '\n\n'.join(text for text in texts if text)
+
+        self._context_cache[key] = context
+
+        while len(self._context_cache) > self.context_cache_size:
+            self._context_cache.popitem(last=False)
+
+        return context
@@ -0,0 +1,87 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep, time
+
+import json
+
+
+class StubLLMServer:
+    """
+    Minimal OpenAI-compatible chat completions server for local tests, streams `tokens` as
+    server-sent events with `first_token_delay` before the first and `token_delay` between tokens.
+    Use it as a context manager and point the client's `base_url` at `url`.
+    """
+    def __init__(
+        self,
+        tokens: list[str] | None = None,
+        first_token_delay: float = 0.0,
+        token_delay: float = 0.0,
+        host: str = '127.0.0.1',
+        port: int = 0
+    ):
+        self.tokens = tokens or ['This ', 'is ', 'a ', 'stub ', 'answer.']
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.requests: list[dict] = []
+
+        self._server = ThreadingHTTPServer((host, port), self._get_handler())
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+
+        return f'http://{host}:{port}/v1'
+
+    def __enter__(self) -> 'StubLLMServer':
+        self._thread.start()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _get_handler(self) -> type[BaseHTTPRequestHandler]:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stub.requests.append(body)
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+
+                sleep(stub.first_token_delay)
+
+                for i, token in enumerate(stub.tokens):
+                    if i:
+                        sleep(stub.token_delay)
+
+                    self._send_event(body['model'], {'role': 'assistant', 'content': token} if not i else {'content': token})
+
+                self._send_event(body['model'], {}, finish_reason='stop')
+                self.wfile.write(b'data: [DONE]\n\n')
+                self.wfile.flush()
+
+            def _send_event(self, model: str, delta: dict, finish_reason: str | None = None):
+                chunk = {
+                    'id': 'chatcmpl-stub',
+                    'object': 'chat.completion.chunk',
+                    'created': int(time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+                }
+                self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,4 @@
+from .text_store import TextStore
+
+
+__all__ = ['TextStore']
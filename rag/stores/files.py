@@ -0,0 +1,16 @@
+from pathlib import Path
+from typing import Any
+
+import json
+import os
+
+
+def write_text(path: Path, text: str):
+    # readers see either the previous or the new file, never a partial one
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+def write_json(path: Path, obj: Any):
+    write_text(path, json.dumps(obj))
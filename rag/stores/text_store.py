@@ -0,0 +1,270 @@
+from hashlib import blake2b
+from numpy import ndarray
+from pathlib import Path
+from threading import RLock
+from typing import Any
+
+import json
+import numpy as np
+import os
+
+from rag.models import Metadata
+
+from .files import write_json
+
+
+# one record per stored passage, the passage starts where the previous one ends
+INDEX_DTYPE = np.dtype([('key', '<u8'), ('check', '<u8'), ('end', '<i8')])
+
+
+def _get_keys(doc_ids: list[Any]) -> tuple[ndarray, ndarray]:
+    # a 128-bit hash of the id, ids colliding on `key` are told apart by `check`
+    digests = b''.join(blake2b(str(doc_id).encode('utf-8'), digest_size=16).digest() for doc_id in doc_ids)
+    hashes = np.frombuffer(digests, dtype='<u8').reshape(-1, 2)
+
+    return hashes[:, 0].copy(), hashes[:, 1].copy()
+
+
+def _sorted_run(keys: ndarray, checks: ndarray, rows: ndarray) -> tuple[ndarray, ndarray, ndarray]:
+    # sorted by key and check, the newest row of every id wins
+    order = np.lexsort((rows, checks, keys))
+    keys, checks, rows = keys[order], checks[order], rows[order]
+    last = np.append((keys[1:] != keys[:-1]) | (checks[1:] != checks[:-1]), True)[:len(keys)]
+
+    return keys[last], checks[last], rows[last]
+
+
+def _truncate(path: Path, size: int):
+    if path.stat().st_size != size:
+        os.truncate(path, size)
+
+
+class TextStore:
+    """
+    Append-only, memory-mapped passage store keyed by `Metadata.id`, so collections can keep
+    only the ids in their payload. `texts.bin` holds the UTF-8 encoded passages and `index.bin`
+    a 128-bit hash of the id and the end offset of each, both only grow on `add`. Ids are looked up
+    in sorted runs of the hashes, neighbouring runs of similar size are merged as they grow.
+
+    Re-adding an id with the same text is a no-op and with a new text points it to the new passage.
+    Once superseded passages make up more than `compact_ratio` of `texts.bin`, the live ones are
+    rewritten to the next generation of both files and `meta.json` switches to it atomically.
+    """
+    def __init__(self, store_dir: str | Path, compact_ratio: float = 0.5):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.compact_ratio = compact_ratio
+
+        self._lock = RLock()
+        self._data: np.memmap | bytes | None = None
+        self._index: np.memmap | ndarray | None = None
+
+        meta_path = self.store_dir / 'meta.json'
+        self._generation: int = json.loads(meta_path.read_text())['generation'] if meta_path.exists() else 0
+        self._load()
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __contains__(self, doc_id: Any) -> bool:
+        with self._lock:
+            return bool(self._find(*_get_keys([doc_id]))[0] >= 0)
+
+    def add(self, metadatas: list[Metadata]):
+        if not metadatas:
+            return
+
+        # the last passage of an id wins, within a batch too
+        encoded_texts = {str(metadata.id): metadata.text.encode('utf-8') for metadata in metadatas}
+        doc_ids = list(encoded_texts)
+        keys, checks = _get_keys(doc_ids)
+
+        with self._lock:
+            rows = self._find(keys, checks)
+            stored_texts = self._read(rows)
+            changed = np.array(
+                [i for i, (doc_id, stored_text) in enumerate(zip(doc_ids, stored_texts)) if encoded_texts[doc_id] != stored_text],
+                dtype=np.int64
+            )
+
+            if not len(changed):
+                return
+
+            texts = [encoded_texts[doc_ids[i]] for i in changed]
+            records = np.empty(len(changed), dtype=INDEX_DTYPE)
+            records['key'] = keys[changed]
+            records['check'] = checks[changed]
+            records['end'] = self._size + np.cumsum([len(text) for text in texts])
+
+            # passages first, a passage without its record is cut off on load
+            texts_path, index_path = self._get_paths(self._generation)
+
+            with open(texts_path, 'ab') as file:
+                file.write(b''.join(texts))
+
+            with open(index_path, 'ab') as file:
+                file.write(records.tobytes())
+
+            replaced = [stored_texts[i] for i in changed if stored_texts[i] is not None]
+            self._live += len(changed) - len(replaced)
+            self._live_bytes += sum(len(text) for text in texts) - sum(len(text) for text in replaced)
+            self._runs.append(_sorted_run(records['key'], records['check'], self._count + np.arange(len(changed))))
+            self._merge_runs()
+            self._count += len(changed)
+            self._size = int(records['end'][-1])
+            self._data = None
+            self._index = None
+
+            if self._size - self._live_bytes > self.compact_ratio * self._size:
+                self._compact()
+
+    def get(self, doc_ids: list[Any]) -> list[str | None]:
+        keys, checks = _get_keys(doc_ids)
+
+        with self._lock:
+            texts = self._read(self._find(keys, checks))
+
+        return [None if text is None else text.decode('utf-8') for text in texts]
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def size_bytes(self) -> int:
+        return sum(path.stat().st_size for path in self.store_dir.iterdir() if path.is_file())
+
+    def _get_paths(self, generation: int) -> tuple[Path, Path]:
+        return self.store_dir / f'texts.{generation}.bin', self.store_dir / f'index.{generation}.bin'
+
+    def _load(self):
+        texts_path, index_path = self._get_paths(self._generation)
+
+        for path in (texts_path, index_path):
+            if not path.exists():
+                path.touch()
+
+        # drop a torn record and the passages an interrupted add wrote without records,
+        # an intact store is left untouched so processes that only read can open it concurrently
+        _truncate(index_path, index_path.stat().st_size // INDEX_DTYPE.itemsize * INDEX_DTYPE.itemsize)
+        index = np.fromfile(index_path, dtype=INDEX_DTYPE)
+        self._size = int(index['end'][-1]) if len(index) else 0
+        _truncate(texts_path, self._size)
+
+        keys, checks, rows = _sorted_run(index['key'], index['check'], np.arange(len(index)))
+        starts = np.concatenate([[0], index['end'][:-1]])
+
+        self._count = len(index)
+        self._runs = [(keys, checks, rows)] if len(keys) else []
+        self._live = len(keys)
+        self._live_bytes = int((index['end'][rows] - starts[rows]).sum())
+
+    def _merge_runs(self):
+        # like a binary counter, so there are O(log n) runs and every row is merged O(log n) times
+        while len(self._runs) > 1 and len(self._runs[-2][0]) <= len(self._runs[-1][0]):
+            self._runs[-2:] = [_sorted_run(*(np.concatenate(arrays) for arrays in zip(*self._runs[-2:])))]
+
+    def _find(self, keys: ndarray, checks: ndarray) -> ndarray:
+        rows = np.full(len(keys), -1, dtype=np.int64)
+
+        # newest run first, an older run may still hold a superseded row
+        for run_keys, run_checks, run_rows in reversed(self._runs):
+            missing = np.flatnonzero(rows < 0)
+
+            if not len(missing):
+                break
+
+            missing_keys, missing_checks = keys[missing], checks[missing]
+            positions = np.searchsorted(run_keys, missing_keys)
+
+            # ids colliding on the key sit next to each other ordered by check, this rarely loops
+            while True:
+                clipped = np.minimum(positions, len(run_keys) - 1)
+                colliding = (
+                    (positions < len(run_keys)) & 
+                    (run_keys[clipped] == missing_keys) & 
+                    (run_checks[clipped] < missing_checks)
+                )
+
+                if not colliding.any():
+                    break
+
+                positions[colliding] += 1
+
+            clipped = np.minimum(positions, len(run_keys) - 1)
+            hits = (
+                (positions < len(run_keys)) & 
+                (run_keys[clipped] == missing_keys) & 
+                (run_checks[clipped] == missing_checks)
+            )
+            rows[missing[hits]] = run_rows[clipped[hits]]
+
+        return rows
+
+    def _read(self, rows: ndarray) -> list[bytes | None]:
+        data = self._get_data()
+        ends = self._get_index()['end']
+        texts = []
+
+        for row in rows.tolist():
+            if row < 0:
+                texts.append(None)
+                continue
+
+            start = int(ends[row - 1]) if row else 0
+            texts.append(bytes(data[start:int(ends[row])]))
+
+        return texts
+
+    def _compact(self):
+        if not self._runs:
+            return
+
+        keys, checks, rows = _sorted_run(*(np.concatenate(arrays) for arrays in zip(*self._runs)))
+        order = np.argsort(rows)
+        keys, checks, rows = keys[order], checks[order], rows[order]
+
+        data = self._get_data()
+        ends = self._get_index()['end']
+        starts = np.concatenate([[0], ends[:-1]])[rows]
+        ends = ends[rows]
+
+        generation = self._generation + 1
+        texts_path, index_path = self._get_paths(generation)
+
+        with open(texts_path, 'wb') as file:
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                file.write(data[start:end])
+
+        records = np.empty(len(rows), dtype=INDEX_DTYPE)
+        records['key'] = keys
+        records['check'] = checks
+        records['end'] = np.cumsum(ends - starts)
+        records.tofile(index_path)
+
+        # readers still mapping the previous generation keep it until they drop the map
+        write_json(self.store_dir / 'meta.json', {'generation': generation})
+
+        for path in self._get_paths(self._generation):
+            path.unlink()
+
+        self._generation = generation
+        self._data = None
+        self._index = None
+        self._load()
+
+    def _get_data(self) -> np.memmap | bytes:
+        with self._lock:
+            if self._data is None:
+                # numpy refuses to map an empty file
+                texts_path, _ = self._get_paths(self._generation)
+                self._data = np.memmap(texts_path, dtype=np.uint8, mode='r') if self._size else b''
+
+            return self._data
+
+    def _get_index(self) -> np.memmap | ndarray:
+        with self._lock:
+            if self._index is None:
+                _, index_path = self._get_paths(self._generation)
+                self._index = np.memmap(index_path, dtype=INDEX_DTYPE, mode='r') if self._count else np.zeros(0, dtype=INDEX_DTYPE)
+
+            return self._index
@@ -1,6 +1,48 @@
+from .benchmark import (
+    benchmark_search,
+    benchmark_async_search,
+    benchmark_ranx,
+    benchmark_reranking,
+    benchmark_quantization,
+    benchmark_sparse_pruning,
+    benchmark_cascade,
+    benchmark_models
+)
+from .cache import EmbeddingCache, CachedEmbeddingModel
 from .evaluator import Evaluator
+from .executor import EmbeddingExecutor
+from .ingest import PartitionedIngest
 from .loader import load_datasets
-from .ranx import get_qrels, get_run
+from .ranx import get_qrels, get_run, get_run_from_columns, get_fusion_runs
+from .registry import ModelRegistry, model_registry, load_model_specs
+from .suite import BenchmarkSuite
+from .sweep import Sweep
+from .tuner import tune_hnsw
 
 
-__all__ = ['Evaluator', 'load_datasets', 'get_qrels', 'get_run'] 
\ No newline at end of file
+__all__ = [
+    'Evaluator',
+    'load_datasets',
+    'get_qrels',
+    'get_run',
+    'get_run_from_columns',
+    'get_fusion_runs',
+    'benchmark_search',
+    'benchmark_async_search',
+    'benchmark_ranx',
+    'benchmark_reranking',
+    'benchmark_quantization',
+    'benchmark_sparse_pruning',
+    'benchmark_cascade',
+    'benchmark_models',
+    'EmbeddingCache',
+    'CachedEmbeddingModel',
+    'EmbeddingExecutor',
+    'PartitionedIngest',
+    'Sweep',
+    'ModelRegistry',
+    'model_registry',
+    'load_model_specs',
+    'BenchmarkSuite',
+    'tune_hnsw'
+]
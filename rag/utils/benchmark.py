@@ -0,0 +1,517 @@
+from asyncio import Semaphore, gather
+from fastembed import SparseEmbedding
+from numpy import ndarray, percentile
+from pandas import DataFrame
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Fusion,
+    Datatype,
+    ScalarQuantization,
+    BinaryQuantization,
+    ProductQuantization
+)
+from qdrant_client.http.models import ScoredPoint, SparseVector
+from ranx import Qrels, Run
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Callable
+from rag.base import BaseRepository
+from rag.models import CascadeShape
+from rag.profiling import get_rss_mb
+from rag.repositories import AsyncSearchRepository, CascadeSearchRepository
+from rag.reranking import MaxSimReranker
+
+from .ranx import get_qrels, get_run
+from .registry import ModelKind, ModelRegistry, load_model_specs
+
+if TYPE_CHECKING:
+    from .evaluator import Evaluator
+
+
+def _get_query_count(*embeddings_lists: list | None) -> int:
+    return next(len(embeddings) for embeddings in embeddings_lists if embeddings is not None)
+
+
+def benchmark_search(
+    repository: BaseRepository,
+    collection_name: str,
+    limit: int,
+    prefetch_limit: int | None = None,
+    fusion_algorithm: Fusion | None = None,
+    dense_embeddings: list[ndarray] | None = None,
+    sparse_embeddings: list[SparseEmbedding] | None = None,
+    reranking_embeddings: list[ndarray] | None = None,
+    batch_size: int = 64
+) -> dict[str, float]:
+    query_count = _get_query_count(dense_embeddings, sparse_embeddings, reranking_embeddings)
+    
+    # loop
+    start = perf_counter()
+    
+    for i in range(query_count):
+        repository.search(
+            collection_name,
+            limit,
+            prefetch_limit,
+            fusion_algorithm,
+            dense_embeddings[i] if dense_embeddings else None,
+            sparse_embeddings[i] if sparse_embeddings else None,
+            reranking_embeddings[i] if reranking_embeddings else None
+        )
+        
+    loop_time = perf_counter() - start
+    
+    # batch
+    start = perf_counter()
+    
+    repository.search_batch(
+        collection_name,
+        limit,
+        prefetch_limit,
+        fusion_algorithm,
+        dense_embeddings,
+        sparse_embeddings,
+        reranking_embeddings,
+        batch_size
+    )
+    
+    batch_time = perf_counter() - start
+    
+    return {
+        'queries': query_count,
+        'loop_qps': query_count / loop_time,
+        'batch_qps': query_count / batch_time,
+        'speedup': loop_time / batch_time
+    }
+
+
+async def benchmark_async_search(
+    async_repository: AsyncSearchRepository,
+    collection_name: str,
+    limit: int,
+    prefetch_limit: int | None = None,
+    fusion_algorithm: Fusion | None = None,
+    dense_embeddings: list[ndarray] | None = None,
+    sparse_embeddings: list[SparseEmbedding] | None = None,
+    reranking_embeddings: list[ndarray] | None = None,
+    concurrency: int = 16
+) -> dict[str, float]:
+    items = async_repository.repository.zip_embeddings(dense_embeddings, sparse_embeddings, reranking_embeddings)
+    semaphore = Semaphore(concurrency)
+    
+    async def search(dense_embedding, sparse_embedding, reranking_embedding) -> float:
+        async with semaphore:
+            start = perf_counter()
+            
+            await async_repository.search(
+                collection_name,
+                limit,
+                prefetch_limit,
+                fusion_algorithm,
+                dense_embedding,
+                sparse_embedding,
+                reranking_embedding
+            )
+            
+            return perf_counter() - start
+    
+    start = perf_counter()
+    latencies = await gather(*(search(*item) for item in items))
+    elapsed = perf_counter() - start
+    
+    return {
+        'queries': len(latencies),
+        'concurrency': concurrency,
+        'qps': len(latencies) / elapsed,
+        'p50_ms': float(percentile(latencies, 50)) * 1_000,
+        'p99_ms': float(percentile(latencies, 99)) * 1_000
+    }
+
+
+def _get_qrels_iterrows(qrels_df: DataFrame) -> Qrels:
+    qrels_dict = {}
+
+    for _, row in qrels_df.iterrows():
+        qrels_dict.setdefault(str(row['query-id']), {})[str(row['corpus-id'])] = int(row['score'])
+        
+    return Qrels(qrels_dict)
+
+
+def _get_run_loop(queries_df: DataFrame, scored_points_list: list[list[ScoredPoint]]) -> Run:
+    runs_dict = {}
+
+    for i, query_id in enumerate(queries_df['_id'].astype(str).values):
+        runs_dict[query_id] = {}
+        
+        for scored_point in scored_points_list[i]:
+            runs_dict[query_id][str(scored_point.payload['id'])] = float(scored_point.score)
+            
+    return Run(runs_dict)
+
+
+def benchmark_ranx(
+    qrels_df: DataFrame,
+    queries_df: DataFrame,
+    scored_points_list: list[list[ScoredPoint]]
+) -> dict[str, float]:
+    timings = {}
+    
+    # compile ranx's numba kernels before timing
+    get_run(queries_df.iloc[:1], scored_points_list[:1])
+    
+    for name, function, args in (
+        ('qrels_loop', _get_qrels_iterrows, (qrels_df,)),
+        ('qrels_vectorized', get_qrels, (qrels_df,)),
+        ('run_loop', _get_run_loop, (queries_df, scored_points_list)),
+        ('run_vectorized', get_run, (queries_df, scored_points_list))
+    ):
+        start = perf_counter()
+        function(*args)
+        timings[f'{name}_sec'] = perf_counter() - start
+    
+    timings['qrels_speedup'] = timings['qrels_loop_sec'] / timings['qrels_vectorized_sec']
+    timings['run_speedup'] = timings['run_loop_sec'] / timings['run_vectorized_sec']
+    
+    return timings
+
+
+def _get_stored_vector_count(qdrant_client: QdrantClient, collection_name: str, vector_name: str) -> int:
+    # multivectors count one vector per token and sparse vectors one per non-zero term
+    vector_count = 0
+    offset = None
+    
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            limit=256,
+            offset=offset,
+            with_payload=False,
+            with_vectors=[vector_name]
+        )
+        
+        vector_count += sum(
+            len(vector.indices) if isinstance(vector, SparseVector) else len(vector)
+            for vector in (point.vector[vector_name] for point in points)
+        )
+        
+        if offset is None:
+            return vector_count
+
+
+def _get_reranking_storage_bytes(repository: BaseRepository, collection_name: str) -> int:
+    reranker = getattr(repository, 'reranker', None)
+    reranking_model_config = getattr(repository, 'reranking_model_config', None)
+    
+    if isinstance(reranker, MaxSimReranker):
+        return reranker.store.size_bytes()
+    
+    if reranker is not None or reranking_model_config is None:
+        return 0
+    
+    # raw float32 size of the multivectors stored in the collection
+    vector_count = _get_stored_vector_count(repository.qdrant_client, collection_name, reranking_model_config.name)
+    
+    return vector_count * reranking_model_config.vector_params.size * 4
+
+
+def _benchmark_setups(
+    evaluator: 'Evaluator',
+    collection_name: str,
+    setups: dict[str, dict[str, Any]],
+    metrics: list[str],
+    top_k: int,
+    scale_k: int | None,
+    batch_size: int,
+    get_columns: Callable[[tuple, list[list[ScoredPoint]], dict[str, float]], dict[str, Any]]
+) -> DataFrame:
+    """
+    Sets up the evaluator for each of `setups` and times its search, query embeddings are computed
+    before timing so `query_ms` covers search only. `get_columns` adds the columns of each benchmark
+    from the query embeddings, the results and the metrics, before the collection is cleared.
+    """
+    rows = []
+    
+    for name, setup_kwargs in setups.items():
+        evaluator.setup(collection_name=collection_name, **setup_kwargs)
+        query_embeddings = evaluator.embed_queries()
+        
+        start = perf_counter()
+        scored_points_list = evaluator.search(top_k, scale_k, batch_size=batch_size)
+        elapsed = perf_counter() - start
+        
+        results = evaluator.evaluate(scored_points_list, metrics)
+        results = results if isinstance(results, dict) else {metrics[0]: results}
+        
+        rows.append({
+            'name': name,
+            **get_columns(query_embeddings, scored_points_list, results),
+            'query_ms': elapsed / len(evaluator.queries_df) * 1_000,
+            **results
+        })
+        
+        evaluator.clear()
+    
+    return DataFrame(rows)
+
+
+def benchmark_reranking(
+    evaluator: 'Evaluator',
+    collection_name: str,
+    setups: dict[str, dict[str, Any]],
+    metrics: list[str],
+    top_k: int,
+    scale_k: int | None = None,
+    batch_size: int = 64
+) -> DataFrame:
+    """
+    Compares reranking stages, e.g. the server-side multivector path against `MaxSimReranker`
+    or `CrossEncoderReranker`. `setups` maps a name to the keyword arguments of `Evaluator.setup`.
+    """
+    def get_columns(query_embeddings, scored_points_list, results) -> dict[str, Any]:
+        return {'reranking_storage_mb': _get_reranking_storage_bytes(evaluator.repository, collection_name) / 2 ** 20}
+    
+    return _benchmark_setups(evaluator, collection_name, setups, metrics, top_k, scale_k, batch_size, get_columns)
+
+
+def _get_vector_memory_bytes(qdrant_client: QdrantClient, collection_name: str) -> dict[str, int]:
+    """
+    Estimates the RAM and disk footprint of the dense vectors and multivectors of a collection,
+    originals and quantized copies, without the HNSW graph and payload.
+    """
+    collection_info = qdrant_client.get_collection(collection_name)
+    vectors_config = collection_info.config.params.vectors or {}
+    vectors_config = vectors_config if isinstance(vectors_config, dict) else {'': vectors_config}
+    
+    footprint = {'ram_bytes': 0, 'disk_bytes': 0}
+    
+    for vector_name, vector_params in vectors_config.items():
+        if vector_params.multivector_config is None:
+            vector_count = collection_info.points_count or 0
+        else:
+            vector_count = _get_stored_vector_count(qdrant_client, collection_name, vector_name)
+        
+        dim = vector_params.size
+        item_size = {Datatype.FLOAT16: 2, Datatype.UINT8: 1}.get(vector_params.datatype, 4)
+        original_bytes = vector_count * dim * item_size
+        footprint['disk_bytes' if vector_params.on_disk else 'ram_bytes'] += original_bytes
+        
+        quantization_config = vector_params.quantization_config or collection_info.config.quantization_config
+        
+        if isinstance(quantization_config, ScalarQuantization):
+            quantized_bytes, always_ram = vector_count * dim, quantization_config.scalar.always_ram
+        elif isinstance(quantization_config, BinaryQuantization):
+            quantized_bytes, always_ram = vector_count * -(-dim // 8), quantization_config.binary.always_ram
+        elif isinstance(quantization_config, ProductQuantization):
+            compression = int(quantization_config.product.compression.value[1:])
+            quantized_bytes, always_ram = vector_count * dim * 4 // compression, quantization_config.product.always_ram
+        else:
+            continue
+        
+        footprint['ram_bytes' if always_ram else 'disk_bytes'] += quantized_bytes
+    
+    return footprint
+
+
+def _get_ids(scored_points_list: list[list[ScoredPoint]]) -> list[set[str]]:
+    return [{str(scored_point.payload['id']) for scored_point in scored_points} for scored_points in scored_points_list]
+
+
+def benchmark_quantization(
+    evaluator: 'Evaluator',
+    collection_name: str,
+    setups: dict[str, dict[str, Any]],
+    metrics: list[str],
+    top_k: int,
+    scale_k: int | None = None,
+    batch_size: int = 64
+) -> DataFrame:
+    """
+    Compares quantization settings, `setups` maps a name to the keyword arguments of `Evaluator.setup`
+    and the first one is the full precision baseline. `recall` is the overlap of the top_k results
+    with the baseline's and `{metric}_delta` the change of each metric against the baseline.
+    """
+    baseline_ids = []
+    
+    def get_columns(query_embeddings, scored_points_list, results) -> dict[str, Any]:
+        ids = _get_ids(scored_points_list)
+        
+        if not baseline_ids:
+            baseline_ids.extend(ids)
+        
+        footprint = _get_vector_memory_bytes(evaluator.repository.qdrant_client, collection_name)
+        recall = [
+            len(found & expected) / len(expected) 
+            for found, expected in zip(ids, baseline_ids) 
+            if expected
+        ]
+        
+        return {
+            'ram_mb': footprint['ram_bytes'] / 2 ** 20,
+            'disk_mb': footprint['disk_bytes'] / 2 ** 20,
+            'recall': sum(recall) / len(recall) if recall else 1.0
+        }
+    
+    df = _benchmark_setups(evaluator, collection_name, setups, metrics, top_k, scale_k, batch_size, get_columns)
+    
+    for metric in metrics:
+        df[f'{metric}_delta'] = df[metric] - df[metric].iloc[0]
+    
+    return df
+
+
+def benchmark_sparse_pruning(
+    evaluator: 'Evaluator',
+    collection_name: str,
+    setups: dict[str, dict[str, Any]],
+    metrics: list[str],
+    top_k: int,
+    scale_k: int | None = None,
+    batch_size: int = 64
+) -> DataFrame:
+    """
+    Compares sparse pruning levels, `setups` maps a name to the keyword arguments of `Evaluator.setup`
+    whose repositories differ in `SparseModelConfig`. `index_mb` estimates the posting lists as 
+    8 bytes per stored term, `doc_terms` and `query_terms` are the mean non-zero terms after pruning.
+    """
+    def get_columns(query_embeddings, scored_points_list, results) -> dict[str, Any]:
+        _, query_sparse_embeddings, _ = query_embeddings
+        qdrant_client = evaluator.repository.qdrant_client
+        sparse_model_config = evaluator.repository.sparse_model_config
+        point_count = qdrant_client.count(collection_name).count
+        term_count = _get_stored_vector_count(qdrant_client, collection_name, sparse_model_config.name)
+        query_term_count = sum(
+            len(sparse_model_config.prune_query(sparse_embedding).indices) 
+            for sparse_embedding in query_sparse_embeddings
+        )
+        
+        return {
+            'index_mb': term_count * 8 / 2 ** 20,
+            'doc_terms': term_count / point_count if point_count else 0.0,
+            'query_terms': query_term_count / len(query_sparse_embeddings)
+        }
+    
+    return _benchmark_setups(evaluator, collection_name, setups, metrics, top_k, scale_k, batch_size, get_columns)
+
+
+def benchmark_cascade(
+    evaluator: 'Evaluator',
+    shapes: dict[str, CascadeShape],
+    metrics: list[str],
+    top_k: int,
+    scale_k: int | None = None,
+    fusion_algorithm: Fusion | None = None
+) -> DataFrame:
+    """
+    Compares cascade shapes on the collection of an evaluator set up with a `CascadeSearchRepository`,
+    shapes only change query widths so the collection is reused. Latencies are of sequential queries.
+    """
+    repository: CascadeSearchRepository = evaluator.repository
+    query_embeddings = evaluator.embed_queries()
+    prefetch_limit = int(top_k * scale_k) if scale_k else None
+    original_shape = repository.shape
+    rows = []
+    
+    try:
+        for name, shape in shapes.items():
+            repository.shape = shape
+            scored_points_list = []
+            latencies = []
+            
+            for dense_embedding, sparse_embedding, reranking_embedding in repository.zip_embeddings(*query_embeddings):
+                start = perf_counter()
+                scored_points_list.append(repository.search(
+                    evaluator.collection_name,
+                    top_k,
+                    prefetch_limit,
+                    fusion_algorithm,
+                    dense_embedding,
+                    sparse_embedding,
+                    reranking_embedding
+                ))
+                latencies.append(perf_counter() - start)
+            
+            results = evaluator.evaluate(scored_points_list, metrics)
+            results = results if isinstance(results, dict) else {metrics[0]: results}
+            
+            rows.append({
+                'name': name,
+                **shape.model_dump(),
+                'qps': len(latencies) / sum(latencies),
+                'p50_ms': float(percentile(latencies, 50)) * 1_000,
+                'p95_ms': float(percentile(latencies, 95)) * 1_000,
+                'p99_ms': float(percentile(latencies, 99)) * 1_000,
+                **results
+            })
+    finally:
+        repository.shape = original_shape
+    
+    return DataFrame(rows)
+
+
+def _get_sample_texts(size: int) -> list[str]:
+    # the model descriptions shipped in the assets are a fixed, reproducible sample
+    descriptions = [
+        spec['description']
+        for kind in ('dense', 'sparse', 'reranking')
+        for spec in load_model_specs(kind)
+    ]
+    
+    return [descriptions[i % len(descriptions)] for i in range(size)]
+
+
+def benchmark_models(
+    kinds: tuple[ModelKind, ...] = ('dense', 'sparse', 'reranking'),
+    model_names: list[str] | None = None,
+    texts: list[str] | None = None,
+    queries: list[str] | None = None,
+    batch_size: int = 32,
+    **model_kwargs
+) -> DataFrame:
+    """
+    Loads every model listed in `rag/assets` (or only `model_names`) on CPU, one at a time,
+    and measures its load time, document throughput on `texts`, single query latency on `queries`
+    and the resident memory it adds. Models that fail to load or run get an `error` instead.
+    """
+    texts = texts or _get_sample_texts(256)
+    queries = queries or [' '.join(text.split()[:8]) for text in texts[:32]]
+    registry = ModelRegistry(max_models=1, providers=['CPUExecutionProvider'], **model_kwargs)
+    rows = []
+    
+    for kind in kinds:
+        for spec in load_model_specs(kind):
+            if model_names is not None and spec['model'] not in model_names:
+                continue
+            
+            row = {'kind': kind, 'model': spec['model'], 'size_gb': spec.get('size_in_GB')}
+            rss_mb = get_rss_mb()
+            
+            try:
+                start = perf_counter()
+                model = registry.get(kind, spec['model'])
+                row['load_sec'] = perf_counter() - start
+                
+                # the first batch allocates the session's buffers
+                list(model.embed(texts[:batch_size], batch_size=batch_size))
+                
+                start = perf_counter()
+                list(model.embed(texts, batch_size=batch_size))
+                row['docs_per_sec'] = len(texts) / (perf_counter() - start)
+                
+                latencies = []
+                
+                for query in queries:
+                    start = perf_counter()
+                    list(model.query_embed(query))
+                    latencies.append(perf_counter() - start)
+                
+                row['query_p50_ms'] = float(percentile(latencies, 50)) * 1_000
+                row['query_p95_ms'] = float(percentile(latencies, 95)) * 1_000
+                row['rss_mb'] = get_rss_mb() - rss_mb
+            except Exception as exception:
+                row['error'] = repr(exception)
+            finally:
+                model = None
+                registry.clear()
+            
+            rows.append(row)
+    
+    return DataFrame(rows)
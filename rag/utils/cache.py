@@ -0,0 +1,384 @@
+from fastembed import SparseEmbedding
+from hashlib import sha1
+from numpy import ndarray
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import Any, Iterable
+from uuid import uuid4
+
+import json
+import numpy as np
+import os
+
+from rag.stores.files import write_json, write_text
+
+
+Embedding = ndarray | SparseEmbedding
+
+# attributes of a fastembed implementation that change its output, only BM25 has any so far
+OUTPUT_ATTRIBUTES = ('k', 'b', 'avg_len', 'language', 'token_max_length', 'disable_stemmer')
+
+
+def _hash_text(text: str) -> str:
+    return sha1(text.encode('utf-8')).hexdigest()
+
+
+def _get_kind(embedding: Embedding) -> str:
+    if isinstance(embedding, SparseEmbedding):
+        return 'sparse'
+
+    return 'dense' if embedding.ndim == 1 else 'multivector'
+
+
+def _append_lines(path: Path, records: list[dict[str, Any]]):
+    with open(path, 'a') as file:
+        file.write(''.join(json.dumps(record) + '\n' for record in records))
+
+
+def _get_model_kwargs(model: Any) -> dict[str, Any]:
+    # fastembed wrappers keep the implementation, and so its parameters, in `model`
+    implementation = getattr(model, 'model', model)
+
+    return {
+        name: getattr(implementation, name)
+        for name in OUTPUT_ATTRIBUTES
+        if hasattr(implementation, name)
+    }
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache split into namespaces, one per model name and model kwargs.
+
+    Each `put` writes one immutable shard per namespace:
+    - dense: `data` is a (n, dim) matrix
+    - multivector: `data` holds stacked token vectors, `offsets` delimits documents
+    - sparse: CSR arrays, `data` holds values, `indices` term ids, `offsets` the row pointers
+    - `hashes` holds the hashes of the shard's texts, its rows in the index
+
+    Added and evicted shards are appended to `shards.jsonl`, which is replayed on load to rebuild the index,
+    so a `put` writes only its own shard and one line. Shards are memory-mapped on read and evicted
+    least recently used first once the total size exceeds `max_size_bytes`. Hits only update the last use
+    in memory, `last_used.json` is written at most every `flush_interval` seconds and on `flush`.
+    """
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        max_size_bytes: int | None = None,
+        flush_interval: float = 60.0
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.flush_interval = flush_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = Lock()
+        self._indexes: dict[str, dict] = {}
+        self._shards: dict[str, dict] = {}
+        self._arrays: dict[tuple[str, str], dict[str, ndarray]] = {}
+        self._dirty: set[str] = set()
+        self._last_flush = time()
+
+    def namespace(self, model_name: str, model_kwargs: dict[str, Any] | None = None) -> str:
+        key = json.dumps(
+            {
+                'model_name': model_name,
+                'model_kwargs': model_kwargs or {}
+            },
+            sort_keys=True,
+            default=str
+        )
+
+        return sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, namespace: str, texts: list[str]) -> list[Embedding | None]:
+        with self._lock:
+            index = self._get_index(namespace)
+            shards = self._shards[namespace]
+            embeddings = []
+            used_shards = set()
+
+            for text in texts:
+                location = index['entries'].get(_hash_text(text))
+
+                if location is None:
+                    embeddings.append(None)
+                    continue
+
+                shard, row = location
+                embeddings.append(self._read(namespace, index['kind'], shard, row))
+                used_shards.add(shard)
+
+            misses = sum(embedding is None for embedding in embeddings)
+            self.hits += len(texts) - misses
+            self.misses += misses
+
+            if used_shards:
+                now = time()
+
+                for shard in used_shards:
+                    shards[shard]['last_used'] = now
+
+                self._dirty.add(namespace)
+
+                if now - self._last_flush >= self.flush_interval:
+                    self._flush()
+
+            return embeddings
+
+    def put(self, namespace: str, texts: list[str], embeddings: list[Embedding]):
+        if not texts:
+            return
+
+        with self._lock:
+            index = self._get_index(namespace)
+            namespace_dir = self.cache_dir / namespace
+
+            if index['kind'] is None:
+                index['kind'] = _get_kind(embeddings[0])
+                write_json(namespace_dir / 'meta.json', {'kind': index['kind']})
+
+            shard = uuid4().hex
+            hashes = [_hash_text(text) for text in texts]
+            arrays = {
+                **self._to_arrays(index['kind'], embeddings),
+                'hashes': np.array(hashes, dtype='S40')
+            }
+
+            for name, array in arrays.items():
+                np.save(namespace_dir / f'{shard}.{name}.npy', array)
+
+            # the shard is complete once it is logged, a shard without its line is removed on load
+            size = sum(array.nbytes for array in arrays.values())
+            _append_lines(namespace_dir / 'shards.jsonl', [{'shard': shard, 'size': size}])
+
+            index['entries'].update((text_hash, (shard, row)) for row, text_hash in enumerate(hashes))
+            self._shards[namespace][shard] = {'size': size, 'last_used': time()}
+            self._dirty.add(namespace)
+
+            if self.max_size_bytes is not None:
+                self._evict()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return sum(
+                shard['size']
+                for namespace in self._namespaces()
+                for shard in self._get_shards(namespace).values()
+            )
+
+    def stats(self) -> dict[str, float]:
+        total = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'size_bytes': self.size_bytes()
+        }
+
+    def _flush(self):
+        for namespace in self._dirty:
+            write_json(
+                self.cache_dir / namespace / 'last_used.json',
+                {shard: shard_info['last_used'] for shard, shard_info in self._shards[namespace].items()}
+            )
+
+        self._dirty.clear()
+        self._last_flush = time()
+
+    def _namespaces(self) -> list[str]:
+        return [path.name for path in self.cache_dir.iterdir() if path.is_dir()]
+
+    def _get_index(self, namespace: str) -> dict:
+        if namespace not in self._indexes:
+            self._load(namespace)
+
+        return self._indexes[namespace]
+
+    def _get_shards(self, namespace: str) -> dict:
+        if namespace not in self._shards:
+            self._load(namespace)
+
+        return self._shards[namespace]
+
+    def _load(self, namespace: str):
+        namespace_dir = self.cache_dir / namespace
+        namespace_dir.mkdir(exist_ok=True)
+        meta_path = namespace_dir / 'meta.json'
+        shards_path = namespace_dir / 'shards.jsonl'
+        last_used_path = namespace_dir / 'last_used.json'
+
+        shards_path.touch()
+        log = shards_path.read_bytes()
+
+        # drop a torn last line, later appends would continue it, its shard is removed below
+        os.truncate(shards_path, log.rfind(b'\n') + 1)
+        records = [json.loads(line) for line in log.split(b'\n')[:-1]]
+        shards = {}
+
+        for record in records:
+            if record.get('evicted'):
+                shards.pop(record['shard'], None)
+            else:
+                shards[record['shard']] = {'size': record['size']}
+
+        # evictions only append, the log is compacted once they outnumber the live shards
+        if len(records) > 2 * len(shards):
+            write_text(shards_path, ''.join(json.dumps({'shard': shard, **shard_info}) + '\n' for shard, shard_info in shards.items()))
+
+        last_used = json.loads(last_used_path.read_text()) if last_used_path.exists() else {}
+
+        for path in namespace_dir.glob('*.npy'):
+            shard = path.name.split('.')[0]
+
+            if shard not in shards:
+                path.unlink()
+            elif path.name.endswith('.hashes.npy'):
+                shards[shard].setdefault('last_used', last_used.get(shard, path.stat().st_mtime))
+
+        # in log order, so a text added again later points to its newest shard
+        entries = {}
+
+        for shard in shards:
+            hashes = np.load(namespace_dir / f'{shard}.hashes.npy')
+            entries.update((text_hash.decode('ascii'), (shard, row)) for row, text_hash in enumerate(hashes.tolist()))
+
+        self._indexes[namespace] = {
+            'kind': json.loads(meta_path.read_text())['kind'] if meta_path.exists() else None,
+            'entries': entries
+        }
+        self._shards[namespace] = shards
+
+    def _read(self, namespace: str, kind: str, shard: str, row: int) -> Embedding:
+        key = (namespace, shard)
+
+        if key not in self._arrays:
+            names = {'dense': ['data'], 'multivector': ['data', 'offsets'], 'sparse': ['data', 'offsets', 'indices']}[kind]
+            self._arrays[key] = {
+                name: np.load(self.cache_dir / namespace / f'{shard}.{name}.npy', mmap_mode='r')
+                for name in names
+            }
+
+        arrays = self._arrays[key]
+
+        if kind == 'dense':
+            return arrays['data'][row]
+
+        start, end = arrays['offsets'][row], arrays['offsets'][row + 1]
+
+        if kind == 'multivector':
+            return arrays['data'][start:end]
+
+        return SparseEmbedding(indices=arrays['indices'][start:end], values=arrays['data'][start:end])
+
+    def _to_arrays(self, kind: str, embeddings: list[Embedding]) -> dict[str, ndarray]:
+        if kind == 'dense':
+            return {'data': np.stack(embeddings)}
+
+        if kind == 'multivector':
+            lengths = [len(embedding) for embedding in embeddings]
+
+            return {
+                'data': np.concatenate(embeddings),
+                'offsets': np.concatenate([[0], np.cumsum(lengths)])
+            }
+
+        lengths = [len(embedding.indices) for embedding in embeddings]
+
+        return {
+            'data': np.concatenate([embedding.values for embedding in embeddings]),
+            'offsets': np.concatenate([[0], np.cumsum(lengths)]),
+            'indices': np.concatenate([embedding.indices for embedding in embeddings])
+        }
+
+    def _evict(self):
+        shards = [
+            (shard_info['last_used'], namespace, shard, shard_info['size'])
+            for namespace in self._namespaces()
+            for shard, shard_info in self._get_shards(namespace).items()
+        ]
+        shards.sort()
+        total_size = sum(size for *_, size in shards)
+        evicted: dict[str, set[str]] = {}
+
+        for _, namespace, shard, size in shards:
+            if total_size <= self.max_size_bytes:
+                break
+
+            evicted.setdefault(namespace, set()).add(shard)
+            del self._shards[namespace][shard]
+            self._arrays.pop((namespace, shard), None)
+
+            for path in (self.cache_dir / namespace).glob(f'{shard}.*.npy'):
+                path.unlink()
+
+            total_size -= size
+            self.evictions += 1
+
+        # the index and the log are updated once per namespace, not per shard
+        for namespace, namespace_shards in evicted.items():
+            index = self._indexes[namespace]
+            index['entries'] = {
+                text_hash: location
+                for text_hash, location in index['entries'].items()
+                if location[0] not in namespace_shards
+            }
+            _append_lines(
+                self.cache_dir / namespace / 'shards.jsonl',
+                [{'shard': shard, 'evicted': True} for shard in namespace_shards]
+            )
+            self._dirty.add(namespace)
+
+
+class CachedEmbeddingModel:
+    """
+    Drop-in wrapper around `TextEmbedding`, `SparseTextEmbedding` and `LateInteractionTextEmbedding`
+    which only runs inference for texts missing from the cache.
+
+    Parameters that change the output (BM25 `k`, `b`, `avg_len`, ...) are read from the wrapped model
+    and become part of the cache key together with the model name, `model_kwargs` adds to them.
+    """
+    def __init__(
+        self,
+        model: Any,
+        cache: EmbeddingCache,
+        model_kwargs: dict[str, Any] | None = None
+    ):
+        self.model = model
+        self.cache = cache
+        self.model_name: str = model.model_name
+        self.model_kwargs = {**_get_model_kwargs(model), **(model_kwargs or {})}
+
+    def embed(self, documents: str | Iterable[str], **kwargs) -> Iterable[Embedding]:
+        return iter(self._embed('embed', documents, **kwargs))
+
+    def query_embed(self, query: str | Iterable[str], **kwargs) -> Iterable[Embedding]:
+        return iter(self._embed('query_embed', query, **kwargs))
+
+    def _embed(self, method: str, documents: str | Iterable[str], **kwargs) -> list[Embedding]:
+        texts = [documents] if isinstance(documents, str) else list(documents)
+        namespace = self.cache.namespace(self.model_name, {**self.model_kwargs, 'method': method})
+
+        embeddings = self.cache.get(namespace, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            missing_embeddings = list(getattr(self.model, method)(missing_texts, **kwargs))
+            self.cache.put(namespace, missing_texts, missing_embeddings)
+
+            for i, embedding in zip(missing, missing_embeddings):
+                embeddings[i] = embedding
+
+        return embeddings
@@ -1,15 +1,28 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from fastembed import (
     TextEmbedding, 
     SparseTextEmbedding, 
-    LateInteractionTextEmbedding
+    LateInteractionTextEmbedding,
+    SparseEmbedding
 )
+from numpy import ndarray
 from pandas import DataFrame
-from qdrant_client.models import Fusion
+from qdrant_client.models import Fusion, ScoredPoint, SearchParams
 from ranx import evaluate
 from rag.base import BaseRepository
-from rag.models.metadata import Metadata
+from rag.models import EmbeddingParams, Metadata
+from rag.profiling import Profiler, PeakRSS, span
+from threading import Lock
+from time import perf_counter
+from typing import Any
 
+from .executor import EmbeddingExecutor
 from .ranx import get_qrels, get_run
+from .registry import model_registry
+
+
+_ranx_lock = Lock()
 
 
 class Evaluator:
@@ -19,82 +32,258 @@ class Evaluator:
     ):
         self.corpus_df, self.queries_df, self.qrels_df = dfs
         self.qrels = get_qrels(self.qrels_df)
+        self.query_embeddings = None
+        self._query_embeddings_lock = Lock()
     
     def setup(
         self,
         collection_name: str,
         repository: BaseRepository,
-        dense_model: TextEmbedding | None = None,
-        sparse_model: SparseTextEmbedding | None = None,
-        reranking_model: LateInteractionTextEmbedding | None = None
-    ):
-        if hasattr(self, 'collection_name') and self.repository.collection_exists(self.collection_name):
+        dense_model: TextEmbedding | str | None = None,
+        sparse_model: SparseTextEmbedding | str | None = None,
+        reranking_model: LateInteractionTextEmbedding | str | None = None,
+        chunk_size: int | None = None,
+        dense_params: EmbeddingParams | None = None,
+        sparse_params: EmbeddingParams | None = None,
+        reranking_params: EmbeddingParams | None = None,
+        incremental: bool = False,
+        profiler: Profiler | None = None
+    ) -> dict[str, Any]:
+        # sampled within the call, the process-lifetime peak would hide a bounded chunked ingest
+        with profiler or nullcontext(), PeakRSS() as peak_rss:
+            stats = self._setup(
+                collection_name,
+                repository,
+                dense_model,
+                sparse_model,
+                reranking_model,
+                chunk_size,
+                dense_params,
+                sparse_params,
+                reranking_params,
+                incremental
+            )
+        
+        stats['peak_rss_mb'] = peak_rss.peak_mb
+        
+        if profiler is not None:
+            stats['profile'] = profiler.report()
+        
+        return stats
+    
+    def _setup(
+        self,
+        collection_name: str,
+        repository: BaseRepository,
+        dense_model: TextEmbedding | str | None,
+        sparse_model: SparseTextEmbedding | str | None,
+        reranking_model: LateInteractionTextEmbedding | str | None,
+        chunk_size: int | None,
+        dense_params: EmbeddingParams | None,
+        sparse_params: EmbeddingParams | None,
+        reranking_params: EmbeddingParams | None,
+        incremental: bool
+    ) -> dict[str, float]:
+        if (
+            getattr(self, 'repository', None) is not None and 
+            not (incremental and self.collection_name == collection_name) and 
+            self.repository.collection_exists(self.collection_name)
+        ):
             self.repository.delete_collection(self.collection_name)
-            
+        
+        # model names are loaded once through the shared registry
+        dense_model, sparse_model, reranking_model = (
+            model_registry.get(kind, model) if isinstance(model, str) else model
+            for kind, model in zip(('dense', 'sparse', 'reranking'), (dense_model, sparse_model, reranking_model))
+        )
+        
         self.repository = repository
         self.dense_model = dense_model
         self.sparse_model = sparse_model
         self.reranking_model = reranking_model
         self.collection_name = collection_name
+        self.query_embeddings = None
+        self.embedding_executor = EmbeddingExecutor(
+            dense_model,
+            sparse_model,
+            reranking_model,
+            dense_params,
+            sparse_params,
+            reranking_params
+        )
         
-        # metadata
-        corpus_texts: list[str] = self.corpus_df['text'].values.tolist()
-        metadatas = [
+        start = perf_counter()
+        
+        if incremental:
+            with span('setup.sync_points', len(self.corpus_df)):
+                summary = self.repository.sync_points(
+                    self.collection_name,
+                    self._get_metadatas(self.corpus_df),
+                    self.embedding_executor.embed
+                )
+            
+            return {
+                'docs': len(self.corpus_df),
+                'docs_per_sec': len(self.corpus_df) / (perf_counter() - start),
+                'added': len(summary.added),
+                'updated': len(summary.updated),
+                'deleted': len(summary.deleted),
+                'unchanged': summary.unchanged
+            }
+        
+        # index
+        with span('setup.create_collection'):
+            self.repository.create_collection(self.collection_name)
+        
+        if chunk_size:
+            self._stream_upload(chunk_size)
+        else:
+            self.repository.upload_points(
+                self.collection_name,
+                *self._embed_corpus(self.corpus_df)
+            )
+        
+        self.repository.build_index(self.collection_name)
+        
+        elapsed = perf_counter() - start
+        
+        return {
+            'docs': len(self.corpus_df),
+            'docs_per_sec': len(self.corpus_df) / elapsed
+        }
+    
+    def _get_metadatas(self, corpus_df: DataFrame) -> list[Metadata]:
+        items = zip(corpus_df['_id'].values.tolist(), corpus_df['text'].values.tolist())
+        
+        return [
             Metadata(
-                id=row['_id'],
-                text=row['text']
+                id=corpus_id,
+                text=text
             )
-            for _, row in self.corpus_df.iterrows()
+            for corpus_id, text in items
         ]
+    
+    def _embed_corpus(
+        self, 
+        corpus_df: DataFrame
+    ) -> tuple[list[Metadata], list[ndarray] | None, list[SparseEmbedding] | None, list[ndarray] | None]:
+        # metadata
+        corpus_texts: list[str] = corpus_df['text'].values.tolist()
+        metadatas = self._get_metadatas(corpus_df)
 
-        # embed        
-        dense_embeddings = list(self.dense_model.embed(corpus_texts)) if self.dense_model else None
-        sparse_embeddings = list(self.sparse_model.embed(corpus_texts)) if self.sparse_model else None
-        reranking_embeddings = list(self.reranking_model.embed(corpus_texts)) if self.reranking_model else None
+        # embed
+        with span('setup.embed_corpus', len(corpus_texts)):
+            dense_embeddings, sparse_embeddings, reranking_embeddings = self.embedding_executor.embed(corpus_texts)
         
-        # index
-        self.repository.create_collection(self.collection_name)
-        
-        self.repository.upload_points(
-            self.collection_name,
-            metadatas,
-            dense_embeddings,
-            sparse_embeddings,
-            reranking_embeddings
-        )
+        return metadatas, dense_embeddings, sparse_embeddings, reranking_embeddings
+    
+    def _stream_upload(self, chunk_size: int):
+        # at most one chunk is uploading while the next one is embedding
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = None
+            
+            for i in range(0, len(self.corpus_df), chunk_size):
+                chunk = self._embed_corpus(self.corpus_df.iloc[i:i + chunk_size])
+                
+                if future:
+                    future.result()
+                
+                future = executor.submit(self.repository.upload_points, self.collection_name, *chunk)
+                del chunk
+            
+            if future:
+                future.result()
+    
+    def embed_queries(self) -> tuple[list[ndarray] | None, list[SparseEmbedding] | None, list[ndarray] | None]:
+        # query embeddings only depend on the models, so they are reused until the next setup
+        with self._query_embeddings_lock:
+            if self.query_embeddings is None:
+                query_texts: list[str] = self.queries_df['text'].values.tolist()
+                
+                with span('run.embed_queries', len(query_texts)):
+                    self.query_embeddings = self.embedding_executor.embed(query_texts)
+        
+        return self.query_embeddings
     
     def run(
         self,
         metrics: list[str],
         top_k: int,
         scale_k: int | None = None,
-        fusion_algorithm: Fusion | None = None
-    ) -> dict[str, float] | float:
-        # embed
-        query_texts: list[str] = self.queries_df['text'].values.tolist()
+        fusion_algorithm: Fusion | None = None,
+        batched: bool = True,
+        batch_size: int = 64,
+        search_params: SearchParams | None = None,
+        profiler: Profiler | None = None
+    ) -> dict[str, float] | float | tuple[dict[str, float] | float, dict[str, Any]]:
+        with profiler or nullcontext():
+            scored_points_list = self.search(top_k, scale_k, fusion_algorithm, batched, batch_size, search_params)
+            results = self.evaluate(scored_points_list, metrics)
         
-        query_dense_embeddings = list(self.dense_model.embed(query_texts)) if self.dense_model else None
-        query_sparse_embeddings = list(self.sparse_model.embed(query_texts)) if self.sparse_model else None
-        query_reranking_embeddings = list(self.reranking_model.embed(query_texts)) if self.reranking_model else None
+        if profiler is not None:
+            return results, profiler.report()
+        
+        return results
+    
+    def search(
+        self,
+        top_k: int,
+        scale_k: int | None = None,
+        fusion_algorithm: Fusion | None = None,
+        batched: bool = True,
+        batch_size: int = 64,
+        search_params: SearchParams | None = None
+    ) -> list[list[ScoredPoint]]:
+        # embed
+        (
+            query_dense_embeddings, 
+            query_sparse_embeddings, 
+            query_reranking_embeddings
+        ) = self.embed_queries()
                 
         # search
-        scored_points_list = [
-            self.repository.search(
-                self.collection_name,
-                top_k,
-                int(top_k * scale_k) if scale_k else None,
-                fusion_algorithm,
-                query_dense_embedding,
-                query_sparse_embeddings,
-                query_reranking_embeddings
-            )
-            for query_dense_embedding in query_dense_embeddings
-        ]
+        prefetch_limit = int(top_k * scale_k) if scale_k else None
         
-        # evaluate
-        run = get_run(self.queries_df, scored_points_list)
-
-        return evaluate(self.qrels, run, metrics=metrics)
+        with span('run.search', len(self.queries_df)):
+            if batched:
+                return self.repository.search_batch(
+                    self.collection_name,
+                    top_k,
+                    prefetch_limit,
+                    fusion_algorithm,
+                    query_dense_embeddings,
+                    query_sparse_embeddings,
+                    query_reranking_embeddings,
+                    batch_size,
+                    search_params
+                )
+            
+            return [
+                self.repository.search(
+                    self.collection_name,
+                    top_k,
+                    prefetch_limit,
+                    fusion_algorithm,
+                    query_dense_embeddings[i] if query_dense_embeddings else None,
+                    query_sparse_embeddings[i] if query_sparse_embeddings else None,
+                    query_reranking_embeddings[i] if query_reranking_embeddings else None,
+                    search_params
+                )
+                for i in range(len(self.queries_df))
+            ]
+    
+    def evaluate(
+        self, 
+        scored_points_list: list[list[ScoredPoint]], 
+        metrics: list[str]
+    ) -> dict[str, float] | float:
+        # ranx's numba kernels are not thread-safe
+        with _ranx_lock:
+            with span('run.get_run', len(scored_points_list)):
+                run = get_run(self.queries_df, scored_points_list)
+            
+            with span('run.evaluate', len(scored_points_list)):
+                return evaluate(self.qrels, run, metrics=metrics)
     
     def clear(self) -> bool:
         success = self.repository.delete_collection(self.collection_name)
@@ -104,5 +293,7 @@ class Evaluator:
         self.dense_model = None
         self.sparse_model = None
         self.reranking_model = None
+        self.embedding_executor = None
+        self.query_embeddings = None
         
         return success
\ No newline at end of file
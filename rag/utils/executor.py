@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastembed import (
+    TextEmbedding, 
+    SparseTextEmbedding, 
+    LateInteractionTextEmbedding,
+    SparseEmbedding
+)
+from numpy import ndarray
+from rag.models import EmbeddingParams
+from rag.profiling import span
+
+
+class EmbeddingExecutor:
+    """
+    Runs the dense, sparse and reranking models concurrently on the same texts.
+    ONNX inference releases the GIL, so threads overlap the models, while each 
+    model's `parallel` setting additionally enables fastembed's data-parallel workers.
+    """
+    def __init__(
+        self,
+        dense_model: TextEmbedding | None = None,
+        sparse_model: SparseTextEmbedding | None = None,
+        reranking_model: LateInteractionTextEmbedding | None = None,
+        dense_params: EmbeddingParams | None = None,
+        sparse_params: EmbeddingParams | None = None,
+        reranking_params: EmbeddingParams | None = None
+    ):
+        self.models = (dense_model, sparse_model, reranking_model)
+        self.params = tuple(
+            params or EmbeddingParams()
+            for params in (dense_params, sparse_params, reranking_params)
+        )
+    
+    def embed(
+        self, 
+        texts: list[str]
+    ) -> tuple[list[ndarray] | None, list[SparseEmbedding] | None, list[ndarray] | None]:
+        models = [model for model in self.models if model]
+        
+        if not models:
+            return None, None, None
+        
+        with ThreadPoolExecutor(max_workers=len(models)) as executor:
+            futures = [
+                executor.submit(self._embed, name, model, params, texts) if model else None
+                for name, model, params in zip(('dense', 'sparse', 'reranking'), self.models, self.params)
+            ]
+            
+            return tuple(future.result() if future else None for future in futures)
+    
+    @staticmethod
+    def _embed(
+        name: str,
+        model: TextEmbedding | SparseTextEmbedding | LateInteractionTextEmbedding, 
+        params: EmbeddingParams, 
+        texts: list[str]
+    ) -> list:
+        with span(f'embed.{name}', len(texts)):
+            return list(model.embed(texts, batch_size=params.batch_size, parallel=params.parallel))
@@ -0,0 +1,186 @@
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha1
+from multiprocessing import get_context
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable
+
+import json
+import os
+
+from rag.base import BaseRepository
+from rag.models import Metadata
+from rag.stores.files import write_json
+
+from .executor import EmbeddingExecutor
+
+
+def get_partition(metadata: Metadata, partition_count: int) -> int:
+    # a stable hash, Python's is salted per process
+    return int.from_bytes(sha1(str(metadata.id).encode('utf-8')).digest()[:8], 'big') % partition_count
+
+
+def _get_fingerprint(metadatas: list[Metadata]) -> str:
+    key = sha1()
+
+    for metadata in metadatas:
+        key.update(str(metadata.id).encode('utf-8'))
+        key.update(b'\0')
+
+    return key.hexdigest()
+
+
+def _read_checkpoint(path: Path, fingerprint: str) -> int:
+    if not path.exists():
+        return 0
+
+    checkpoint = json.loads(path.read_text())
+
+    # a changed partition cannot be resumed by offset, it is ingested again
+    return checkpoint['done'] if checkpoint['fingerprint'] == fingerprint else 0
+
+
+def _ingest_partition(
+    repository_factory: Callable[[], BaseRepository],
+    model_factory: Callable[[], dict[str, Any]],
+    collection_name: str,
+    partition: int,
+    metadatas: list[Metadata],
+    checkpoint_path: Path,
+    chunk_size: int
+) -> dict[str, Any]:
+    fingerprint = _get_fingerprint(metadatas)
+    done = _read_checkpoint(checkpoint_path, fingerprint)
+    skipped = done
+
+    # models and client are created in the worker, neither can be shared across processes
+    repository = repository_factory()
+    models = model_factory()
+    embedding_executor = EmbeddingExecutor(
+        models.get('dense_model'),
+        models.get('sparse_model'),
+        models.get('reranking_model'),
+        models.get('dense_params'),
+        models.get('sparse_params'),
+        models.get('reranking_params')
+    )
+
+    start = perf_counter()
+
+    for i in range(done, len(metadatas), chunk_size):
+        chunk = metadatas[i:i + chunk_size]
+        embeddings = embedding_executor.embed([metadata.text for metadata in chunk])
+        repository.upload_points(collection_name, chunk, *embeddings)
+
+        done = i + len(chunk)
+        write_json(checkpoint_path, {
+            'partition': partition,
+            'fingerprint': fingerprint,
+            'done': done,
+            'total': len(metadatas)
+        })
+
+    return {
+        'partition': partition,
+        'docs': len(metadatas),
+        'skipped': skipped,
+        'ingest_sec': perf_counter() - start
+    }
+
+
+class PartitionedIngest:
+    """
+    Ingests a corpus with one worker process per partition, documents are assigned to partitions
+    by a hash of `Metadata.id`. `repository_factory` returns the repository and `model_factory`
+    the models and their params like the keyword arguments of `Evaluator.setup`. Both run in every
+    worker, so they must be picklable module-level functions, the parent only creates the repository.
+
+    Each worker writes `partition_{i}.json` under `manifest_dir` after every chunk and a rerun
+    resumes every partition after its last uploaded chunk, as long as the corpus is unchanged.
+    All workers upload to the same collection. Several shards, set with `CollectionParams.shard_number`,
+    spread the writes over the nodes of a cluster or, on a single node, over its cores.
+    Embedded Qdrant cannot be shared between processes, so workers need a Qdrant server.
+
+    A `TextStore` is not process-safe, so the parent adds all passages to the repository's store before
+    the workers start. Repositories from `repository_factory` must open the same store directory,
+    a worker then finds its passages stored unchanged and does not write to it.
+    Ids must be unique within the corpus for this to hold.
+    """
+    def __init__(
+        self,
+        repository_factory: Callable[[], BaseRepository],
+        model_factory: Callable[[], dict[str, Any]],
+        collection_name: str,
+        manifest_dir: str | Path,
+        partition_count: int = os.cpu_count() or 1,
+        chunk_size: int = 1_024
+    ):
+        self.repository_factory = repository_factory
+        self.model_factory = model_factory
+        self.collection_name = collection_name
+        self.manifest_dir = Path(manifest_dir)
+        self.partition_count = partition_count
+        self.chunk_size = chunk_size
+
+    def run(self, metadatas: list[Metadata], max_workers: int | None = None) -> dict[str, Any]:
+        self.manifest_dir.mkdir(parents=True, exist_ok=True)
+
+        repository = self.repository_factory()
+
+        if not repository.collection_exists(self.collection_name):
+            repository.create_collection(self.collection_name)
+
+        # the only writer of the store, unchanged passages of a resumed run are skipped
+        if repository.text_store is not None:
+            for i in range(0, len(metadatas), self.chunk_size):
+                repository.text_store.add(metadatas[i:i + self.chunk_size])
+
+        partitions = [[] for _ in range(self.partition_count)]
+
+        for metadata in metadatas:
+            partitions[get_partition(metadata, self.partition_count)].append(metadata)
+
+        start = perf_counter()
+
+        # fork would share the parent's model runtimes and their threads with the workers
+        with ProcessPoolExecutor(
+            max_workers=max_workers or self.partition_count,
+            mp_context=get_context('spawn')
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _ingest_partition,
+                    self.repository_factory,
+                    self.model_factory,
+                    self.collection_name,
+                    partition,
+                    partition_metadatas,
+                    self.manifest_dir / f'partition_{partition}.json',
+                    self.chunk_size
+                )
+                for partition, partition_metadatas in enumerate(partitions)
+            ]
+            partition_stats = [future.result() for future in futures]
+
+        repository.build_index(self.collection_name)
+
+        elapsed = perf_counter() - start
+        ingested = sum(stats['docs'] - stats['skipped'] for stats in partition_stats)
+
+        return {
+            'docs': len(metadatas),
+            'ingested': ingested,
+            'partitions': self.partition_count,
+            'ingest_sec': elapsed,
+            'docs_per_sec': ingested / elapsed if elapsed else 0.0,
+            'partition_stats': partition_stats
+        }
+
+    def get_progress(self) -> dict[int, dict[str, Any]]:
+        return {
+            checkpoint['partition']: checkpoint
+            for checkpoint in (
+                json.loads(path.read_text())
+                for path in sorted(self.manifest_dir.glob('partition_*.json'))
+            )
+        }
@@ -1,6 +1,15 @@
 from datasets import load_dataset
 from datasets import get_dataset_config_info
 from pandas import DataFrame
+from pathlib import Path
+
+import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+
+_STORE_NAMES = ('corpus', 'queries', 'qrels')
 
 
 def _get_row_count(config_name: str):
@@ -8,7 +17,27 @@ def _get_row_count(config_name: str):
     
     return  dataset_info.splits[config_name].num_examples
 
-def load_datasets(corpus_count: int, queries_count: int) -> tuple[DataFrame, DataFrame, DataFrame]:
+def _get_store_path(store_dir: str | Path, corpus_count: int, queries_count: int) -> Path:
+    return Path(store_dir) / f'hotpotqa_{corpus_count}_{queries_count}'
+
+def _read_store(path: Path) -> tuple[pa.Table, pa.Table, pa.Table]:
+    return tuple(
+        ipc.open_file(pa.memory_map(str(path / f'{name}.arrow'))).read_all()
+        for name in _STORE_NAMES
+    )
+
+def _write_store(path: Path, tables: tuple[pa.Table, pa.Table, pa.Table]):
+    path.mkdir(parents=True, exist_ok=True)
+    
+    for name, table in zip(_STORE_NAMES, tables):
+        tmp_path = path / f'{name}.arrow.tmp'
+        
+        with ipc.new_file(str(tmp_path), table.schema) as writer:
+            writer.write_table(table)
+        
+        os.replace(tmp_path, path / f'{name}.arrow')
+
+def _prepare_tables(corpus_count: int, queries_count: int) -> tuple[pa.Table, pa.Table, pa.Table]:
     max_corpus_count = _get_row_count('corpus')
     max_query_count = _get_row_count('queries')
     
@@ -18,25 +47,44 @@ def load_datasets(corpus_count: int, queries_count: int) -> tuple[DataFrame, Dat
     # load
     corpus = load_dataset('BeIR/hotpotqa', 'corpus', split=f'corpus[:{corpus_count}]')
     queries = load_dataset('BeIR/hotpotqa', 'queries', split=f'queries[:{queries_count}]')
-    qrels = load_dataset('BeIR/hotpotqa-qrels')
+    qrels = load_dataset('BeIR/hotpotqa-qrels', split='train')
+    
+    corpus_table = corpus.with_format('arrow')[:]
+    queries_table = queries.with_format('arrow')[:]
+    qrels_table = qrels.with_format('arrow')[:]
 
     # filter
-    query_ids_set = set(queries['_id'])
-    corpus_ids_set = set(corpus['_id'])
+    qrels_corpus_ids = pc.cast(qrels_table['corpus-id'], pa.string())
+    filtered_qrels_table = qrels_table.filter(
+        pc.and_(
+            pc.is_in(qrels_corpus_ids, value_set=corpus_table['_id'].combine_chunks()),
+            pc.is_in(qrels_table['query-id'], value_set=queries_table['_id'].combine_chunks())
+        )
+    )
 
-    qrels_df = qrels['train'].to_pandas()
-    filtered_qrels_df = qrels_df[
-        qrels_df['corpus-id'].astype(str).isin(corpus_ids_set) &
-        qrels_df['query-id'].isin(query_ids_set)
-    ]
+    unique_corpus_ids = pc.unique(pc.cast(filtered_qrels_table['corpus-id'], pa.string()).combine_chunks())
+    unique_query_ids = pc.unique(filtered_qrels_table['query-id'].combine_chunks())
 
-    unique_corpus_ids = set(filtered_qrels_df['corpus-id'].astype(str))
-    unique_query_ids = set(filtered_qrels_df['query-id'])
+    filtered_corpus_table = corpus_table.filter(pc.is_in(corpus_table['_id'], value_set=unique_corpus_ids))
+    filtered_queries_table = queries_table.filter(pc.is_in(queries_table['_id'], value_set=unique_query_ids))
+    
+    return filtered_corpus_table, filtered_queries_table, filtered_qrels_table
 
-    filtered_corpus = corpus.filter(lambda x: x['_id'] in unique_corpus_ids)
-    filtered_queries = queries.filter(lambda x: x['_id'] in unique_query_ids)
+def load_datasets(
+    corpus_count: int, 
+    queries_count: int,
+    store_dir: str | Path | None = '.datasets'
+) -> tuple[DataFrame, DataFrame, DataFrame]:
+    store_path = _get_store_path(store_dir, corpus_count, queries_count) if store_dir else None
+    
+    if store_path and all((store_path / f'{name}.arrow').exists() for name in _STORE_NAMES):
+        tables = _read_store(store_path)
+    else:
+        tables = _prepare_tables(corpus_count, queries_count)
+        
+        if store_path:
+            _write_store(store_path, tables)
     
-    filtered_corpus_df = filtered_corpus.to_pandas()
-    filtered_queries_df = filtered_queries.to_pandas()
+    filtered_corpus_df, filtered_queries_df, filtered_qrels_df = (table.to_pandas() for table in tables)
     
-    return filtered_corpus_df, filtered_queries_df, filtered_qrels_df
\ No newline at end of file
+    return filtered_corpus_df, filtered_queries_df, filtered_qrels_df
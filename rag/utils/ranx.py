@@ -1,32 +1,90 @@
 from qdrant_client.http.models import ScoredPoint
+from numpy import ndarray
 from pandas import DataFrame
 from ranx import Qrels, Run
+from rag.fusion import Candidates, FusionFunction
 
+import numpy as np
 
-def get_qrels(qrels_df: DataFrame) -> Qrels:
-    qrels_dict = {}
 
-    for _, row in qrels_df.iterrows():
-        query_id = row['query-id']
-        corpus_id = str(row['corpus-id'])
-        relevance = int(row['score'])
-        
-        if query_id not in qrels_dict:
-            qrels_dict[query_id] = {}
+def _group(
+    query_ids: ndarray, 
+    doc_ids: ndarray, 
+    values: ndarray
+) -> dict[str, dict[str, int | float]]:
+    # stable sort keeps the last duplicate (query, doc) pair winning, as with dict assignment
+    order = np.argsort(query_ids, kind='stable')
+    query_ids, doc_ids, values = query_ids[order], doc_ids[order], values[order]
+    unique_query_ids, starts = np.unique(query_ids, return_index=True)
+    ends = np.append(starts[1:], len(query_ids))
+    doc_ids, values = doc_ids.tolist(), values.tolist()
+
+    return {
+        query_id: dict(zip(doc_ids[start:end], values[start:end]))
+        for query_id, start, end in zip(unique_query_ids.tolist(), starts.tolist(), ends.tolist())
+    }
 
-        qrels_dict[query_id][corpus_id] = relevance
+
+def get_qrels(qrels_df: DataFrame) -> Qrels:
+    qrels_dict = _group(
+        qrels_df['query-id'].astype(str).to_numpy(),
+        qrels_df['corpus-id'].astype(str).to_numpy(),
+        qrels_df['score'].to_numpy(dtype=np.int64)
+    )
         
     return Qrels(qrels_dict)
 
 
+def get_run_from_columns(
+    query_ids: ndarray, 
+    doc_ids: ndarray, 
+    scores: ndarray
+) -> Run:
+    run_dict = _group(
+        np.asarray(query_ids).astype(str), 
+        np.asarray(doc_ids).astype(str), 
+        np.asarray(scores, dtype=np.float64)
+    )
+    
+    return Run(run_dict)
+
+
 def get_run(queries_df: DataFrame, scored_points_list: list[list[ScoredPoint]]) -> Run:
-    runs_dict = {}
+    counts = [len(scored_points) for scored_points in scored_points_list]
+    query_ids = queries_df['_id'].astype(str).to_numpy()
+    
+    run_dict = _group(
+        np.repeat(query_ids[:len(counts)], counts),
+        np.array([str(scored_point.payload['id']) for scored_points in scored_points_list for scored_point in scored_points]),
+        np.array([scored_point.score for scored_points in scored_points_list for scored_point in scored_points], dtype=np.float64)
+    )
+    
+    # queries without any hit still count towards the metrics
+    for query_id in query_ids.tolist():
+        run_dict.setdefault(query_id, {})
+            
+    return Run(run_dict)
+
 
-    for i, query_id in enumerate(queries_df['_id'].values):
-        runs_dict[query_id] = {}
+def get_fusion_runs(
+    queries_df: DataFrame,
+    candidates_list: list[Candidates],
+    fusions: dict[str, FusionFunction],
+    limit: int
+) -> dict[str, Run]:
+    query_ids = queries_df['_id'].astype(str).to_numpy()
+    runs = {}
+    
+    for name, fusion in fusions.items():
+        fused = fusion(candidates_list, limit)
+        valid = fused.ids != ''
+        rows = np.broadcast_to(np.arange(len(query_ids))[:, None], fused.ids.shape)[valid]
         
-        for scored_point in scored_points_list[i]:
-            doc_id = str(scored_point.payload['id'])
-            runs_dict[query_id][doc_id] = float(scored_point.score)
-            
-    return Run(runs_dict)
\ No newline at end of file
+        run_dict = _group(query_ids[rows], fused.ids[valid], fused.scores[valid])
+        
+        for query_id in query_ids.tolist():
+            run_dict.setdefault(query_id, {})
+        
+        runs[name] = Run(run_dict, name=name)
+    
+    return runs
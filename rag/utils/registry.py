@@ -0,0 +1,136 @@
+from collections import OrderedDict
+from fastembed import TextEmbedding, SparseTextEmbedding, LateInteractionTextEmbedding
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+from typing import Any, Literal
+
+import json
+
+
+Model = TextEmbedding | SparseTextEmbedding | LateInteractionTextEmbedding
+ModelKind = Literal['dense', 'sparse', 'reranking']
+
+MODEL_CLASSES: dict[str, type[Model]] = {
+    'dense': TextEmbedding,
+    'sparse': SparseTextEmbedding,
+    'reranking': LateInteractionTextEmbedding
+}
+
+ASSETS_DIR = Path(__file__).parents[1] / 'assets'
+
+
+def load_model_specs(kind: ModelKind) -> list[dict[str, Any]]:
+    return json.loads((ASSETS_DIR / f'fastembed_{kind}_models.json').read_text())
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models, so repositories, evaluators and pipelines share
+    one ONNX session and tokenizer per model and keyword arguments. Models load on first `get`,
+    concurrent requests for the same model wait for a single load.
+
+    Beyond `max_models` the least recently used model is evicted. Eviction only drops the
+    registry's reference, a model still held elsewhere stays in memory until released.
+    """
+    def __init__(self, max_models: int | None = None, **default_kwargs):
+        self.max_models = max_models
+        self.default_kwargs = default_kwargs
+
+        self.load_sec: dict[tuple[str, str, str], float] = {}
+        self.evictions = 0
+
+        self._lock = Lock()
+        self._models: OrderedDict[tuple[str, str, str], Model] = OrderedDict()
+        self._load_locks: dict[tuple[str, str, str], Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def __contains__(self, key: tuple[str, str]) -> bool:
+        kind, model_name = key
+
+        return any(loaded[:2] == (kind, model_name) for loaded in self._models)
+
+    def get(self, kind: ModelKind, model_name: str, **kwargs) -> Model:
+        key = self._get_key(kind, model_name, kwargs)
+
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+
+                return self._models[key]
+
+            load_lock = self._load_locks.setdefault(key, Lock())
+
+        with load_lock:
+            with self._lock:
+                if key in self._models:
+                    return self._models[key]
+
+            start = perf_counter()
+
+            try:
+                model = MODEL_CLASSES[kind](model_name=model_name, **{**self.default_kwargs, **kwargs})
+            except Exception:
+                with self._lock:
+                    self._load_locks.pop(key, None)
+
+                raise
+
+            # the lock is dropped with the model in place, so no later caller loads it again
+            with self._lock:
+                self._models[key] = model
+                self.load_sec[key] = perf_counter() - start
+                self._load_locks.pop(key, None)
+                self._evict_overflow()
+
+            return model
+
+    def warm_up(self, kind: ModelKind, model_name: str, texts: list[str] | None = None, **kwargs) -> Model:
+        """
+        Loads the model and runs it once, the first inference allocates the session's buffers.
+        """
+        model = self.get(kind, model_name, **kwargs)
+        texts = texts or ['warm up']
+
+        list(model.embed(texts))
+        list(model.query_embed(texts[0]))
+
+        return model
+
+    def evict(self, kind: ModelKind | None = None, model_name: str | None = None) -> int:
+        with self._lock:
+            keys = [
+                key
+                for key in self._models
+                if (kind is None or key[0] == kind) and (model_name is None or key[1] == model_name)
+            ]
+
+            for key in keys:
+                del self._models[key]
+
+            self.evictions += len(keys)
+
+        return len(keys)
+
+    def clear(self) -> int:
+        return self.evict()
+
+    def loaded(self) -> list[tuple[str, str]]:
+        with self._lock:
+            return [key[:2] for key in self._models]
+
+    def _get_key(self, kind: ModelKind, model_name: str, kwargs: dict[str, Any]) -> tuple[str, str, str]:
+        if kind not in MODEL_CLASSES:
+            raise ValueError(f'Unknown model kind {kind}, expected one of {list(MODEL_CLASSES)}')
+
+        return kind, model_name, json.dumps({**self.default_kwargs, **kwargs}, sort_keys=True, default=str)
+
+    def _evict_overflow(self):
+        while self.max_models is not None and len(self._models) > self.max_models:
+            self._models.popitem(last=False)
+            self.evictions += 1
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,318 @@
+from fastembed import SparseEmbedding
+from numpy import ndarray
+from pandas import DataFrame
+from pathlib import Path
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Distance,
+    Fusion,
+    MultiVectorComparator,
+    MultiVectorConfig,
+    SparseVectorParams,
+    VectorParams
+)
+from time import perf_counter
+from typing import Any, Iterator, NamedTuple
+
+import importlib.metadata
+import json
+import numpy as np
+import platform
+import shutil
+
+from rag.base import BaseRepository
+from rag.models import DenseModelConfig, SparseModelConfig, RerankingModelConfig, Metadata
+from rag.profiling import PeakRSS
+from rag.repositories import (
+    DenseSearchRepository,
+    SparseSearchRepository,
+    HybridFusionSearchRepository,
+    HybridRerankingSearchRepository
+)
+
+
+REPOSITORIES = ('dense', 'sparse', 'hybrid_fusion', 'hybrid_reranking')
+
+# metrics where a lower value is better, all others are throughputs
+LOWER_IS_BETTER = {'p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb', 'disk_mb', 'ingest_sec'}
+
+# library versions are recorded but may differ between compared runs
+VERSION_KEYS = {'python', 'qdrant_client', 'numpy'}
+
+
+class SyntheticChunk(NamedTuple):
+    metadatas: list[Metadata]
+    dense_embeddings: list[ndarray]
+    sparse_embeddings: list[SparseEmbedding]
+    reranking_embeddings: list[ndarray]
+
+
+class BenchmarkSuite:
+    """
+    Reproducible ingest and query benchmark of the repositories against embedded Qdrant,
+    in memory or on disk under `path`, with no models and no network.
+
+    Documents and queries are random embeddings generated per chunk from `seed` and the chunk
+    offset, so runs with the same `seed` and `chunk_size` see identical data and only one chunk
+    is held in memory.
+    Sparse term ids follow a Zipf distribution to mimic real posting list lengths.
+    Embedded Qdrant searches exhaustively, so numbers are only comparable between runs of the suite.
+    """
+    def __init__(
+        self,
+        sizes: tuple[int, ...] = (10_000, 100_000, 1_000_000),
+        repositories: tuple[str, ...] = REPOSITORIES,
+        path: str | Path | None = None,
+        seed: int = 0,
+        query_count: int = 1_000,
+        limit: int = 10,
+        prefetch_limit: int = 50,
+        chunk_size: int = 10_000,
+        batch_size: int = 64,
+        dense_dim: int = 384,
+        sparse_vocab_size: int = 30_000,
+        sparse_nnz: int = 32,
+        reranking_dim: int = 128,
+        reranking_tokens: int = 16
+    ):
+        self.sizes = sizes
+        self.repositories = repositories
+        self.path = Path(path) if path is not None else None
+        self.seed = seed
+        self.query_count = query_count
+        self.limit = limit
+        self.prefetch_limit = prefetch_limit
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.dense_dim = dense_dim
+        self.sparse_vocab_size = sparse_vocab_size
+        self.sparse_nnz = sparse_nnz
+        self.reranking_dim = reranking_dim
+        self.reranking_tokens = reranking_tokens
+
+    def run(self) -> dict[str, Any]:
+        results = {}
+
+        for size in self.sizes:
+            for repository_name in self.repositories:
+                with PeakRSS() as peak_rss:
+                    result = self._run(repository_name, size)
+
+                results[f'{repository_name}/{size}'] = {**result, 'peak_rss_mb': peak_rss.peak_mb}
+
+        return {
+            'config': self.get_config(),
+            'results': results
+        }
+
+    def get_config(self) -> dict[str, Any]:
+        return {
+            'sizes': list(self.sizes),
+            'repositories': list(self.repositories),
+            'storage': 'disk' if self.path is not None else 'memory',
+            'seed': self.seed,
+            'query_count': self.query_count,
+            'limit': self.limit,
+            'prefetch_limit': self.prefetch_limit,
+            'chunk_size': self.chunk_size,
+            'batch_size': self.batch_size,
+            'dense_dim': self.dense_dim,
+            'sparse_vocab_size': self.sparse_vocab_size,
+            'sparse_nnz': self.sparse_nnz,
+            'reranking_dim': self.reranking_dim,
+            'reranking_tokens': self.reranking_tokens,
+            'python': platform.python_version(),
+            'qdrant_client': importlib.metadata.version('qdrant-client'),
+            'numpy': np.__version__
+        }
+
+    @staticmethod
+    def save_baseline(report: dict[str, Any], path: str | Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2))
+
+    @staticmethod
+    def compare(report: dict[str, Any], baseline_path: str | Path, tolerance: float = 0.1) -> DataFrame:
+        """
+        One row per benchmark and metric present in both runs, `change` is relative to the
+        baseline and a regression is a change beyond `tolerance` in the worse direction.
+        Both runs must share sizes, storage and data parameters. Peak RSS is sampled per
+        benchmark by `PeakRSS`, so it still includes whatever earlier benchmarks left resident.
+        """
+        baseline = json.loads(Path(baseline_path).read_text())
+        mismatched = [
+            name
+            for name, value in report['config'].items()
+            if name not in VERSION_KEYS and baseline['config'].get(name) != value
+        ]
+
+        if mismatched:
+            raise ValueError(f'Baseline was recorded with a different configuration: {mismatched}')
+
+        rows = []
+
+        for key, metrics in report['results'].items():
+            for metric, value in metrics.items():
+                baseline_value = baseline['results'].get(key, {}).get(metric)
+
+                if baseline_value is None:
+                    continue
+
+                change = (value - baseline_value) / baseline_value if baseline_value else 0.0
+                worse = change if metric in LOWER_IS_BETTER else -change
+
+                rows.append({
+                    'benchmark': key,
+                    'metric': metric,
+                    'baseline': baseline_value,
+                    'current': value,
+                    'change': change,
+                    'regression': worse > tolerance
+                })
+
+        return DataFrame(rows)
+
+    def get_chunk(self, start: int, count: int, queries: bool = False) -> SyntheticChunk:
+        # documents and queries draw from separate streams, both keyed by their offset
+        rng = np.random.default_rng([self.seed, int(queries), start])
+
+        dense = rng.standard_normal((count, self.dense_dim), dtype=np.float32)
+        reranking = rng.standard_normal((count, self.reranking_tokens, self.reranking_dim), dtype=np.float32)
+        terms = (rng.zipf(1.3, (count, self.sparse_nnz)) - 1) % self.sparse_vocab_size
+        weights = rng.random((count, self.sparse_nnz), dtype=np.float32)
+
+        sparse_embeddings = []
+
+        for row_terms, row_weights in zip(terms, weights):
+            indices, first = np.unique(row_terms, return_index=True)
+            sparse_embeddings.append(SparseEmbedding(indices=indices, values=row_weights[first]))
+
+        return SyntheticChunk(
+            [Metadata(id=start + i, text=f'document {start + i}') for i in range(count)],
+            list(dense),
+            sparse_embeddings,
+            list(reranking)
+        )
+
+    def get_chunks(self, size: int) -> Iterator[SyntheticChunk]:
+        for start in range(0, size, self.chunk_size):
+            yield self.get_chunk(start, min(self.chunk_size, size - start))
+
+    def get_repository(self, repository_name: str, qdrant_client: QdrantClient) -> BaseRepository:
+        dense_model_config = DenseModelConfig(
+            name='dense',
+            vector_params=VectorParams(size=self.dense_dim, distance=Distance.COSINE)
+        )
+        sparse_model_config = SparseModelConfig(
+            name='sparse',
+            sparse_vector_params=SparseVectorParams()
+        )
+        reranking_model_config = RerankingModelConfig(
+            name='reranking',
+            vector_params=VectorParams(
+                size=self.reranking_dim,
+                distance=Distance.COSINE,
+                multivector_config=MultiVectorConfig(comparator=MultiVectorComparator.MAX_SIM)
+            )
+        )
+
+        if repository_name == 'dense':
+            return DenseSearchRepository(
+                qdrant_client=qdrant_client,
+                dense_model_config=dense_model_config
+            )
+
+        if repository_name == 'sparse':
+            return SparseSearchRepository(
+                qdrant_client=qdrant_client,
+                sparse_model_config=sparse_model_config
+            )
+
+        if repository_name == 'hybrid_fusion':
+            return HybridFusionSearchRepository(
+                qdrant_client=qdrant_client,
+                dense_model_config=dense_model_config,
+                sparse_model_config=sparse_model_config
+            )
+
+        if repository_name == 'hybrid_reranking':
+            return HybridRerankingSearchRepository(
+                qdrant_client=qdrant_client,
+                dense_model_config=dense_model_config,
+                sparse_model_config=sparse_model_config,
+                reranking_model_config=reranking_model_config
+            )
+
+        raise ValueError(f'Unknown repository {repository_name}, expected one of {REPOSITORIES}')
+
+    def _run(self, repository_name: str, size: int) -> dict[str, float]:
+        storage_path = self.path / f'{repository_name}_{size}' if self.path is not None else None
+
+        if storage_path is not None and storage_path.exists():
+            shutil.rmtree(storage_path)
+
+        qdrant_client = QdrantClient(path=str(storage_path)) if storage_path is not None else QdrantClient(':memory:')
+        repository = self.get_repository(repository_name, qdrant_client)
+        collection_name = f'benchmark_{repository_name}_{size}'
+
+        # ingest, generation is excluded from the timing
+        repository.create_collection(collection_name)
+        ingest_sec = 0.0
+
+        for chunk in self.get_chunks(size):
+            start = perf_counter()
+            repository.upload_points(collection_name, *chunk)
+            ingest_sec += perf_counter() - start
+
+        start = perf_counter()
+        repository.build_index(collection_name)
+        ingest_sec += perf_counter() - start
+
+        # query
+        queries = self.get_chunk(0, self.query_count, queries=True)
+        query_args = (
+            queries.dense_embeddings if repository_name != 'sparse' else None,
+            queries.sparse_embeddings if repository_name != 'dense' else None,
+            queries.reranking_embeddings if repository_name == 'hybrid_reranking' else None
+        )
+        fusion_algorithm = Fusion.RRF if repository_name == 'hybrid_fusion' else None
+
+        start = perf_counter()
+        repository.search_batch(
+            collection_name,
+            self.limit,
+            self.prefetch_limit,
+            fusion_algorithm,
+            *query_args,
+            batch_size=self.batch_size
+        )
+        batch_sec = perf_counter() - start
+
+        latencies = []
+
+        for query_embeddings in repository.zip_embeddings(*query_args):
+            start = perf_counter()
+            repository.search(collection_name, self.limit, self.prefetch_limit, fusion_algorithm, *query_embeddings)
+            latencies.append(perf_counter() - start)
+
+        latencies_ms = np.array(latencies) * 1_000
+
+        result = {
+            'docs': size,
+            'ingest_sec': ingest_sec,
+            'docs_per_sec': size / ingest_sec,
+            'batch_qps': self.query_count / batch_sec,
+            'qps': self.query_count / latencies_ms.sum() * 1_000,
+            'p50_ms': float(np.percentile(latencies_ms, 50)),
+            'p95_ms': float(np.percentile(latencies_ms, 95)),
+            'p99_ms': float(np.percentile(latencies_ms, 99))
+        }
+
+        if storage_path is not None:
+            result['disk_mb'] = sum(path.stat().st_size for path in storage_path.rglob('*') if path.is_file()) / 2 ** 20
+
+        repository.delete_collection(collection_name)
+        qdrant_client.close()
+
+        return result
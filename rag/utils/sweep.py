@@ -0,0 +1,152 @@
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from hashlib import sha1
+from inspect import signature
+from itertools import product
+from pandas import DataFrame, read_csv
+from pathlib import Path
+from qdrant_client.models import SearchParams
+from threading import Lock
+from typing import Any, Callable
+
+import json
+
+from .evaluator import Evaluator
+
+
+# parameters of `Evaluator.run` only change the query, everything else requires a new index
+QUERY_PARAMS = set(signature(Evaluator.run).parameters) - {'self', 'metrics', 'profiler'}
+
+# fields of `SearchParams` (e.g. `hnsw_ef`, `exact`) are query-time too and are passed as `search_params`
+SEARCH_PARAMS = set(SearchParams.model_fields)
+
+
+def _get_grid(grid: dict[str, list]) -> list[dict[str, Any]]:
+    return [dict(zip(grid.keys(), values)) for values in product(*grid.values())]
+
+
+def _format_value(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+
+    return str(value)
+
+
+def _get_config_id(params: dict[str, Any]) -> str:
+    key = json.dumps({name: _format_value(value) for name, value in params.items()}, sort_keys=True)
+
+    return sha1(key.encode('utf-8')).hexdigest()
+
+
+class Sweep:
+    """
+    Grid search over `Evaluator` configurations.
+
+    Parameters accepted by `Evaluator.run` (e.g. `top_k`, `scale_k`, `fusion_algorithm`) and
+    fields of `SearchParams` (e.g. `hnsw_ef`, `exact`) are query-time parameters,
+    all other grid keys are index parameters passed to `setup_factory`,
+    which returns the keyword arguments of `Evaluator.setup` (repository and models).
+    Each index configuration is set up once and all of its query-time configurations run
+    concurrently against the same collection and cached query embeddings.
+
+    Metric names are formatted with the configuration, e.g. `'ndcg@{top_k}'`.
+    Results are appended to the `results_path` CSV as they finish, one row per configuration
+    and metric, so an interrupted sweep resumes from the configurations that are missing.
+    Grid values should be plain values (model names, numbers, enums) to be matched on resume.
+    """
+    def __init__(
+        self,
+        evaluator: Evaluator,
+        collection_name: str,
+        setup_factory: Callable[[dict[str, Any]], dict[str, Any]],
+        grid: dict[str, list],
+        metrics: list[str],
+        results_path: str | Path
+    ):
+        if 'search_params' in grid and SEARCH_PARAMS & set(grid):
+            raise ValueError(f'Grid keys {sorted(SEARCH_PARAMS & set(grid))} conflict with the search_params key')
+
+        self.evaluator = evaluator
+        self.collection_name = collection_name
+        self.setup_factory = setup_factory
+        self.index_grid = {name: values for name, values in grid.items() if name not in QUERY_PARAMS | SEARCH_PARAMS}
+        self.query_grid = {name: values for name, values in grid.items() if name in QUERY_PARAMS | SEARCH_PARAMS}
+        self.metrics = metrics
+        self.results_path = Path(results_path)
+
+        self._lock = Lock()
+
+    def run(self, max_workers: int = 4) -> DataFrame:
+        done_config_ids = self._get_done_config_ids()
+
+        for index_params in _get_grid(self.index_grid):
+            pending_query_params = [
+                query_params
+                for query_params in _get_grid(self.query_grid)
+                if _get_config_id({**index_params, **query_params}) not in done_config_ids
+            ]
+
+            if not pending_query_params:
+                continue
+
+            self.evaluator.setup(
+                collection_name=self.collection_name,
+                **self.setup_factory(index_params)
+            )
+            self.evaluator.embed_queries()
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(self._run, index_params, query_params)
+                    for query_params in pending_query_params
+                ]
+
+                for future in futures:
+                    future.result()
+
+            self.evaluator.clear()
+
+        return read_csv(self.results_path)
+
+    def _run(self, index_params: dict[str, Any], query_params: dict[str, Any]):
+        params = {**index_params, **query_params}
+        metrics = [metric.format(**params) for metric in self.metrics]
+
+        run_params = {name: value for name, value in query_params.items() if name not in SEARCH_PARAMS}
+        search_params = {name: value for name, value in query_params.items() if name in SEARCH_PARAMS}
+
+        if search_params:
+            run_params['search_params'] = SearchParams(**search_params)
+
+        results = self.evaluator.run(metrics=metrics, **run_params)
+
+        if not isinstance(results, dict):
+            results = {metrics[0]: results}
+
+        rows = [
+            {
+                'config_id': _get_config_id(params),
+                **{name: _format_value(value) for name, value in params.items()},
+                'metric': metric,
+                'value': float(value)
+            }
+            for metric, value in results.items()
+        ]
+
+        self._append(rows)
+
+    def _append(self, rows: list[dict[str, Any]]):
+        with self._lock:
+            header = not self.results_path.exists()
+            self.results_path.parent.mkdir(parents=True, exist_ok=True)
+
+            DataFrame(rows).to_csv(self.results_path, mode='a', header=header, index=False)
+
+    def _get_done_config_ids(self) -> set[str]:
+        if not self.results_path.exists():
+            return set()
+
+        return set(read_csv(self.results_path, usecols=['config_id'])['config_id'])
@@ -0,0 +1,171 @@
+from fastembed import SparseEmbedding
+from numpy import ndarray
+from pandas import DataFrame
+from qdrant_client.models import CollectionStatus, Fusion, HnswConfigDiff, SearchParams, VectorParamsDiff
+from time import perf_counter, sleep
+from typing import Any
+
+import numpy as np
+
+from rag.base import BaseRepository
+
+from .benchmark import _get_ids
+
+
+def _sample(embeddings: list | None, indices: ndarray) -> list | None:
+    return [embeddings[i] for i in indices] if embeddings is not None else None
+
+
+def _wait_for_reindex(repository: BaseRepository, collection_name: str, start_timeout: float = 5.0, poll_interval: float = 0.1):
+    # the optimizer picks up a config change asynchronously, until then the collection still reports green
+    deadline = perf_counter() + start_timeout
+
+    while (
+        repository.qdrant_client.get_collection(collection_name).status == CollectionStatus.GREEN and 
+        perf_counter() < deadline
+    ):
+        sleep(poll_interval)
+
+    repository.wait_for_optimizers(collection_name)
+
+
+def _get_index_params(repository: BaseRepository, collection_name: str, names: set[str]) -> dict[str, int]:
+    config = repository.qdrant_client.get_collection(collection_name).config
+    vector_hnsw_config = config.params.vectors[repository.dense_model_config.name].hnsw_config
+
+    # a field the vector does not override comes from the collection
+    return {
+        name: getattr(config.hnsw_config, name) if getattr(vector_hnsw_config, name, None) is None else getattr(vector_hnsw_config, name)
+        for name in names
+    }
+
+
+def _set_index_params(repository: BaseRepository, collection_name: str, index_params: dict[str, int]):
+    repository.qdrant_client.update_collection(
+        collection_name=collection_name,
+        vectors_config={
+            repository.dense_model_config.name: VectorParamsDiff(hnsw_config=HnswConfigDiff(**index_params))
+        }
+    )
+    _wait_for_reindex(repository, collection_name)
+
+
+def tune_hnsw(
+    repository: BaseRepository,
+    collection_name: str,
+    limit: int,
+    prefetch_limit: int | None = None,
+    fusion_algorithm: Fusion | None = None,
+    dense_embeddings: list[ndarray] | None = None,
+    sparse_embeddings: list[SparseEmbedding] | None = None,
+    reranking_embeddings: list[ndarray] | None = None,
+    target_recall: float = 0.95,
+    ef_values: tuple[int, ...] = (16, 32, 64, 128, 256, 512),
+    index_grid: list[dict[str, int]] | None = None,
+    sample_size: int | None = 200,
+    seed: int = 0
+) -> tuple[dict[str, Any] | None, DataFrame]:
+    """
+    Sweeps `hnsw_ef` over a sample of the queries and measures recall@`limit` against exact search
+    and sequential latency, per entry of `index_grid` (`m` and `ef_construct` of the dense vector,
+    the collection is re-indexed for each) or on the current index if None.
+
+    Per index configuration the smallest `hnsw_ef` that reaches `target_recall` is chosen,
+    since recall grows with it and latency differences between neighbouring values are mostly noise.
+    Latency only decides between index configurations. Returns the chosen setting, None if no
+    setting reaches `target_recall`, and the full latency/recall curve. With `index_grid` the collection
+    is left indexed with the chosen `m`/`ef_construct`, or with its original ones if none qualifies.
+    Embedded Qdrant searches exhaustively, so tune against a server.
+    """
+    query_count = len(next(
+        embeddings
+        for embeddings in (dense_embeddings, sparse_embeddings, reranking_embeddings)
+        if embeddings is not None
+    ))
+    indices = np.arange(query_count)
+
+    if sample_size is not None and sample_size < query_count:
+        indices = np.sort(np.random.default_rng(seed).choice(query_count, sample_size, replace=False))
+
+    query_args = (
+        _sample(dense_embeddings, indices),
+        _sample(sparse_embeddings, indices),
+        _sample(reranking_embeddings, indices)
+    )
+
+    def search(search_params: SearchParams) -> list[list[Any]]:
+        return repository.search_batch(
+            collection_name,
+            limit,
+            prefetch_limit,
+            fusion_algorithm,
+            *query_args,
+            search_params=search_params
+        )
+
+    # ground truth does not depend on the index, so it is computed once
+    exact_ids = _get_ids(search(SearchParams(exact=True)))
+    rows = []
+    candidates = []
+    index_names = {name for index_params in index_grid or [] for name in index_params}
+    original_index_params = _get_index_params(repository, collection_name, index_names) if index_names else {}
+    applied_index_params = original_index_params
+
+    for index_params in index_grid or [{}]:
+        if index_params:
+            # fields an entry leaves out keep their original value
+            applied_index_params = {**original_index_params, **index_params}
+            _set_index_params(repository, collection_name, applied_index_params)
+
+        index_rows = []
+
+        for hnsw_ef in sorted(ef_values):
+            search_params = SearchParams(hnsw_ef=hnsw_ef)
+
+            # warm up caches before timing
+            search(search_params)
+
+            latencies = []
+            scored_points_list = []
+
+            for query_embeddings in repository.zip_embeddings(*query_args):
+                start = perf_counter()
+                scored_points_list.append(repository.search(
+                    collection_name,
+                    limit,
+                    prefetch_limit,
+                    fusion_algorithm,
+                    *query_embeddings,
+                    search_params=search_params
+                ))
+                latencies.append(perf_counter() - start)
+
+            latencies_ms = np.array(latencies) * 1_000
+            recalls = [
+                len(ids & expected) / len(expected) if expected else 1.0
+                for ids, expected in zip(_get_ids(scored_points_list), exact_ids)
+            ]
+
+            index_rows.append({
+                **applied_index_params,
+                'hnsw_ef': hnsw_ef,
+                f'recall@{limit}': float(np.mean(recalls)),
+                'qps': float(len(latencies) / latencies_ms.sum() * 1_000),
+                'p50_ms': float(np.percentile(latencies_ms, 50)),
+                'p95_ms': float(np.percentile(latencies_ms, 95))
+            })
+
+        rows.extend(index_rows)
+        passing = [row for row in index_rows if row[f'recall@{limit}'] >= target_recall]
+
+        if passing:
+            candidates.append(min(passing, key=lambda row: row['hnsw_ef']))
+
+    best = min(candidates, key=lambda row: row['p50_ms']) if candidates else None
+
+    final_index_params = {name: best[name] for name in index_names} if best is not None else original_index_params
+
+    if final_index_params != applied_index_params:
+        _set_index_params(repository, collection_name, final_index_params)
+
+    return best, DataFrame(rows)
@@ -0,0 +1,97 @@
+from qdrant_client.models import Distance, VectorParams
+from typing import Callable
+
+import numpy as np
+import unittest
+
+from rag.models import DenseModelConfig, Metadata
+from rag.repositories import CachedSearchRepository, ExactSearchRepository
+
+
+class _HookedRepository(ExactSearchRepository):
+    # runs `on_search` once results are read, as a write that lands while a search is in flight
+    on_search: Callable[[], None] | None = None
+
+    def search_batch(self, *args, **kwargs):
+        scored_points_list = super().search_batch(*args, **kwargs)
+
+        if self.on_search is not None:
+            on_search, self.on_search = self.on_search, None
+            on_search()
+
+        return scored_points_list
+
+
+class TestCachedSearchRepository(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+
+        self.repository = _HookedRepository(
+            dense_model_config=DenseModelConfig(name='dense', vector_params=VectorParams(size=8, distance=Distance.COSINE))
+        )
+        self.cached_repository = CachedSearchRepository(self.repository, max_size=2)
+        self.metadatas = [Metadata(id=i, text=f'document {i}') for i in range(20)]
+        self.embeddings = list(rng.standard_normal((20, 8), dtype=np.float32))
+        self.queries = list(rng.standard_normal((3, 8), dtype=np.float32))
+
+        self.cached_repository.create_collection('cached')
+        self.cached_repository.upload_points('cached', self.metadatas[:10], self.embeddings[:10])
+
+    def _search(self, query_index: int = 0) -> list[int]:
+        scored_points = self.cached_repository.search('cached', 3, dense_embedding=self.queries[query_index])
+
+        return [scored_point.payload['id'] for scored_point in scored_points]
+
+    def test_hit(self):
+        ids = self._search()
+
+        self.assertEqual(self._search(), ids)
+        self.assertEqual((self.cached_repository.hits, self.cached_repository.misses), (1, 1))
+
+    def test_key(self):
+        self._search(0)
+        self.cached_repository.search('cached', 4, dense_embedding=self.queries[0])
+
+        self.assertEqual((self.cached_repository.hits, self.cached_repository.misses), (0, 2))
+
+    def test_upload_invalidates(self):
+        self._search()
+
+        # the query itself as a new document is its best match
+        self.cached_repository.upload_points('cached', [self.metadatas[10]], [self.queries[0]])
+
+        self.assertEqual(self._search()[0], 10)
+        self.assertEqual((self.cached_repository.hits, self.cached_repository.misses), (0, 2))
+
+    def test_write_during_search(self):
+        self.repository.on_search = lambda: self.cached_repository.upload_points(
+            'cached',
+            [self.metadatas[10]],
+            [self.queries[0]]
+        )
+        self.assertNotEqual(self._search()[0], 10)
+
+        # results of the overlapping search predate the write and were not cached
+        self.assertEqual(self._search()[0], 10)
+        self.assertEqual(self.cached_repository.hits, 0)
+
+    def test_eviction(self):
+        for query_index in range(3):
+            self._search(query_index)
+
+        self._search(0)
+
+        self.assertEqual(self.cached_repository.evictions, 2)
+        self.assertEqual(self.cached_repository.stats()['size'], 2)
+        self.assertEqual(self.cached_repository.hits, 0)
+
+    def test_ttl(self):
+        self.cached_repository.ttl = 0.0
+        self._search()
+        self._search()
+
+        self.assertEqual((self.cached_repository.hits, self.cached_repository.misses), (0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+from fastembed import SparseEmbedding
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import unittest
+
+from rag.utils.cache import CachedEmbeddingModel, EmbeddingCache
+
+
+class _CountingModel:
+    # stands in for a fastembed model, `model` holds the implementation like fastembed's wrappers
+    model_name = 'counting'
+
+    def __init__(self, k: float = 1.2):
+        self.model = type('Implementation', (), {'k': k})()
+        self.calls = []
+
+    def embed(self, texts: list[str], **kwargs):
+        self.calls.append(list(texts))
+
+        return iter([np.full(4, len(text), dtype=np.float32) for text in texts])
+
+    def query_embed(self, texts: list[str], **kwargs):
+        return iter([-embedding for embedding in self.embed(texts)])
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = TemporaryDirectory()
+        self.cache_dir = self.temporary_directory.name
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_round_trip(self):
+        rng = np.random.default_rng(0)
+        embeddings = {
+            'dense': [rng.standard_normal(8, dtype=np.float32) for _ in range(3)],
+            'multivector': [rng.standard_normal((n, 8), dtype=np.float32) for n in (1, 4, 2)],
+            'sparse': [
+                SparseEmbedding(indices=np.array([1, 5, 9][:n]), values=rng.random(n).astype(np.float32))
+                for n in (3, 1, 2)
+            ]
+        }
+        cache = EmbeddingCache(self.cache_dir)
+
+        for kind, kind_embeddings in embeddings.items():
+            cache.put(cache.namespace(kind), ['a', 'b', 'c'], kind_embeddings)
+
+        # a new instance reads everything back from disk
+        cache = EmbeddingCache(self.cache_dir)
+
+        for kind, kind_embeddings in embeddings.items():
+            cached_embeddings = cache.get(cache.namespace(kind), ['c', 'x', 'a'])
+
+            self.assertIsNone(cached_embeddings[1])
+
+            for cached_embedding, embedding in zip(cached_embeddings[::2], kind_embeddings[::-2]):
+                if kind == 'sparse':
+                    np.testing.assert_array_equal(cached_embedding.indices, embedding.indices)
+                    np.testing.assert_array_equal(cached_embedding.values, embedding.values)
+                else:
+                    np.testing.assert_array_equal(cached_embedding, embedding)
+
+        self.assertEqual((cache.hits, cache.misses), (6, 3))
+
+    def test_namespace(self):
+        cache = EmbeddingCache(self.cache_dir)
+
+        self.assertEqual(cache.namespace('bm25', {'k': 1.2, 'b': 0.75}), cache.namespace('bm25', {'b': 0.75, 'k': 1.2}))
+        self.assertNotEqual(cache.namespace('bm25', {'k': 1.2}), cache.namespace('bm25', {'k': 1.5}))
+        self.assertNotEqual(cache.namespace('bm25'), cache.namespace('splade'))
+
+    def test_put_appends(self):
+        cache = EmbeddingCache(self.cache_dir)
+        namespace = cache.namespace('dense')
+
+        for i in range(5):
+            cache.put(namespace, [f'text {i}'], [np.zeros(4, dtype=np.float32)])
+
+        # one log line per put, the shards already written stay untouched
+        self.assertEqual(len((cache.cache_dir / namespace / 'shards.jsonl').read_text().splitlines()), 5)
+        self.assertEqual(len(EmbeddingCache(self.cache_dir).get(namespace, [f'text {i}' for i in range(5)])), 5)
+
+    def test_torn_log(self):
+        cache = EmbeddingCache(self.cache_dir)
+        namespace = cache.namespace('dense')
+        cache.put(namespace, ['a'], [np.ones(4, dtype=np.float32)])
+
+        with open(cache.cache_dir / namespace / 'shards.jsonl', 'a') as file:
+            file.write('{"shard": "torn"')
+
+        cache = EmbeddingCache(self.cache_dir)
+        cache.put(namespace, ['b'], [np.ones(4, dtype=np.float32)])
+
+        embeddings = EmbeddingCache(self.cache_dir).get(namespace, ['a', 'b'])
+        self.assertTrue(all(embedding is not None for embedding in embeddings))
+
+    def test_eviction(self):
+        # each shard holds one 16 byte vector and a 40 byte hash
+        cache = EmbeddingCache(self.cache_dir, max_size_bytes=2 * 56)
+        namespace = cache.namespace('dense')
+        cache.put(namespace, ['a'], [np.ones(4, dtype=np.float32)])
+        cache.put(namespace, ['b'], [np.ones(4, dtype=np.float32)])
+
+        # `a` was used last, so `b` goes first
+        cache.get(namespace, ['a'])
+        cache.put(namespace, ['c'], [np.ones(4, dtype=np.float32)])
+
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.size_bytes(), 2 * 56)
+        self.assertEqual(
+            [embedding is not None for embedding in EmbeddingCache(self.cache_dir).get(namespace, ['a', 'b', 'c'])],
+            [True, False, True]
+        )
+
+    def test_cached_model(self):
+        cache = EmbeddingCache(self.cache_dir)
+        model = _CountingModel()
+        cached_model = CachedEmbeddingModel(model, cache)
+
+        list(cached_model.embed(['a', 'bb']))
+        embeddings = list(cached_model.embed(['bb', 'ccc']))
+        query_embeddings = list(cached_model.query_embed('a'))
+
+        self.assertEqual(model.calls, [['a', 'bb'], ['ccc'], ['a']])
+        np.testing.assert_array_equal(embeddings[0], np.full(4, 2))
+        np.testing.assert_array_equal(query_embeddings[0], np.full(4, -1))
+
+        # output parameters of the implementation are part of the namespace
+        other_model = _CountingModel(k=1.5)
+        list(CachedEmbeddingModel(other_model, cache).embed(['a']))
+
+        self.assertEqual(cached_model.model_kwargs, {'k': 1.2})
+        self.assertEqual(other_model.calls, [['a']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, Fusion, Modifier, ScoredPoint, SparseVectorParams, VectorParams
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import unittest
+
+from rag.models import DenseModelConfig, SparseModelConfig
+from rag.repositories import (
+    DenseSearchRepository,
+    ExactSearchRepository,
+    HybridFusionSearchRepository,
+    SparseSearchRepository
+)
+from rag.utils import BenchmarkSuite
+
+
+LIMIT = 10
+
+
+def _get_configs(distance: Distance, modifier: Modifier | None) -> tuple[DenseModelConfig, SparseModelConfig]:
+    return (
+        DenseModelConfig(name='dense', vector_params=VectorParams(size=32, distance=distance)),
+        SparseModelConfig(name='sparse', sparse_vector_params=SparseVectorParams(modifier=modifier))
+    )
+
+
+class TestExactSearchRepository(unittest.TestCase):
+    """
+    `ExactSearchRepository` against the same repositories on embedded Qdrant, which searches exhaustively too.
+    """
+    @classmethod
+    def setUpClass(cls):
+        suite = BenchmarkSuite(dense_dim=32, sparse_vocab_size=500, sparse_nnz=12)
+        cls.chunk = suite.get_chunk(0, 2_000)
+        cls.queries = suite.get_chunk(0, 40, queries=True)
+
+    def test_dense(self):
+        for distance in (Distance.COSINE, Distance.DOT, Distance.EUCLID):
+            with self.subTest(distance=distance):
+                dense_model_config, _ = _get_configs(distance, None)
+
+                self._assert_parity(
+                    DenseSearchRepository(qdrant_client=QdrantClient(':memory:'), dense_model_config=dense_model_config),
+                    ExactSearchRepository(dense_model_config=dense_model_config)
+                )
+
+    def test_sparse(self):
+        for modifier in (None, Modifier.IDF):
+            with self.subTest(modifier=modifier):
+                _, sparse_model_config = _get_configs(Distance.COSINE, modifier)
+
+                self._assert_parity(
+                    SparseSearchRepository(qdrant_client=QdrantClient(':memory:'), sparse_model_config=sparse_model_config),
+                    ExactSearchRepository(sparse_model_config=sparse_model_config)
+                )
+
+    def test_hybrid_fusion(self):
+        for fusion_algorithm, prefetch_limit in ((Fusion.RRF, None), (Fusion.DBSF, None), (Fusion.RRF, 50), (Fusion.DBSF, 50)):
+            with self.subTest(fusion_algorithm=fusion_algorithm, prefetch_limit=prefetch_limit):
+                dense_model_config, sparse_model_config = _get_configs(Distance.COSINE, Modifier.IDF)
+
+                self._assert_parity(
+                    HybridFusionSearchRepository(
+                        qdrant_client=QdrantClient(':memory:'),
+                        dense_model_config=dense_model_config,
+                        sparse_model_config=sparse_model_config
+                    ),
+                    ExactSearchRepository(dense_model_config=dense_model_config, sparse_model_config=sparse_model_config),
+                    fusion_algorithm,
+                    prefetch_limit
+                )
+
+    def test_storage_dir(self):
+        dense_model_config, _ = _get_configs(Distance.COSINE, None)
+
+        with TemporaryDirectory() as storage_dir:
+            repository = ExactSearchRepository(dense_model_config=dense_model_config, block_size=700, storage_dir=storage_dir)
+
+            self._assert_parity(
+                DenseSearchRepository(qdrant_client=QdrantClient(':memory:'), dense_model_config=dense_model_config),
+                repository
+            )
+
+            # a new collection starts from an empty file, not the rows of the previous one
+            repository.create_collection('exact')
+            repository.upload_points('exact', self.chunk.metadatas[:100], self.chunk.dense_embeddings[:100])
+            repository.build_index('exact')
+            scored_points_list = self._search(repository, 'exact', None)
+
+            self.assertTrue(all(scored_point.payload['id'] < 100 for scored_points in scored_points_list for scored_point in scored_points))
+
+    def _assert_parity(
+        self,
+        repository,
+        exact_repository: ExactSearchRepository,
+        fusion_algorithm: Fusion = None,
+        prefetch_limit: int = None
+    ):
+        for collection_name, search_repository in (('qdrant', repository), ('exact', exact_repository)):
+            search_repository.create_collection(collection_name)
+
+            # uploaded in parts and partly overwritten, so consolidation and replaced rows are covered
+            for start in range(0, len(self.chunk.metadatas), 500):
+                search_repository.upload_points(
+                    collection_name,
+                    self.chunk.metadatas[start:start + 500],
+                    self.chunk.dense_embeddings[start:start + 500],
+                    self.chunk.sparse_embeddings[start:start + 500]
+                )
+                self._search(search_repository, collection_name, fusion_algorithm)
+
+            search_repository.upload_points(
+                collection_name,
+                self.chunk.metadatas[:5],
+                self.chunk.dense_embeddings[5:10],
+                self.chunk.sparse_embeddings[5:10]
+            )
+            search_repository.build_index(collection_name)
+
+        expected = self._search(repository, 'qdrant', fusion_algorithm, prefetch_limit)
+        actual = self._search(exact_repository, 'exact', fusion_algorithm, prefetch_limit)
+
+        for expected_points, actual_points in zip(expected, actual, strict=True):
+            self._assert_same_ranking(expected_points, actual_points)
+
+    def _search(
+        self,
+        repository,
+        collection_name: str,
+        fusion_algorithm: Fusion | None,
+        prefetch_limit: int | None = None
+    ) -> list[list[ScoredPoint]]:
+        return repository.search_batch(
+            collection_name,
+            LIMIT,
+            prefetch_limit,
+            fusion_algorithm,
+            self.queries.dense_embeddings,
+            self.queries.sparse_embeddings,
+            batch_size=16
+        )
+
+    def _assert_same_ranking(self, expected: list[ScoredPoint], actual: list[ScoredPoint]):
+        expected_scores = np.array([scored_point.score for scored_point in expected])
+        actual_scores = np.array([scored_point.score for scored_point in actual])
+        np.testing.assert_allclose(actual_scores, expected_scores, rtol=1e-3, atol=1e-4)
+
+        # points with equal scores (common with RRF) may come back in any order, and the last
+        # group may be cut off by the limit differently, so the ids of every other group must match
+        groups = np.concatenate([[0], np.cumsum(~np.isclose(expected_scores[1:], expected_scores[:-1], rtol=1e-6, atol=1e-7))])
+
+        for group in np.unique(groups)[:-1]:
+            self.assertEqual(
+                {scored_point.id for scored_point, in_group in zip(expected, groups == group) if in_group},
+                {scored_point.id for scored_point, in_group in zip(actual, groups == group) if in_group}
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+from functools import partial
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, Fusion, Modifier, ScoredPoint, SparseVectorParams, VectorParams
+
+import numpy as np
+import unittest
+
+from rag.fusion import Candidates, dbsf, rrf
+from rag.models import DenseModelConfig, SparseModelConfig
+from rag.repositories import HybridFusionSearchRepository
+from rag.utils import BenchmarkSuite
+
+
+LIMIT = 10
+
+
+class TestFusion(unittest.TestCase):
+    """
+    Client-side fusion against Qdrant's server-side RRF and DBSF over the same collection.
+    """
+    @classmethod
+    def setUpClass(cls):
+        suite = BenchmarkSuite(dense_dim=32, sparse_vocab_size=500, sparse_nnz=12)
+        chunk = suite.get_chunk(0, 2_000)
+        cls.queries = suite.get_chunk(0, 40, queries=True)
+
+        cls.qdrant_client = QdrantClient(':memory:')
+        cls.dense_model_config = DenseModelConfig(name='dense', vector_params=VectorParams(size=32, distance=Distance.COSINE))
+        cls.sparse_model_config = SparseModelConfig(
+            name='sparse',
+            sparse_vector_params=SparseVectorParams(modifier=Modifier.IDF)
+        )
+
+        repository = cls._get_repository()
+        repository.create_collection('fusion')
+        repository.upload_points('fusion', chunk.metadatas, chunk.dense_embeddings, chunk.sparse_embeddings)
+
+    @classmethod
+    def _get_repository(cls, client_fusion=None) -> HybridFusionSearchRepository:
+        return HybridFusionSearchRepository(
+            qdrant_client=cls.qdrant_client,
+            dense_model_config=cls.dense_model_config,
+            sparse_model_config=cls.sparse_model_config,
+            client_fusion=client_fusion
+        )
+
+    def test_rrf(self):
+        # Qdrant ranks from 0 with a constant of 2, which is k=1 with 1-based ranks
+        self._assert_parity(Fusion.RRF, partial(rrf, k=1))
+
+    def test_dbsf(self):
+        self._assert_parity(Fusion.DBSF, dbsf)
+
+    def test_fuse(self):
+        candidates_list = [
+            Candidates(np.array([['a', 'b', ''], ['c', '', '']]), np.array([[3.0, 2.0, np.nan], [1.0, np.nan, np.nan]])),
+            Candidates(np.array([['b', 'c', 'd'], ['', '', '']]), np.array([[5.0, 4.0, 3.0], [np.nan, np.nan, np.nan]]))
+        ]
+        candidates = rrf(candidates_list, limit=4, k=1)
+
+        # `b` is found by both retrievers, padding never shows up as a candidate
+        self.assertEqual(candidates.ids.tolist(), [['b', 'a', 'c', 'd'], ['c', '', '', '']])
+        np.testing.assert_allclose(candidates.scores[0], [1 / 2 + 1 / 3, 1 / 2, 1 / 3, 1 / 4])
+        np.testing.assert_allclose(candidates.scores[1], [1 / 2, np.nan, np.nan, np.nan])
+
+        # both retrievers are cut to `depth` before fusing
+        self.assertEqual(rrf(candidates_list, limit=4, depth=2, k=1).ids[0].tolist(), ['b', 'a', 'c', ''])
+
+    def _assert_parity(self, fusion_algorithm: Fusion, client_fusion):
+        for prefetch_limit in (None, 50):
+            with self.subTest(prefetch_limit=prefetch_limit):
+                expected = self._search(self._get_repository(), fusion_algorithm, prefetch_limit)
+                actual = self._search(self._get_repository(client_fusion), fusion_algorithm, prefetch_limit)
+
+                for expected_points, actual_points in zip(expected, actual, strict=True):
+                    self._assert_same_ranking(expected_points, actual_points)
+
+    def _search(
+        self,
+        repository: HybridFusionSearchRepository,
+        fusion_algorithm: Fusion,
+        prefetch_limit: int | None
+    ) -> list[list[ScoredPoint]]:
+        return repository.search_batch(
+            'fusion',
+            LIMIT,
+            prefetch_limit,
+            fusion_algorithm,
+            self.queries.dense_embeddings,
+            self.queries.sparse_embeddings,
+            batch_size=16
+        )
+
+    def _assert_same_ranking(self, expected: list[ScoredPoint], actual: list[ScoredPoint]):
+        expected_scores = np.array([scored_point.score for scored_point in expected])
+        actual_scores = np.array([scored_point.score for scored_point in actual])
+        np.testing.assert_allclose(actual_scores, expected_scores, rtol=1e-5, atol=1e-6)
+
+        # points with equal fused scores may come back in any order, and the last group may be
+        # cut off by the limit differently, so the ids of every other group must match
+        groups = np.concatenate([[0], np.cumsum(~np.isclose(expected_scores[1:], expected_scores[:-1], rtol=1e-6, atol=1e-7))])
+
+        for group in np.unique(groups)[:-1]:
+            self.assertEqual(
+                {scored_point.payload['id'] for scored_point, in_group in zip(expected, groups == group) if in_group},
+                {int(scored_point.payload['id']) for scored_point, in_group in zip(actual, groups == group) if in_group}
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
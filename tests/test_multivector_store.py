@@ -0,0 +1,113 @@
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import unittest
+
+from rag.reranking import MultivectorStore
+
+
+class TestMultivectorStore(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = TemporaryDirectory()
+        self.store_dir = self.temporary_directory.name
+
+        rng = np.random.default_rng(0)
+        self.multivectors = [rng.standard_normal((rng.integers(2, 9), 16), dtype=np.float32) for _ in range(200)]
+        self.ids = [str(i) for i in range(200)]
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def _expected(self, ids: list[str]) -> np.ndarray:
+        tokens = np.concatenate([self.multivectors[int(doc_id)] for doc_id in ids])
+
+        return tokens / np.linalg.norm(tokens, axis=1, keepdims=True)
+
+    def _add(self, store: MultivectorStore, start: int, end: int):
+        store.add(self.ids[start:end], self.multivectors[start:end])
+
+    def test_round_trip(self):
+        for dtype, atol in (('float16', 1e-3), ('int8', 1e-2)):
+            with self.subTest(dtype=dtype), TemporaryDirectory() as store_dir:
+                store = MultivectorStore(store_dir, dtype)
+
+                for start in range(0, 200, 50):
+                    self._add(store, start, start + 50)
+
+                for store in (store, MultivectorStore(store_dir)):
+                    tokens, positions, found = store.get(['150', 'missing', '3'])
+
+                    self.assertEqual(store.dtype, dtype)
+                    self.assertEqual(len(store), 200)
+                    self.assertEqual(list(found), [True, False, True])
+                    self.assertEqual(positions.tolist(), [0, len(self.multivectors[150])])
+                    np.testing.assert_allclose(tokens, self._expected(['150', '3']), atol=atol)
+
+    def test_re_add(self):
+        store = MultivectorStore(self.store_dir)
+        self._add(store, 0, 100)
+        size_bytes = store.size_bytes()
+
+        # unchanged documents are skipped, so repeated setups do not grow the store
+        self._add(store, 0, 100)
+        self.assertEqual(store.size_bytes(), size_bytes)
+
+        store.add(['0'], [self.multivectors[1]])
+        tokens, _, _ = store.get(['0'])
+
+        self.assertEqual(len(store), 100)
+        np.testing.assert_allclose(tokens, self._expected(['1']), atol=1e-3)
+
+        # the last multivector of an id within a batch wins
+        store.add(['1', '1'], [self.multivectors[2], self.multivectors[3]])
+        tokens, _, _ = MultivectorStore(self.store_dir).get(['1'])
+
+        np.testing.assert_allclose(tokens, self._expected(['3']), atol=1e-3)
+
+    def test_compaction(self):
+        store = MultivectorStore(self.store_dir, compact_ratio=0.5)
+        self._add(store, 0, 100)
+        tokens, _, _ = store.get(self.ids[:100])
+        store.add(self.ids[:100], self.multivectors[100:])
+
+        self.assertEqual(store._generation, 0)
+
+        store.add(self.ids[:10], self.multivectors[:10])
+        replaced_tokens, _, _ = store.get(self.ids[:10])
+
+        self.assertEqual(store._generation, 1)
+        self.assertEqual(store.token_count, sum(len(multivector) for multivector in self.multivectors[:10] + self.multivectors[110:]))
+        self.assertTrue(all(path.name.startswith('meta') or '.1.' in path.name for path in store.store_dir.iterdir()))
+
+        for store in (store, MultivectorStore(self.store_dir)):
+            self.assertEqual(len(store), 100)
+            np.testing.assert_allclose(store.get(self.ids[:10])[0], replaced_tokens)
+            np.testing.assert_allclose(store.get(self.ids[10:100])[0], self._expected(self.ids[110:]), atol=1e-3)
+
+        # the tokens read before compaction stay valid
+        np.testing.assert_allclose(tokens, self._expected(self.ids[:100]), atol=1e-3)
+
+    def test_torn_add(self):
+        store = MultivectorStore(self.store_dir)
+        self._add(store, 0, 10)
+        paths = store._get_paths(store._generation)
+
+        # an add interrupted before its ids were written
+        with open(paths['tokens'], 'ab') as file:
+            file.write(b'\0' * 64)
+
+        with open(paths['lengths'], 'ab') as file:
+            file.write(np.array([2], dtype=np.int64).tobytes())
+
+        store = MultivectorStore(self.store_dir)
+        self.assertEqual(len(store), 10)
+
+        self._add(store, 10, 20)
+        tokens, _, found = MultivectorStore(self.store_dir).get(['9', '19'])
+
+        self.assertTrue(found.all())
+        np.testing.assert_allclose(tokens, self._expected(['9', '19']), atol=1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
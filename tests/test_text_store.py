@@ -0,0 +1,109 @@
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import unittest
+
+from rag.models import Metadata
+from rag.stores import TextStore
+from rag.stores import text_store
+
+
+_get_keys = text_store._get_keys
+
+
+def _get_colliding_keys(doc_ids):
+    # every id on the same key, only the check tells them apart
+    keys, checks = _get_keys(doc_ids)
+
+    return keys * 0, checks
+
+
+class TestTextStore(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = TemporaryDirectory()
+        self.store_dir = self.temporary_directory.name
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def _add(self, store: TextStore, ids: range, version: int = 0):
+        store.add([Metadata(id=i, text=f'passage {i} version {version} ü') for i in ids])
+
+    def test_round_trip(self):
+        store = TextStore(self.store_dir)
+
+        for start in range(0, 1_000, 100):
+            self._add(store, range(start, start + 100))
+
+        for store in (store, TextStore(self.store_dir)):
+            self.assertEqual(len(store), 1_000)
+            self.assertEqual(store.get([999, 0, 1_000]), ['passage 999 version 0 ü', 'passage 0 version 0 ü', None])
+            self.assertIn(500, store)
+            self.assertNotIn(1_000, store)
+
+    def test_re_add(self):
+        store = TextStore(self.store_dir)
+        self._add(store, range(100))
+        size_bytes = store.size_bytes()
+
+        self._add(store, range(100))
+        self.assertEqual(store.size_bytes(), size_bytes)
+
+        self._add(store, range(10), version=1)
+        self.assertEqual(len(store), 100)
+        self.assertEqual(store.get([0, 10]), ['passage 0 version 1 ü', 'passage 10 version 0 ü'])
+
+        # the last passage of an id within a batch wins
+        store.add([Metadata(id=1, text='first'), Metadata(id=1, text='second')])
+        self.assertEqual(TextStore(self.store_dir).get([1]), ['second'])
+
+    def test_compaction(self):
+        store = TextStore(self.store_dir, compact_ratio=0.5)
+        self._add(store, range(100))
+        self._add(store, range(100), version=1)
+        self._add(store, range(50), version=2)
+
+        self.assertEqual(store._generation, 1)
+        self.assertEqual(sorted(path.name for path in store.store_dir.iterdir()), ['index.1.bin', 'meta.json', 'texts.1.bin'])
+
+        for store in (store, TextStore(self.store_dir)):
+            self.assertEqual(len(store), 100)
+            self.assertEqual(store.get([0, 99]), ['passage 0 version 2 ü', 'passage 99 version 1 ü'])
+
+    def test_torn_add(self):
+        store = TextStore(self.store_dir)
+        self._add(store, range(10))
+        texts_path, index_path = store._get_paths(store._generation)
+
+        # an add interrupted after its passages and part of its records
+        with open(texts_path, 'ab') as file:
+            file.write(b'lost passage')
+
+        with open(index_path, 'ab') as file:
+            file.write(b'\1' * 5)
+
+        store = TextStore(self.store_dir)
+        self.assertEqual(len(store), 10)
+
+        self._add(store, range(10, 20))
+        self.assertEqual(TextStore(self.store_dir).get([9, 19]), ['passage 9 version 0 ü', 'passage 19 version 0 ü'])
+
+    def test_key_collision(self):
+        with patch.object(text_store, '_get_keys', _get_colliding_keys):
+            store = TextStore(self.store_dir)
+
+            for start in range(0, 40, 10):
+                self._add(store, range(start, start + 10))
+
+            self._add(store, range(0, 40, 3), version=1)
+
+            for store in (store, TextStore(self.store_dir)):
+                self.assertEqual(len(store), 40)
+                self.assertEqual(
+                    store.get(list(range(41))),
+                    [f'passage {i} version {int(i % 3 == 0)} ü' for i in range(40)] + [None]
+                )
+
+
+if __name__ == '__main__':
+    unittest.main()